@@ -0,0 +1,291 @@
+"""
+Mikro-Benchmarks der Engine (``helpers.helpers``) mit gespeicherter Baseline.
+
+Gemessen werden ``calculate_delivery_and_vat``, ``determine_vat_treatment`` (alle
+Lieferungen einer Kette), ``is_triangular_transaction``,
+``determine_registration_obligations``, ``determine_reporting_obligations`` und
+``get_countries`` für Ketten mit 3, 4, 10, 100 und 1000 Firmen (EU-Länder im
+Wechsel) und Transport durch die erste, eine mittlere oder die letzte Firma.
+Angegeben wird die beste mittlere Laufzeit je Aufruf in Mikrosekunden; mit
+``--rounds`` der Median dieses Werts über mehrere vollständige Durchläufe, was
+Schwankungen auf geteilten Maschinen ausgleicht.
+
+Aufruf::
+
+    python -m benchmarks.bench_engine run --rounds 5 --output benchmarks/baseline.json
+    python -m benchmarks.bench_engine compare benchmarks/baseline.json --rounds 5
+
+``compare`` misst neu (oder liest eine zweite Ergebnisdatei) und endet mit Exit-Code
+1, wenn ein Fall um mehr als ``--threshold`` (Standard: 25 %) langsamer ist als die
+Baseline. Die Baseline gilt nur für die Maschine, auf der sie erzeugt wurde
+(``python``, ``platform`` und ``processor`` in der Datei), und muss nach Änderungen
+an der Engine neu erzeugt werden.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from collections.abc import Callable, Iterator
+
+from helpers.helpers import ENGINE_VERSION, Transaktion
+from helpers.localization import _country_table, get_countries
+from helpers.scenario import create_company_chain
+
+LENGTHS = (3, 4, 10, 100, 1000)
+POSITIONS = ("first", "middle", "last")
+EU_CODES = ("DE", "AT", "FR", "IT", "NL", "BE", "PL", "ES")
+
+DEFAULT_MIN_TIME = 0.02  # Sekunden je Messreihe
+DEFAULT_REPEAT = 5
+DEFAULT_ROUNDS = 1
+DEFAULT_THRESHOLD = 0.25
+
+
+def shipping_index(length: int, position: str) -> int:
+    """Position des Transporteurs in einer Kette der Länge ``length``."""
+    return {"first": 0, "middle": length // 2, "last": length - 1}[position]
+
+
+def build_transaction(length: int, position: str) -> Transaktion:
+    """Berechnete Transaktion mit ``length`` Firmen und Transport an ``position``."""
+    configs = [{"country_code": EU_CODES[i % len(EU_CODES)]} for i in range(length)]
+    configs[shipping_index(length, position)]["ship"] = True
+    transaction = Transaktion.from_chain(create_company_chain(configs))
+    transaction.calculate_delivery_and_vat()
+    return transaction
+
+
+def _engine_cases(transaction: Transaktion) -> dict[str, Callable[[], object]]:
+    chain = transaction.chain
+    start, end = chain[0].country, chain[-1].country
+
+    def vat_treatment():
+        for lieferung in transaction.lieferungen:
+            lieferung.determine_vat_treatment(start, end)
+
+    def triangular():
+        # Zwischengespeichertes Ergebnis verwerfen, sonst wird nur der Cache gemessen
+        transaction._triangle_key = None
+        return transaction.is_triangular_transaction()
+
+    return {
+        "calculate_delivery_and_vat": transaction.calculate_delivery_and_vat,
+        "determine_vat_treatment": vat_treatment,
+        "is_triangular_transaction": triangular,
+        "determine_registration_obligations": transaction.determine_registration_obligations,
+        "determine_reporting_obligations": transaction.determine_reporting_obligations,
+    }
+
+
+def _cold_countries():
+    _country_table.cache_clear()
+    return get_countries()
+
+
+def iter_cases(
+    lengths=LENGTHS, positions=POSITIONS
+) -> Iterator[tuple[str, Callable[[], object]]]:
+    """Alle Fälle als (Name, Funktion ohne Argumente)."""
+    yield "get_countries", get_countries
+    yield "get_countries[kalt]", _cold_countries
+    for length in lengths:
+        for position in positions:
+            cases = _engine_cases(build_transaction(length, position))
+            for function, call in cases.items():
+                yield f"{function}[n={length},{position}]", call
+
+
+def time_call(
+    call: Callable[[], object],
+    min_time: float = DEFAULT_MIN_TIME,
+    repeat: int = DEFAULT_REPEAT,
+) -> float:
+    """
+    Beste mittlere Laufzeit je Aufruf in Mikrosekunden. Die Anzahl der Aufrufe je
+    Messreihe wird so gewählt, dass eine Reihe mindestens ``min_time`` dauert; die
+    Garbage Collection ist wie bei ``timeit`` abgeschaltet.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _time_call(call, min_time, repeat)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _time_call(call: Callable[[], object], min_time: float, repeat: int) -> float:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def run(
+    lengths=LENGTHS,
+    positions=POSITIONS,
+    min_time: float = DEFAULT_MIN_TIME,
+    repeat: int = DEFAULT_REPEAT,
+    rounds: int = DEFAULT_ROUNDS,
+) -> dict:
+    """
+    Misst alle Fälle und gibt das Ergebnis im Format der Baseline zurück. Bei
+    mehreren ``rounds`` wird je Fall der Median der Durchläufe angegeben.
+    """
+    timings: dict[str, list[float]] = {}
+    for _ in range(rounds):
+        for name, call in iter_cases(lengths, positions):
+            timings.setdefault(name, []).append(time_call(call, min_time, repeat))
+    results = {
+        name: round(statistics.median(values), 3) for name, values in timings.items()
+    }
+    return {
+        "engine_version": ENGINE_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "processor": processor_name(),
+        "rounds": rounds,
+        "unit": "us",
+        "results": results,
+    }
+
+
+def processor_name() -> str:
+    """Prozessormodell (unter Linux aus ``/proc/cpuinfo``, sonst ``platform``)."""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD
+) -> list[tuple[str, float, float, float]]:
+    """
+    Vergleicht zwei Messungen.
+
+    Returns:
+        list: (Name, Baseline, Aktuell, Verhältnis) für alle Fälle, die in beiden
+              Messungen vorkommen und um mehr als ``threshold`` langsamer sind.
+    """
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None or before <= 0:
+            continue
+        ratio = after / before
+        if ratio > 1 + threshold:
+            regressions.append((name, before, after, ratio))
+    return regressions
+
+
+def _print_comparison(baseline: dict, current: dict, threshold: float):
+    print(f"{'Fall':<58}{'Baseline':>12}{'Aktuell':>12}{'Faktor':>9}")
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            continue
+        ratio = after / before if before > 0 else float("inf")
+        marker = "  !" if ratio > 1 + threshold else ""
+        print(f"{name:<58}{before:>10.1f}us{after:>10.1f}us{ratio:>8.2f}x{marker}")
+
+
+def _parse_lengths(value: str) -> tuple[int, ...]:
+    return tuple(int(length) for length in value.split(","))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_engine")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Messen und Ergebnis ausgeben")
+    run_parser.add_argument("--output", help="Ergebnis als JSON speichern")
+    compare_parser = commands.add_parser("compare", help="Mit der Baseline vergleichen")
+    compare_parser.add_argument("baseline", help="Baseline (JSON)")
+    compare_parser.add_argument(
+        "current", nargs="?", help="Vergleichsmessung (JSON), sonst wird neu gemessen"
+    )
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Erlaubte Verlangsamung (Standard: {DEFAULT_THRESHOLD:.0%})",
+    )
+    for sub in (run_parser, compare_parser):
+        sub.add_argument(
+            "--lengths",
+            type=_parse_lengths,
+            default=LENGTHS,
+            help="Kettenlängen, kommagetrennt (Standard: 3,4,10,100,1000)",
+        )
+        sub.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME)
+        sub.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+        sub.add_argument(
+            "--rounds",
+            type=int,
+            default=DEFAULT_ROUNDS,
+            help="Durchläufe, je Fall wird der Median verwendet (Standard: 1)",
+        )
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        result = run(
+            args.lengths, min_time=args.min_time, repeat=args.repeat, rounds=args.rounds
+        )
+        text = json.dumps(result, indent=2) + "\n"
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run(
+            args.lengths, min_time=args.min_time, repeat=args.repeat, rounds=args.rounds
+        )
+    if baseline.get("engine_version") != current.get("engine_version"):
+        print(
+            "Hinweis: Baseline wurde mit einer anderen Version der Berechnungsregeln "
+            "erstellt.",
+            file=sys.stderr,
+        )
+    _print_comparison(baseline, current, args.threshold)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(
+            f"{len(regressions)} Fälle mehr als {args.threshold:.0%} langsamer.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
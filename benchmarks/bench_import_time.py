@@ -0,0 +1,84 @@
+"""
+Importzeit der Engine (``helpers.helpers``), gemessen mit ``python -X importtime``.
+
+Prüft außerdem, dass beim Import keine optionalen Schichten (Lokalisierung,
+Flaggen, Streamlit) geladen werden. Der Exit-Code ist 1, wenn das Budget
+überschritten oder ein unerwünschtes Modul geladen wurde.
+
+Aufruf::
+
+    python -m benchmarks.bench_import_time --budget-ms 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+MODULE = "helpers.helpers"
+DEFAULT_BUDGET_MS = 20.0
+OPTIONAL_MODULES = (
+    "gettext",
+    "pycountry",
+    "streamlit",
+    "graphviz",
+    "helpers.flag_store",
+    "helpers.localization",
+)
+
+
+def _run_python(*args) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    # Ohne Bytecode-Cache würde die Kompilierung mitgemessen
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def measure_import_ms(module: str = MODULE, runs: int = 5) -> float:
+    """Kumulierte Importzeit des Moduls in Millisekunden (bester von ``runs`` Läufen)."""
+    _run_python("-c", f"import {module}")  # Bytecode-Cache anlegen
+    best = float("inf")
+    for _ in range(runs):
+        stderr = _run_python("-X", "importtime", "-c", f"import {module}").stderr
+        for line in stderr.splitlines():
+            # Format: "import time: <self> | <kumuliert> | <Modul>"
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                best = min(best, int(parts[1]) / 1000)
+    return best
+
+
+def loaded_optional_modules(module: str = MODULE) -> list[str]:
+    """Optionale Module, die beim Import von ``module`` mitgeladen werden."""
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(m for m in {OPTIONAL_MODULES!r} if m in sys.modules))"
+    )
+    return _run_python("-c", code).stdout.split()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_import_time")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    duration = measure_import_ms(runs=args.runs)
+    optional = loaded_optional_modules()
+    print(f"import {MODULE}: {duration:.1f} ms (Budget {args.budget_ms:.1f} ms)")
+    if optional:
+        print(f"Unerwünscht geladen: {', '.join(optional)}")
+    return 0 if duration <= args.budget_ms and not optional else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
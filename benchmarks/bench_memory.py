@@ -0,0 +1,107 @@
+"""
+Speicherbedarf und Erzeugungsdauer pro Objekt für Country, Handelsstufe und Lieferung.
+
+Vergleicht die Klassen mit ``__slots__`` mit gleichwertigen Klassen, deren
+Attribute in einem Instanz-``__dict__`` liegen (Stand vor der Umstellung).
+Ab Python 3.11 teilen sich Instanzen einer Klasse die Schlüssel ihres
+``__dict__``, der Gewinn durch ``__slots__`` liegt daher bei etwa Faktor 1,5
+(gemessen mit Python 3.11: Country 104 -> 64 B, Handelsstufe 176 -> 128 B,
+Lieferung 152 -> 104 B) und nicht bei den ursprünglich erwarteten 2-3x.
+Die Erzeugungsdauer zeigt, ob Setter (z.B. für Rollen und Verknüpfungen einer
+Handelsstufe) den Aufbau verlangsamen.
+
+Aufruf::
+
+    python -m benchmarks.bench_memory --count 100000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from helpers.countries import Country
+from helpers.helpers import Handelsstufe, Lieferung
+
+
+def without_slots(cls):
+    """Erzeugt eine Variante der Klasse ohne ``__slots__`` (Attribute im ``__dict__``)."""
+    namespace = {
+        key: value
+        for key, value in vars(cls).items()
+        if key not in cls.__slots__ and key != "__slots__"
+    }
+    return type(f"{cls.__name__}MitDict", cls.__bases__, namespace)
+
+
+def bytes_per_object(factory, count: int) -> float:
+    """Misst den mittleren Speicherbedarf der von ``factory(i)`` erzeugten Objekte."""
+    objects = [None] * count
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            objects[i] = factory(i)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count
+
+
+def seconds_per_object(factory, count: int, repeat: int = 5) -> float:
+    """Beste mittlere Dauer von ``factory(i)`` in Sekunden."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(count):
+            factory(i)
+        best = min(best, time.perf_counter() - start)
+    return best / count
+
+
+def measure(count: int) -> list[tuple[str, float, float, float, float]]:
+    """
+    Gibt je Klasse (Name, Bytes mit __dict__, Bytes mit __slots__, Sekunden mit
+    __dict__, Sekunden mit __slots__) pro Objekt zurück.
+    """
+    de = Country("Deutschland", "DE")
+    lieferant = Handelsstufe(de, 0, 2)
+    kunde = Handelsstufe(Country("Österreich", "AT"), 1, 2)
+    factories = (
+        (Country, lambda cls: lambda i: cls("Deutschland", "DE")),
+        (Handelsstufe, lambda cls: lambda i: cls(de, i % 3, 3)),
+        (Lieferung, lambda cls: lambda i: cls(lieferant, kunde)),
+    )
+    rows = []
+    for cls, make in factories:
+        with_dict, with_slots = make(without_slots(cls)), make(cls)
+        rows.append(
+            (
+                cls.__name__,
+                bytes_per_object(with_dict, count),
+                bytes_per_object(with_slots, count),
+                seconds_per_object(with_dict, count),
+                seconds_per_object(with_slots, count),
+            )
+        )
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_memory")
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'Klasse':<14}{'__dict__':>12}{'__slots__':>12}{'Faktor':>9}"
+        f"{'Aufbau __dict__':>18}{'Aufbau __slots__':>18}"
+    )
+    for name, dict_bytes, slot_bytes, dict_seconds, slot_seconds in measure(args.count):
+        print(
+            f"{name:<14}{dict_bytes:>10.0f} B{slot_bytes:>10.0f} B"
+            f"{dict_bytes / slot_bytes:>8.1f}x"
+            f"{dict_seconds * 1e6:>15.2f} us{slot_seconds * 1e6:>15.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
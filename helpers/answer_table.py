@@ -0,0 +1,266 @@
+"""
+Vorberechnete Antworttabelle für alle kanonischen Muster bis zu einer Kettenlänge.
+
+Die Tabelle enthält für jedes Muster (siehe ``helpers.patterns``) das Ergebnis der
+Berechnung mit Platzhalter-Ländern. Aufbau der Datei (alle Zahlen little-endian)::
+
+    Kopf     "UANS" | Version (uint16) | ENGINE_VERSION (uint16) | Anzahl (uint32)
+    Index    je Muster, sortiert nach Schlüssel:
+             Schlüssel (uint64, Hash des Musters) | Offset und Länge des Musters
+             (je uint32) | Offset und Länge des Ergebnisses (je uint32)
+    Daten    Muster und Ergebnisse als kompaktes JSON; gleiche Ergebnisse werden
+             nur einmal gespeichert
+
+Die Datei wird per ``mmap`` gelesen, ein Muster wird per binärer Suche im Index
+gefunden. Weil der Schlüssel nur 64 Bit breit ist, wird das gespeicherte Muster
+vor der Rückgabe mit dem gesuchten verglichen; bei Abweichung gilt es als nicht
+enthalten. Erzeugen (Standard: Ketten bis 3 Firmen)::
+
+    python -m helpers.answer_table antworten.bin --max-length 3
+
+Die Online-Auswertung nutzt die Tabelle, wenn die Umgebungsvariable
+``UST_ANSWER_TABLE`` auf die Datei zeigt; Muster außerhalb der Tabelle werden live
+berechnet.
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Callable, Iterator
+from functools import cache
+from itertools import product
+from pathlib import Path
+
+from helpers.helpers import ENGINE_VERSION, IntermediaryStatus
+
+MAGIC = b"UANS"
+VERSION = 2
+HEADER = struct.Struct("<4sHHI")
+INDEX_ENTRY = struct.Struct("<QIIII")
+
+DEFAULT_MAX_LENGTH = 3
+ENVIRONMENT_VARIABLE = "UST_ANSWER_TABLE"
+
+STATUS_NAMES = (None, *(status.name for status in IntermediaryStatus))
+
+
+def encode_pattern(pattern: tuple) -> bytes:
+    """Kanonische Bytes eines Musters (stabil über Prozesse und Plattformen)."""
+    return json.dumps(pattern, separators=(",", ":")).encode("utf-8")
+
+
+def pattern_key(pattern: tuple) -> int:
+    """64-Bit-Schlüssel eines Musters (stabil über Prozesse und Plattformen)."""
+    return _key(encode_pattern(pattern))
+
+
+def _key(encoded: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little")
+
+
+def _country_classes(length: int) -> Iterator[tuple[tuple, int]]:
+    """
+    Alle Zuordnungen von Länderklassen zu den Firmen einer Kette: je Firma das
+    Land und optional das Land der abweichenden USt-ID, nummeriert in der
+    Reihenfolge des ersten Auftretens.
+
+    Yields:
+        tuple: (Land, USt-ID-Land) je Firma und die Anzahl der Klassen.
+    """
+
+    def assign(slot: int, chosen: list, classes: int):
+        if slot == 2 * length:
+            yield tuple(zip(chosen[0::2], chosen[1::2])), classes
+            return
+        options = list(range(classes + 1))
+        if slot % 2:
+            options.insert(0, None)  # keine abweichende USt-ID
+        for option in options:
+            yield from assign(
+                slot + 1, chosen + [option], classes + (option == classes)
+            )
+
+    yield from assign(0, [], 0)
+
+
+def iter_patterns(max_length: int = DEFAULT_MAX_LENGTH) -> Iterator[tuple]:
+    """
+    Alle kanonischen Muster mit 2 bis ``max_length`` Firmen und genau einem
+    Transporteur: Länderklassen x EU/Drittland x Position des Transporteurs x
+    Status x abweichende USt-IDs x EUSt-Zuständigkeiten.
+    """
+    from helpers.patterns import normalize
+
+    for length in range(2, max_length + 1):
+        seen = set()
+        for assignment, classes in _country_classes(length):
+            for eu in product((False, True), repeat=classes):
+                for shipping in range(length):
+                    statuses = STATUS_NAMES if 0 < shipping < length - 1 else (None,)
+                    for status in statuses:
+                        for import_vat in product((False, True), repeat=length):
+                            pattern = normalize(
+                                (
+                                    eu,
+                                    tuple(
+                                        (
+                                            country,
+                                            vat_country,
+                                            i == shipping,
+                                            status if i == shipping else None,
+                                            import_vat[i],
+                                        )
+                                        for i, (country, vat_country) in enumerate(
+                                            assignment
+                                        )
+                                    ),
+                                )
+                            )
+                            if pattern not in seen:
+                                seen.add(pattern)
+                                yield pattern
+
+
+def build_answer_table(
+    path,
+    max_length: int = DEFAULT_MAX_LENGTH,
+    evaluate: Callable[[tuple], dict] | None = None,
+) -> int:
+    """
+    Berechnet alle Muster bis ``max_length`` Firmen und schreibt die Tabelle.
+
+    Args:
+        path: Zieldatei.
+        max_length: Maximale Anzahl Firmen je Kette.
+        evaluate: Berechnung eines Musters (Standard: ``patterns.pattern_result``).
+
+    Returns:
+        int: Anzahl der gespeicherten Muster.
+    """
+    if evaluate is None:
+        from helpers.patterns import pattern_result
+        from helpers.result_cache import LRUCache
+
+        def evaluate(pattern):
+            # Eigener Cache, damit der prozessweite nicht verdrängt wird
+            return pattern_result(pattern, LRUCache(maxsize=1))
+
+    entries: list[tuple[int, bytes, int]] = []
+    blobs: dict[bytes, int] = {}
+    for pattern in iter_patterns(max_length):
+        encoded = encode_pattern(pattern)
+        blob = json.dumps(
+            evaluate(pattern), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        entries.append((_key(encoded), encoded, blobs.setdefault(blob, len(blobs))))
+    entries.sort()
+    for (key, _, _), (next_key, _, _) in zip(entries, entries[1:]):
+        if key == next_key:
+            raise ValueError(f"Schlüsselkollision in der Antworttabelle: {key:#x}")
+
+    offset = HEADER.size + INDEX_ENTRY.size * len(entries)
+    pattern_offsets = []
+    for _, encoded, _ in entries:
+        pattern_offsets.append((offset, len(encoded)))
+        offset += len(encoded)
+    offsets = []
+    for blob in blobs:
+        offsets.append((offset, len(blob)))
+        offset += len(blob)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, ENGINE_VERSION, len(entries)))
+        for (key, _, blob_index), pattern_offset in zip(entries, pattern_offsets):
+            f.write(INDEX_ENTRY.pack(key, *pattern_offset, *offsets[blob_index]))
+        for _, encoded, _ in entries:
+            f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+    return len(entries)
+
+
+class AnswerTable:
+    """
+    Lesezugriff auf eine mit ``build_answer_table`` erzeugte Tabelle.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, engine_version, count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Ungültige Antworttabelle: {path}")
+        if engine_version != ENGINE_VERSION:
+            raise ValueError(
+                f"Antworttabelle {path} passt nicht zur Version der Berechnungsregeln "
+                f"({engine_version} statt {ENGINE_VERSION}), bitte neu erzeugen."
+            )
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, position: int) -> tuple[int, int, int, int, int]:
+        return INDEX_ENTRY.unpack_from(
+            self._buffer, HEADER.size + position * INDEX_ENTRY.size
+        )
+
+    def get(self, pattern: tuple) -> dict | None:
+        """Ergebnis eines Musters oder None, falls es nicht in der Tabelle steht."""
+        encoded = encode_pattern(pattern)
+        key = _key(encoded)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry_key, pattern_offset, pattern_length, offset, length = self._entry(
+                middle
+            )
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                # Gleicher Schlüssel, anderes Muster: Kollision, nicht enthalten
+                stored = self._buffer[pattern_offset : pattern_offset + pattern_length]
+                if stored != encoded:
+                    return None
+                return json.loads(self._buffer[offset : offset + length])
+        return None
+
+
+@cache
+def default_table() -> AnswerTable | None:
+    """
+    Die unter ``UST_ANSWER_TABLE`` angegebene Tabelle (einmal pro Prozess
+    geöffnet) oder None, wenn keine konfiguriert ist.
+    """
+    path = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not path or not Path(path).is_file():
+        return None
+    return AnswerTable(path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m helpers.answer_table",
+        description="Erzeugt die Antworttabelle für alle kanonischen Muster.",
+    )
+    parser.add_argument("output", help="Zieldatei")
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        default=DEFAULT_MAX_LENGTH,
+        help=f"Maximale Anzahl Firmen je Kette (Standard: {DEFAULT_MAX_LENGTH})",
+    )
+    args = parser.parse_args(argv)
+    count = build_answer_table(args.output, args.max_length)
+    size = Path(args.output).stat().st_size
+    print(f"{count} Muster gespeichert ({size} Byte).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""
+Stapelverarbeitung von Reihengeschäften ohne Streamlit-Oberfläche.
+
+Liest Ketten-Spezifikationen (siehe ``helpers.scenario``) aus JSONL- oder CSV-Dateien,
+verteilt sie blockweise auf einen ``ProcessPoolExecutor`` und schreibt die Ergebnisse
+in der Reihenfolge der Eingabe zurück. Gleichartige Ketten werden nur einmal berechnet
+(siehe ``helpers.patterns``).
+
+Aufruf::
+
+    python -m helpers.batch ketten.jsonl ergebnisse.jsonl --workers 8
+
+CSV-Eingaben enthalten eine Zeile pro Firma; aufeinanderfolgende Zeilen mit gleicher
+``chain_id`` bilden eine Kette (Spalten: ``chain_id``, ``country_code``, ``ship``,
+``customs``, ``import_vat``, ``vat_change_code``, ``intermediary_status``).
+CSV-Ausgaben enthalten eine Zeile pro Lieferung.
+
+Mit ``--timings laufzeiten.json`` (oder ``.prom``) werden die Laufzeiten der
+Berechnungsphasen über alle Prozesse gesammelt und geschrieben (siehe
+``helpers.instrumentation``).
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from helpers import instrumentation
+from helpers.helpers import reporting_labels
+from helpers.patterns import canonical_result
+from helpers.scenario import evaluate_spec
+
+DEFAULT_CHUNKSIZE = 256
+
+COMPANY_COLUMNS = (
+    "country_code",
+    "ship",
+    "customs",
+    "import_vat",
+    "vat_change_code",
+    "intermediary_status",
+)
+
+RESULT_COLUMNS = (
+    "chain_id",
+    "from",
+    "to",
+    "moved",
+    "place",
+    "vat_treatment",
+    "invoice_note",
+    "triangle",
+    "supplier_registrations",
+    "supplier_reporting",
+    "customer_registrations",
+    "customer_reporting",
+    "error",
+)
+
+
+def _is_csv(path) -> bool:
+    return Path(path).suffix.lower() == ".csv"
+
+
+def read_jsonl_specs(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Liest eine Spezifikation pro nicht-leerer Zeile. Zeilen, die nur die
+    Firmenliste enthalten, werden zu ``{"id": Zeilennummer, "companies": [...]}``.
+    Ungültige Zeilen brechen das Lesen nicht ab, sondern werden zu
+    ``{"id": Zeilennummer, "error": ...}``.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            spec = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {
+                "id": line_number,
+                "error": f"Ungültiges JSON in Zeile {line_number}: {e}",
+            }
+            continue
+        if isinstance(spec, list):
+            spec = {"id": line_number, "companies": spec}
+        elif not isinstance(spec, dict):
+            spec = {
+                "id": line_number,
+                "error": f"Zeile {line_number} enthält weder Spezifikation noch "
+                "Firmenliste.",
+            }
+        elif "id" not in spec:
+            spec["id"] = line_number
+        yield spec
+
+
+def read_csv_specs(lines: Iterable[str]) -> Iterator[dict]:
+    """Fasst aufeinanderfolgende CSV-Zeilen mit gleicher ``chain_id`` zu einer Kette zusammen."""
+    reader = csv.DictReader(lines)
+    for chain_id, rows in groupby(reader, key=lambda row: row.get("chain_id")):
+        yield {
+            "id": chain_id,
+            "companies": [
+                {column: row.get(column) or None for column in COMPANY_COLUMNS}
+                for row in rows
+            ],
+        }
+
+
+def read_specs(path) -> Iterator[dict]:
+    """Liest Spezifikationen abhängig von der Dateiendung als CSV oder JSONL."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if _is_csv(path):
+            yield from read_csv_specs(f)
+        else:
+            yield from read_jsonl_specs(f)
+
+
+def result_rows(result: dict) -> Iterator[dict]:
+    """Zerlegt ein Kettenergebnis in eine CSV-Zeile pro Lieferung."""
+    if "error" in result:
+        yield {"chain_id": result["id"], "error": result["error"]}
+        return
+    registrations = result["registrations"]
+    reporting = result["reporting"]
+    for delivery in result["deliveries"]:
+        yield {
+            "chain_id": result["id"],
+            "from": delivery["from"],
+            "to": delivery["to"],
+            "moved": delivery["moved"],
+            "place": delivery["place"],
+            "vat_treatment": delivery["vat_treatment"],
+            "invoice_note": delivery["invoice_note"],
+            "triangle": result["triangle"],
+            "supplier_registrations": ";".join(registrations[delivery["from"]]),
+            "supplier_reporting": ";".join(
+                reporting_labels(reporting[delivery["from"]])
+            ),
+            "customer_registrations": ";".join(registrations[delivery["to"]]),
+            "customer_reporting": ";".join(reporting_labels(reporting[delivery["to"]])),
+        }
+
+
+def write_results(results: Iterable[dict], path) -> int:
+    """
+    Schreibt Ergebnisse abhängig von der Dateiendung als CSV oder JSONL.
+
+    Returns:
+        int: Anzahl der geschriebenen Ketten.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if _is_csv(path):
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            writer.writeheader()
+            for result in results:
+                writer.writerows(result_rows(result))
+                count += 1
+        else:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                count += 1
+    return count
+
+
+def _evaluate(spec) -> dict:
+    # Gleichartige Ketten teilen sich eine Berechnung (siehe helpers.patterns)
+    try:
+        return evaluate_spec(spec, canonical_result)
+    except Exception as e:
+        # Ein fehlerhafter Datensatz darf den Stapel (und den Prozesspool) nicht
+        # abbrechen; unerwartete Fehler werden wie fachliche je Kette gemeldet
+        return {
+            "id": spec.get("id") if isinstance(spec, dict) else None,
+            "error": f"Unerwarteter Fehler ({type(e).__name__}): {e}",
+        }
+
+
+def _init_worker(timings: bool):
+    if timings:
+        instrumentation.enable()
+
+
+def _evaluate_chunk(specs: list[dict]) -> tuple[list[dict], dict | None]:
+    results = [_evaluate(spec) for spec in specs]
+    if not instrumentation.is_enabled():
+        return results, None
+    # Laufzeiten des Blocks an den Hauptprozess übergeben
+    timings = instrumentation.registry.snapshot()
+    instrumentation.registry.reset()
+    return results, timings
+
+
+def _chunk_results(future) -> list[dict]:
+    results, timings = future.result()
+    if timings is not None:
+        instrumentation.registry.merge(timings)
+    return results
+
+
+def _chunks(specs: Iterable[dict], chunksize: int) -> Iterator[list[dict]]:
+    iterator = iter(specs)
+    while chunk := list(islice(iterator, chunksize)):
+        yield chunk
+
+
+def iter_results(
+    specs: Iterable[dict],
+    workers: int | None = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> Iterator[dict]:
+    """
+    Wertet Spezifikationen aus und liefert die Ergebnisse in Eingabereihenfolge.
+
+    Die Eingabe wird in Blöcke von ``chunksize`` Ketten geteilt, damit der
+    Kommunikationsaufwand zwischen den Prozessen klein bleibt. Es sind höchstens
+    ``2 * workers`` Blöcke gleichzeitig unterwegs, der Speicherbedarf hängt also
+    nicht von der Eingabegröße ab. Ist die Laufzeitmessung eingeschaltet (siehe
+    ``helpers.instrumentation``), werden die Messwerte der Prozesse im
+    Hauptprozess zusammengefasst.
+
+    Args:
+        specs: Ketten-Spezifikationen.
+        workers: Anzahl der Prozesse (Standard: Anzahl der CPUs). Bei 0 wird im
+                 aktuellen Prozess gerechnet.
+        chunksize: Anzahl der Ketten pro Block.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize muss mindestens 1 sein.")
+    if workers == 0:
+        for spec in specs:
+            yield _evaluate(spec)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(instrumentation.is_enabled(),),
+    ) as executor:
+        pending = deque()
+        for chunk in _chunks(specs, chunksize):
+            pending.append(executor.submit(_evaluate_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from _chunk_results(pending.popleft())
+        while pending:
+            yield from _chunk_results(pending.popleft())
+
+
+def run_batch(
+    input_path,
+    output_path,
+    workers: int | None = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> int:
+    """
+    Liest ``input_path``, wertet alle Ketten aus und schreibt nach ``output_path``.
+
+    Returns:
+        int: Anzahl der ausgewerteten Ketten.
+    """
+    return write_results(
+        iter_results(read_specs(input_path), workers=workers, chunksize=chunksize),
+        output_path,
+    )
+
+
+def write_timings(path):
+    """Schreibt die gesammelten Laufzeiten als Prometheus-Text (.prom) oder JSON."""
+    registry = instrumentation.registry
+    with open(path, "w", encoding="utf-8") as f:
+        if Path(path).suffix.lower() == ".prom":
+            f.write(registry.to_prometheus())
+        else:
+            json.dump(registry.snapshot(), f, indent=2)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m helpers.batch",
+        description="Wertet Reihengeschäfte aus einer JSONL- oder CSV-Datei aus.",
+    )
+    parser.add_argument("input", help="Eingabedatei (.jsonl oder .csv)")
+    parser.add_argument("output", help="Ausgabedatei (.jsonl oder .csv)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Anzahl der Prozesse (Standard: Anzahl der CPUs, 0 = ohne Prozesspool)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help=f"Ketten pro Block (Standard: {DEFAULT_CHUNKSIZE})",
+    )
+    parser.add_argument(
+        "--timings",
+        help="Laufzeiten der Berechnungsphasen messen und in diese Datei schreiben "
+        "(.prom: Prometheus-Textformat, sonst JSON)",
+    )
+    args = parser.parse_args(argv)
+    if args.timings:
+        instrumentation.enable()
+
+    start = time.perf_counter()
+    count = run_batch(args.input, args.output, args.workers, args.chunksize)
+    duration = time.perf_counter() - start
+    rate = count / duration if duration > 0 else 0.0
+    print(
+        f"{count} Ketten in {duration:.2f} s ausgewertet ({rate:.0f} Ketten/s).",
+        file=sys.stderr,
+    )
+    if args.timings:
+        write_timings(args.timings)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Auswertung von Reihengeschäften als Filter in Unix-Pipelines.
+
+Liest Ketten-Spezifikationen als JSON-Zeilen von stdin (oder aus einer Datei) und
+schreibt jedes Ergebnis als JSON-Zeile nach stdout, sobald es berechnet ist. Es wird
+immer nur eine Zeile (bzw. mit ``--workers`` eine begrenzte Anzahl Blöcke) im
+Speicher gehalten, der Speicherbedarf hängt also nicht von der Eingabegröße ab.
+
+Eine Zeile enthält entweder eine Spezifikation (``{"id": ..., "companies": [...]}``)
+oder nur die Firmenliste im Format der ``company_configs`` aus den Tests::
+
+    [{"id": 1, "country_code": "DE", "ship": true}, {"id": 2, "country_code": "FR"}]
+
+Aufruf::
+
+    cat ketten.jsonl | python -m helpers.cli > ergebnisse.jsonl
+    python -m helpers.cli ketten.jsonl --workers 4
+
+Fachliche Fehler und ungültige Eingabezeilen stehen im Feld ``error`` des
+jeweiligen Ergebnisses, die übrigen Zeilen werden weiter ausgewertet; Meldungen
+(Logging) gehen nach stderr.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Iterable, TextIO
+
+from helpers.batch import DEFAULT_CHUNKSIZE, iter_results, read_jsonl_specs
+
+
+def stream_results(
+    lines: Iterable[str],
+    output: TextIO,
+    workers: int = 0,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> int:
+    """
+    Wertet JSON-Zeilen aus ``lines`` aus und schreibt die Ergebnisse nach ``output``.
+
+    Args:
+        lines: Eingabezeilen, z.B. ``sys.stdin``.
+        output: Ausgabestrom.
+        workers: Anzahl der Prozesse (0 = im aktuellen Prozess, jedes Ergebnis
+                 wird sofort geschrieben).
+        chunksize: Ketten pro Block bei ``workers`` > 0.
+
+    Returns:
+        int: Anzahl der ausgewerteten Ketten.
+    """
+    count = 0
+    for result in iter_results(
+        read_jsonl_specs(lines), workers=workers, chunksize=chunksize
+    ):
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        count += 1
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m helpers.cli",
+        description="Wertet Reihengeschäfte aus JSON-Zeilen (stdin oder Datei) aus "
+        "und schreibt die Ergebnisse als JSON-Zeilen nach stdout.",
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="-",
+        help="Eingabedatei (.jsonl), '-' oder leer für stdin",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Anzahl der Prozesse (Standard: 0 = ohne Prozesspool)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help=f"Ketten pro Block bei --workers (Standard: {DEFAULT_CHUNKSIZE})",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", help="Debug-Meldungen nach stderr"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr
+    )
+
+    try:
+        if args.input == "-":
+            stream_results(sys.stdin, sys.stdout, args.workers, args.chunksize)
+        else:
+            with open(args.input, encoding="utf-8") as f:
+                stream_results(f, sys.stdout, args.workers, args.chunksize)
+    except ValueError as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Leser hat die Pipeline beendet (z.B. ``| head``); weitere Ausgaben
+        # beim Beenden des Interpreters ins Leere schreiben
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
-from helpers.country_data import flags
+import threading
+from collections.abc import Iterable
+
+from helpers.country_names import COUNTRY_NAMES
 
 EU = (
     "AT",
@@ -29,29 +32,142 @@ EU = (
     "ES",
     "SE",
 )
+EU_CODES = frozenset(EU)
+
+# Fester Index aller bekannten Länder (nach ISO-Code sortiert), z.B. für Arrays
+COUNTRY_CODES = tuple(COUNTRY_NAMES)
+COUNTRY_INDEX = {code: i for i, code in enumerate(COUNTRY_CODES)}
+
+# Bits für Länder außerhalb des festen Index (z.B. Platzhalter), fortlaufend vergeben
+_extra_bits: dict[str, int] = {}
+_extra_countries: list["Country"] = []
+_extra_lock = threading.Lock()
+
+# Markierung für noch nicht geladene Flaggen
+_NOT_LOADED = object()
+
+
+def load_flag(code: str) -> str | None:
+    """
+    Lädt die Flagge (SVG) zu einem ISO-Code oder None, falls keine vorhanden ist.
+    Die Flaggendatei wird erst beim ersten Aufruf geöffnet.
+    """
+    from helpers.flag_store import default_store
+
+    return default_store().get(code)
+
+
+# Prozessweites Register: jeder ISO-Code ist genau einem Country-Objekt zugeordnet
+_registry: dict[str, "Country"] = {}
+_registry_lock = threading.Lock()
+
+
+def registered_countries() -> dict[str, "Country"]:
+    """
+    Gibt das prozessweite Länderregister (ISO-Code -> Country) zurück.
+    Beim ersten Aufruf wird es aus der Ländertabelle mit deutschen Namen befüllt.
+    """
+    if _registry:
+        return _registry
+    with _registry_lock:
+        if not _registry:
+            _registry.update(
+                {code: Country(name, code) for code, name in COUNTRY_NAMES.items()}
+            )
+    return _registry
 
 
 class Country:
+    __slots__ = ("name", "code", "_flag", "EU")
+
     def __init__(self, name, code):
         self.name = name
         self.code = code
+        self._flag = _NOT_LOADED  # Wird beim ersten Zugriff auf flag geladen
+        self.EU = self.code in EU_CODES
+
+    @property
+    def flag(self) -> str | None:
+        """Flagge des Landes als SVG, geladen beim ersten Zugriff."""
+        if self._flag is _NOT_LOADED:
+            self._flag = load_flag(self.code)
+        return self._flag
+
+    @flag.setter
+    def flag(self, value: str | None):
+        self._flag = value
+
+    @classmethod
+    def from_code(cls, code: str) -> "Country":
+        """
+        Liefert das eindeutige Country-Objekt zu einem ISO-3166-Alpha-2-Code.
+
+        Raises:
+            ValueError: Wenn der Code unbekannt ist.
+        """
         try:
-            self.flag = flags[self.code]
+            return _registry[code]
         except KeyError:
-            self.flag = None
-        if self.code in EU:
-            self.EU = True
-        else:
-            self.EU = False
+            pass
+        try:
+            return registered_countries()[str(code).strip().upper()]
+        except KeyError:
+            raise ValueError(f"Unbekannter Ländercode: {code}")
 
     def __repr__(self):
         return f"{self.name} ({self.code})"
 
     def __eq__(self, country):
-        if self.name == country.name and self.code == country.code:
+        # Länder sind über ihren ISO-Code eindeutig bestimmt
+        if self is country:
             return True
-        else:
-            return False
+        if not isinstance(country, Country):
+            return NotImplemented
+        return self.code == country.code
 
     def __hash__(self):
-        return hash((self.name, self.code))
\ No newline at end of file
+        return hash(self.code)
+
+
+def country_bit(country: Country) -> int:
+    """
+    Bit eines Landes in Ländermasken. Bekannte Länder nutzen ihre Position in
+    ``COUNTRY_INDEX``, unbekannte Codes erhalten beim ersten Auftreten ein Bit
+    hinter dem festen Index.
+    """
+    index = COUNTRY_INDEX.get(country.code)
+    if index is None:
+        index = _extra_bits.get(country.code)
+        if index is None:
+            with _extra_lock:
+                index = _extra_bits.get(country.code)
+                if index is None:
+                    index = len(COUNTRY_CODES) + len(_extra_countries)
+                    _extra_countries.append(country)
+                    _extra_bits[country.code] = index
+    return 1 << index
+
+
+def mask_of(countries: Iterable[Country]) -> int:
+    """
+    Ländermaske (int) einer Menge von Ländern. Vereinigung und Schnitt sind
+    ``|`` und ``&``, die Anzahl der Länder ist ``mask.bit_count()``.
+    """
+    mask = 0
+    for country in countries:
+        mask |= country_bit(country)
+    return mask
+
+
+def countries_of(mask: int) -> set[Country]:
+    """Wandelt eine Ländermaske zurück in eine Menge von Country-Objekten."""
+    countries = set()
+    while mask:
+        low_bit = mask & -mask
+        index = low_bit.bit_length() - 1
+        if index < len(COUNTRY_CODES):
+            countries.add(Country.from_code(COUNTRY_CODES[index]))
+        else:
+            countries.add(_extra_countries[index - len(COUNTRY_CODES)])
+        mask ^= low_bit
+    return countries
@@ -0,0 +1,306 @@
+"""
+Kettendiagramme als SVG, ohne Graphviz.
+
+Ein Reihengeschäft ist immer ein einfacher Pfad: Kanten verbinden nur benachbarte
+Firmen, dazu kommt höchstens ein Transportbogen vom ersten zum letzten Unternehmen.
+``ChainDiagram`` legt die Firmen daher direkt in Zeilen aus (in O(n)); lange Ketten
+werden schlangenförmig umbrochen (Zeile 1 von links nach rechts, Zeile 2 von rechts
+nach links, ...). Der Transportbogen läuft über der ersten Zeile, am rechten Rand
+und unter der letzten Zeile entlang.
+
+Gerenderte Diagramme werden unter einem Fingerprint ihrer Knoten und Kanten
+zwischengespeichert. Bei unveränderter Kette (z.B. nach dem Umschalten eines
+anderen Widgets) wird das fertige SVG als statisches Bild ausgeliefert.
+"""
+
+import hashlib
+import json
+import textwrap
+from collections.abc import Iterable
+from xml.sax.saxutils import escape, quoteattr
+
+from helpers.result_cache import LRUCache
+
+# Gerenderte Diagramme, Schlüssel ist der Fingerprint der Diagrammquelle
+svg_cache = LRUCache(maxsize=256)
+
+DEFAULT_MAX_WIDTH = 1100
+
+FONT = "Helvetica, Arial, sans-serif"
+FONT_SIZE = 12
+EDGE_FONT_SIZE = 10
+# Geschätzte Zeichenbreite in Einheiten der Schriftgröße (keine Textmessung im Server)
+CHAR_WIDTH = 0.58
+
+MARGIN = 20
+BOX_MIN_WIDTH = 140
+BOX_MAX_WIDTH = 320
+BOX_PADDING = 10
+H_GAP = 190  # Abstand zwischen Firmen einer Zeile (Platz für Kantenbeschriftungen)
+V_GAP = 100  # Abstand zwischen zwei Zeilen
+EDGE_SPACING = 22  # Abstand paralleler Kanten
+TRANSPORT_LANE = 36  # Abstand des Transportbogens über/unter den Firmen
+SIDE_LANE = 110  # Abstand des Transportbogens rechts neben den Firmen
+
+DASHES = {"dashed": "6,4", "dotted": "2,3"}
+
+
+def source_fingerprint(source: str) -> str:
+    """SHA-256 der Diagrammquelle (Knoten und Kanten)."""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _text_width(text: str, font_size: int) -> float:
+    return len(text) * font_size * CHAR_WIDTH
+
+
+def _wrap(text: str, width: float, font_size: int) -> list[str]:
+    """Bricht Beschriftungen um; Zeilenumbrüche im Text bleiben erhalten."""
+    chars = max(8, int(width / (font_size * CHAR_WIDTH)))
+    lines = []
+    for line in text.strip("\n").split("\n"):
+        lines.extend(textwrap.wrap(line, chars) or [""])
+    return lines
+
+
+def _stroke(color: str, style: str, marker: str | None = None) -> str:
+    attrs = f'fill="none" stroke={quoteattr(color)}'
+    styles = {part.strip() for part in style.split(",")}
+    attrs += f' stroke-width="{2.5 if "bold" in styles else 1.2}"'
+    for name, dash in DASHES.items():
+        if name in styles:
+            attrs += f' stroke-dasharray="{dash}"'
+    if marker:
+        attrs += f' marker-end="url(#{marker})"'
+    return attrs
+
+
+def _text(x, y, lines, font_size, anchor="middle") -> list[str]:
+    line_height = font_size + 3
+    return [
+        f'<text x="{x:.1f}" y="{y + i * line_height:.1f}" font-size="{font_size}" '
+        f'text-anchor="{anchor}">{escape(line)}</text>'
+        for i, line in enumerate(lines)
+    ]
+
+
+class ChainDiagram:
+    """
+    Diagramm einer Kette. Firmen werden in Kettenreihenfolge mit ``node`` angelegt,
+    Kanten mit ``edge`` zwischen benachbarten Positionen und der physische
+    Transport mit ``transport``.
+    """
+
+    def __init__(self, max_width: int = DEFAULT_MAX_WIDTH):
+        self.max_width = max_width
+        self.nodes: list[tuple[str, tuple[str, ...]]] = []
+        self.edges: list[tuple[int, int, str, str, str]] = []
+        self.transport_edge: tuple[str, str, str] | None = None
+
+    def node(self, label: str, colors: Iterable[str] = ()) -> int:
+        """
+        Fügt eine Firma hinzu und gibt ihre Position zurück. Mehrere Farben
+        werden als Farbverlauf dargestellt.
+        """
+        self.nodes.append((label, tuple(colors)))
+        return len(self.nodes) - 1
+
+    def edge(
+        self, tail: int, head: int, label: str = "", color="black", style: str = ""
+    ):
+        """Kante zwischen zwei benachbarten Firmen (Positionen)."""
+        if abs(tail - head) != 1:
+            raise ValueError(
+                f"Kanten sind nur zwischen benachbarten Firmen möglich ({tail} -> {head})."
+            )
+        self.edges.append((tail, head, label, color, style))
+
+    def transport(self, label: str = "", color="blue", style: str = "bold"):
+        """Physischer Transport von der ersten zur letzten Firma."""
+        self.transport_edge = (label, color, style)
+
+    @property
+    def source(self) -> str:
+        """Eindeutige Textform der Eingaben (Grundlage für den Cache-Schlüssel)."""
+        return json.dumps(
+            [self.max_width, self.nodes, self.edges, self.transport_edge],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    def to_svg(self) -> str:
+        n = len(self.nodes)
+        if not n:
+            return '<svg xmlns="http://www.w3.org/2000/svg" width="0" height="0"/>'
+
+        # Einheitliche Kastengröße für ein gleichmäßiges Raster
+        longest = max(
+            _text_width(line, FONT_SIZE)
+            for label, _ in self.nodes
+            for line in label.split("\n")
+        )
+        box_w = min(max(BOX_MIN_WIDTH, longest + 2 * BOX_PADDING), BOX_MAX_WIDTH)
+        labels = [
+            _wrap(label, box_w - 2 * BOX_PADDING, FONT_SIZE) for label, _ in self.nodes
+        ]
+        line_height = FONT_SIZE + 3
+        box_h = max(len(lines) for lines in labels) * line_height + 2 * BOX_PADDING
+        # Beschriftungen paralleler Kanten sollen neben die Kästen passen
+        edge_lines = max(
+            (len(_wrap(edge[2], H_GAP - 10, EDGE_FONT_SIZE)) for edge in self.edges),
+            default=0,
+        )
+        box_h = max(box_h, 2 * edge_lines * (EDGE_FONT_SIZE + 3) + EDGE_SPACING + 8)
+
+        available = self.max_width - 2 * MARGIN
+        per_row = max(1, int((available + H_GAP) // (box_w + H_GAP)))
+        if per_row < n and self.transport_edge:
+            per_row = max(1, int((available - SIDE_LANE + H_GAP) // (box_w + H_GAP)))
+        rows = -(-n // per_row)
+        columns = min(n, per_row)
+
+        top = MARGIN + (TRANSPORT_LANE if self.transport_edge else 0)
+        boxes = []
+        for i in range(n):
+            row, column = divmod(i, per_row)
+            if row % 2:
+                column = per_row - 1 - column
+            boxes.append(
+                (MARGIN + column * (box_w + H_GAP), top + row * (box_h + V_GAP))
+            )
+
+        content_right = MARGIN + columns * box_w + (columns - 1) * H_GAP
+        content_bottom = top + rows * box_h + (rows - 1) * V_GAP
+        width = content_right + MARGIN + (SIDE_LANE if rows > 1 else 0)
+        height = content_bottom + MARGIN
+        if self.transport_edge and rows > 1:
+            height += TRANSPORT_LANE
+
+        defs, body = [], []
+        markers: dict[str, str] = {}
+        gradients: dict[tuple[str, ...], str] = {}
+
+        def marker(color: str) -> str:
+            if color not in markers:
+                markers[color] = f"arrow-{len(markers)}"
+                defs.append(
+                    f'<marker id="{markers[color]}" viewBox="0 0 10 10" refX="10" '
+                    f'refY="5" markerWidth="9" markerHeight="9" '
+                    f'markerUnits="userSpaceOnUse" orient="auto">'
+                    f'<path d="M0,0 L10,5 L0,10 z" fill={quoteattr(color)}/></marker>'
+                )
+            return markers[color]
+
+        def fill(colors: tuple[str, ...]) -> str:
+            if not colors:
+                return "white"
+            if len(colors) == 1:
+                return colors[0]
+            if colors not in gradients:
+                gradients[colors] = f"fill-{len(gradients)}"
+                stops = "".join(
+                    f'<stop offset="{i / (len(colors) - 1):.2f}" stop-color={quoteattr(c)}/>'
+                    for i, c in enumerate(colors)
+                )
+                defs.append(
+                    f'<linearGradient id="{gradients[colors]}">{stops}</linearGradient>'
+                )
+            return f"url(#{gradients[colors]})"
+
+        # Firmen
+        for (x, y), lines, (_, colors) in zip(boxes, labels, self.nodes):
+            body.append(
+                f'<rect x="{x:.1f}" y="{y:.1f}" width="{box_w:.1f}" height="{box_h:.1f}" '
+                f'fill={quoteattr(fill(colors))} stroke="black"/>'
+            )
+            first_line = y + (box_h - len(lines) * line_height) / 2 + FONT_SIZE
+            body += _text(x + box_w / 2, first_line, lines, FONT_SIZE)
+
+        # Kanten zwischen Nachbarn: parallel versetzt, Beschriftung außen
+        gaps: dict[int, list[tuple[int, int, str, str, str]]] = {}
+        for edge in self.edges:
+            gaps.setdefault(min(edge[0], edge[1]), []).append(edge)
+        edge_line_height = EDGE_FONT_SIZE + 3
+        for position, gap_edges in gaps.items():
+            (ax, ay), (bx, by) = boxes[position], boxes[position + 1]
+            count = len(gap_edges)
+            for j, (tail, head, label, color, style) in enumerate(gap_edges):
+                offset = (j - (count - 1) / 2) * EDGE_SPACING
+                outer = j < count / 2
+                if ay == by:
+                    y = ay + box_h / 2 + offset
+                    x1, x2 = (ax + box_w, bx) if bx > ax else (ax, bx + box_w)
+                    lines = _wrap(label, H_GAP - 10, EDGE_FONT_SIZE)
+                    label_y = (
+                        y - 4 - (len(lines) - 1) * edge_line_height
+                        if outer
+                        else y + EDGE_FONT_SIZE + 3
+                    )
+                    body += _text(
+                        (x1 + x2) / 2, label_y, lines, EDGE_FONT_SIZE, "middle"
+                    )
+                    start, end = (x1, y), (x2, y)
+                else:
+                    x = ax + box_w / 2 + offset
+                    y1, y2 = ay + box_h, by
+                    lines = _wrap(label, (box_w + H_GAP) / 2 - 20, EDGE_FONT_SIZE)
+                    label_y = (
+                        (y1 + y2) / 2
+                        - (len(lines) * edge_line_height) / 2
+                        + EDGE_FONT_SIZE
+                    )
+                    body += _text(
+                        x - 5 if outer else x + 5,
+                        label_y,
+                        lines,
+                        EDGE_FONT_SIZE,
+                        "end" if outer else "start",
+                    )
+                    start, end = (x, y1), (x, y2)
+                if tail > head:
+                    start, end = end, start
+                body.append(
+                    f'<path d="M{start[0]:.1f},{start[1]:.1f} L{end[0]:.1f},{end[1]:.1f}" '
+                    f"{_stroke(color, style, marker(color))}/>"
+                )
+
+        # Transportbogen von der ersten zur letzten Firma
+        if self.transport_edge and n > 1:
+            label, color, style = self.transport_edge
+            (fx, fy), (lx, ly) = boxes[0], boxes[-1]
+            first_x, last_x = fx + box_w / 2, lx + box_w / 2
+            lane_y = top - TRANSPORT_LANE / 2
+            if rows == 1:
+                path = f"M{first_x:.1f},{fy:.1f} V{lane_y:.1f} H{last_x:.1f} V{ly:.1f}"
+                label_x = (first_x + last_x) / 2
+            else:
+                side_x = content_right + SIDE_LANE / 2
+                bottom_y = content_bottom + TRANSPORT_LANE / 2
+                path = (
+                    f"M{first_x:.1f},{fy:.1f} V{lane_y:.1f} H{side_x:.1f} "
+                    f"V{bottom_y:.1f} H{last_x:.1f} V{ly + box_h:.1f}"
+                )
+                label_x = (first_x + side_x) / 2
+            body.append(
+                f"<path d={quoteattr(path)} {_stroke(color, style, marker(color))}/>"
+            )
+            label = " ".join(label.split())
+            body += _text(label_x, lane_y - 5, [label], EDGE_FONT_SIZE)
+            width = max(width, _text_width(label, EDGE_FONT_SIZE) + 2 * MARGIN)
+
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" '
+            f'height="{height:.0f}" viewBox="0 0 {width:.0f} {height:.0f}" '
+            f"font-family={quoteattr(FONT)}>"
+            f"<defs>{''.join(defs)}</defs>{''.join(body)}</svg>"
+        )
+
+
+def render_svg(diagram: ChainDiagram) -> str:
+    """Rendert das Diagramm als SVG (zwischengespeichert nach Knoten und Kanten)."""
+    return svg_cache.get_or_compute(source_fingerprint(diagram.source), diagram.to_svg)
+
+
+def show_diagram(container, diagram: ChainDiagram):
+    """Zeigt das Diagramm im Streamlit-Container als statisches SVG an."""
+    container.image(render_svg(diagram), use_container_width=True)
@@ -0,0 +1,121 @@
+"""
+Indizierte Binärdatei mit den Länderflaggen (SVG).
+
+Aufbau der Datei (alle Zahlen little-endian)::
+
+    Kopf     "UFLG" | Version (uint16) | Anzahl Einträge (uint16)
+    Index    je Eintrag: Code (8 Byte, mit NUL aufgefüllt) | Offset (uint32) | Länge (uint32)
+    Daten    je Flagge das minifizierte, mit zlib komprimierte SVG
+
+Die Datei wird per ``mmap`` gelesen; beim Zugriff wird nur die angeforderte Flagge
+entpackt. Neu erzeugen aus einer JSON-Datei (Code -> SVG)::
+
+    python -m helpers.flag_store flaggen.json helpers/flags.bin
+"""
+
+import json
+import mmap
+import re
+import struct
+import sys
+import zlib
+from functools import cache
+from pathlib import Path
+
+MAGIC = b"UFLG"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+INDEX_ENTRY = struct.Struct("<8sII")
+
+DEFAULT_PATH = Path(__file__).with_name("flags.bin")
+
+_WHITESPACE_BETWEEN_TAGS = re.compile(r">\s+<")
+
+
+def minify_svg(svg: str) -> str:
+    """Entfernt Leerraum zwischen den Tags eines SVG."""
+    return _WHITESPACE_BETWEEN_TAGS.sub("><", svg.strip())
+
+
+def build_flag_store(flags: dict[str, str], path) -> int:
+    """
+    Schreibt die Flaggen als indizierte Binärdatei.
+
+    Returns:
+        int: Größe der Datei in Byte.
+    """
+    codes = sorted(flags)
+    blobs = [
+        zlib.compress(minify_svg(flags[code]).encode("utf-8"), 9) for code in codes
+    ]
+    offset = HEADER.size + INDEX_ENTRY.size * len(codes)
+    index = []
+    for code, blob in zip(codes, blobs):
+        encoded = code.encode("ascii")
+        if len(encoded) > 8:
+            raise ValueError(f"Ländercode zu lang für den Flaggenindex: {code}")
+        index.append(INDEX_ENTRY.pack(encoded, offset, len(blob)))
+        offset += len(blob)
+    data = b"".join([HEADER.pack(MAGIC, VERSION, len(codes)), *index, *blobs])
+    Path(path).write_bytes(data)
+    return len(data)
+
+
+class FlagStore:
+    """
+    Lesezugriff auf eine mit ``build_flag_store`` erzeugte Flaggendatei.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Ungültige Flaggendatei: {path}")
+        self._index: dict[str, tuple[int, int]] = {}
+        for i in range(count):
+            code, offset, length = INDEX_ENTRY.unpack_from(
+                self._buffer, HEADER.size + i * INDEX_ENTRY.size
+            )
+            self._index[code.rstrip(b"\0").decode("ascii")] = (offset, length)
+
+    def __contains__(self, code) -> bool:
+        return code in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def codes(self) -> list[str]:
+        return list(self._index)
+
+    def get_compressed(self, code: str) -> memoryview | None:
+        """Komprimierte Daten der Flagge als Ausschnitt der gemappten Datei (ohne Kopie)."""
+        try:
+            offset, length = self._index[code]
+        except KeyError:
+            return None
+        return memoryview(self._buffer)[offset : offset + length]
+
+    def get(self, code: str) -> str | None:
+        """Flagge als SVG-Text oder None, falls keine vorhanden ist."""
+        compressed = self.get_compressed(code)
+        if compressed is None:
+            return None
+        with compressed:
+            return zlib.decompress(compressed).decode("utf-8")
+
+
+@cache
+def default_store() -> FlagStore:
+    """Die mit dem Paket ausgelieferte Flaggendatei (einmal pro Prozess geöffnet)."""
+    return FlagStore(DEFAULT_PATH)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Aufruf: python -m helpers.flag_store QUELLE.json [ZIEL.bin]")
+    with open(sys.argv[1], encoding="utf-8") as source:
+        size = build_flag_store(
+            json.load(source), sys.argv[2] if len(sys.argv) == 3 else DEFAULT_PATH
+        )
+    print(f"Flaggendatei geschrieben ({size} Byte).")
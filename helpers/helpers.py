@@ -1,22 +1,21 @@
-import gettext
-from enum import Enum, auto
+from enum import Enum, IntFlag, auto
+from collections.abc import Iterable, Iterator
+from operator import attrgetter
 
-import pycountry
+from helpers.countries import Country, countries_of, country_bit
+from helpers.instrumentation import phase_timer
 
-from helpers.countries import Country
 
-german = gettext.translation("iso3166-1", pycountry.LOCALES_DIR, languages=["de"])
-german.install()
+def _logger():
+    # logging erst bei der ersten Meldung importieren (Importzeit der Engine)
+    import logging
 
+    return logging.getLogger(__name__)
 
-def get_countries() -> list[Country]:
-    """
-    Returns a list of Country objects representing all countries in pycountry.
-    """
-    countries = []
-    for country in pycountry.countries:
-        countries.append(Country(_(country.name), country.alpha_2))
-    return countries
+
+# Version der Berechnungsregeln. Bei fachlichen Änderungen erhöhen, damit
+# zwischengespeicherte Ergebnisse (siehe Fingerprint) ungültig werden.
+ENGINE_VERSION = 2
 
 
 class VatTreatmentType(Enum):
@@ -39,18 +38,130 @@ class IntermediaryStatus(Enum):
     BUYER = auto()
 
 
+class ReportingObligation(IntFlag):
+    """Mögliche Meldepflichten (ohne Schwellenwerte), kombinierbar mit ``|``."""
+
+    NONE = 0
+    ECSL = auto()  # Zusammenfassende Meldung
+    ECSL_TRIANGLE = auto()  # ZM mit Dreieckskennung
+    INTRASTAT_DISPATCH = auto()  # Intrastat Versendung
+    INTRASTAT_ARRIVAL = auto()  # Intrastat Eingang
+
+
+# Deutsche Bezeichnungen für die Anzeige
+REPORTING_LABELS = {
+    ReportingObligation.ECSL: "ZM",
+    ReportingObligation.ECSL_TRIANGLE: "ZM (Dreieck)",
+    ReportingObligation.INTRASTAT_DISPATCH: "Intrastat Versendung",
+    ReportingObligation.INTRASTAT_ARRIVAL: "Intrastat Eingang",
+}
+
+
+def reporting_labels(obligations: int) -> list[str]:
+    """Bezeichnungen der enthaltenen Meldepflichten, alphabetisch sortiert."""
+    return sorted(
+        label for flag, label in REPORTING_LABELS.items() if obligations & flag
+    )
+
+
+# Regel-IDs des Entscheidungswegs einer Lieferung (siehe ``Transaktion.trace``)
+TRACE_RULES = {
+    # Bewegte Lieferung (§ 3 Abs. 6a UStG)
+    "M1": "Erster Lieferant transportiert: erste Lieferung ist bewegt",
+    "M2": "Letzter Abnehmer transportiert: letzte Lieferung ist bewegt",
+    "M3": "Zwischenhändler mit Status Abnehmer: Lieferung an ihn ist bewegt",
+    "M4": "Zwischenhändler mit Status Lieferer: Lieferung von ihm ist bewegt",
+    "M5": "Zwischenhändler mit USt-ID des Abgangslandes: Lieferung an ihn ist bewegt",
+    "M6": "Zwischenhändler ohne Status (Regelvermutung): Lieferung von ihm ist bewegt",
+    # Lieferort
+    "P1": "Bewegte Lieferung: Ort am Beginn der Beförderung",
+    "P2": "Einfuhr, Lieferant schuldet EUSt: Ort ins Einfuhrland verlagert (§ 3 Abs. 8 UStG)",
+    "P3": "Ruhende Lieferung vor der bewegten: Ort im Abgangsland",
+    "P4": "Ruhende Lieferung nach der bewegten: Ort im Bestimmungsland",
+    # Steuerliche Behandlung
+    "T0": "Ort der Lieferung unbekannt",
+    "D1": "Lieferant aus einem Drittland",
+    "D2": "Lieferant schuldet EUSt: steuerpflichtig im Lieferort",
+    "D3": "Kunde im Lieferort ansässig: Reverse Charge",
+    "D4": "Kunde nicht im Lieferort ansässig: steuerpflichtig, § 13b prüfen",
+    "B1": "Bewegte Lieferung",
+    "B2": "Lieferort und Bestimmungsland in der EU",
+    "B3": "Dreiecksgeschäft: steuerfreie innergemeinschaftliche Lieferung (§ 25b UStG)",
+    "B4": "Lieferort ungleich Bestimmungsland: steuerfreie innergemeinschaftliche Lieferung",
+    "B5": "Lieferort gleich Bestimmungsland, Lieferant und Kunde im Inland: steuerpflichtig",
+    "B6": "Lieferort gleich Bestimmungsland, Beteiligter aus dem Ausland: steuerpflichtig, RC prüfen",
+    "B7": "Lieferort in der EU, Bestimmungsland außerhalb: steuerfreie Ausfuhr (§ 6 UStG)",
+    "B8": "Lieferort außerhalb der EU: nicht steuerbar",
+    "B9": "Kein Regelfall der bewegten Lieferung: steuerpflichtig, Prüfung nötig",
+    "R1": "Ruhende Lieferung, Lieferort in der EU",
+    "R2": "Zweite Lieferung im Dreiecksgeschäft: Reverse Charge (§ 25b UStG)",
+    "R3": "Kunde im Lieferort ansässig, Lieferant nicht: Reverse Charge (§ 13b UStG)",
+    "R4": "Steuerpflichtig im Lieferort",
+    "R5": "Ruhende Lieferung, Lieferort außerhalb der EU: nicht steuerbar",
+    # Meldepflichten
+    "Z1": "Steuerfreie innergemeinschaftliche Lieferung: ZM",
+    "Z2": "Bewegte innergemeinschaftliche Lieferung: Intrastat Versendung und Eingang",
+}
+
+
+def _chain_attribute(slot: str, detach: bool = False) -> property:
+    """
+    Attribut einer Handelsstufe, dessen Änderung die Kette der Firma betrifft:
+    Rollen machen die zwischengespeicherten Indizes der Kette ungültig,
+    Verknüpfungen lösen die Firmen von der Kette (siehe ``Chain.detach``).
+    """
+    get = attrgetter(slot)
+
+    def set(self, value):
+        if get(self) is value:
+            return
+        object.__setattr__(self, slot, value)
+        chain = self.chain
+        if chain is not None:
+            if detach:
+                chain.detach()
+            else:
+                chain.invalidate()
+
+    return property(get, set)
+
+
 class Handelsstufe:
     """
     Represents a company in a chain transaction.
     """
 
+    __slots__ = (
+        "country",
+        "_responsible_for_shippment",
+        "_responsible_for_customs",
+        "_responsible_for_import_vat",
+        "_next_company",
+        "_previous_company",
+        "intermediary_status",
+        "identifier",
+        "max_identifier",
+        "changed_vat",
+        "new_country",
+        "chain",
+    )
+
+    # Rollen und Verknüpfungen benachrichtigen bei Änderungen die Kette der Firma
+    responsible_for_shippment = _chain_attribute("_responsible_for_shippment")
+    responsible_for_customs = _chain_attribute("_responsible_for_customs")
+    responsible_for_import_vat = _chain_attribute("_responsible_for_import_vat")
+    next_company = _chain_attribute("_next_company", detach=True)
+    previous_company = _chain_attribute("_previous_company", detach=True)
+
     def __init__(self, country: Country, identifier: int = 0, max_identifier: int = 0):
         self.country = country
-        self.responsible_for_shippment = False
-        self.responsible_for_customs = False
-        self.responsible_for_import_vat: bool = False
-        self.next_company: [Handelsstufe] = None  # Type Hint hinzugefügt
-        self.previous_company: [Handelsstufe] = None  # Type Hint hinzugefügt
+        # Noch keine Kette: Rollen und Verknüpfungen direkt setzen
+        self.chain: Chain | None = None
+        self._responsible_for_shippment = False
+        self._responsible_for_customs = False
+        self._responsible_for_import_vat: bool = False
+        self._next_company: [Handelsstufe] = None  # Type Hint hinzugefügt
+        self._previous_company: [Handelsstufe] = None  # Type Hint hinzugefügt
         self.intermediary_status: IntermediaryStatus | None = None
         self.identifier = identifier
         self.max_identifier = max_identifier
@@ -132,55 +243,244 @@ class Handelsstufe:
         """
         self.new_country = new_country
         self.changed_vat = True
+        if self.chain is not None:
+            self.chain.invalidate()
         return self
 
+    def linked_chain(self) -> "Chain":
+        """
+        Die Kette der Firma. Gehört sie zu keiner Kette, wird diese einmalig aus den
+        Verknüpfungen aufgebaut (und dabei auf Kreise geprüft).
+        """
+        return self.chain if self.chain is not None else Chain.from_links(self)
+
     def find_start_company(self):
         """
         Finds the start company in the chain transaction.
         """
-        if self.previous_company:
-            return self.previous_company.find_start_company()
-        else:
-            return self
+        return self.linked_chain().start
 
     def find_end_company(self):
         """
         Finds the end company in the chain transaction.
         """
-        if self.next_company:
-            return self.next_company.find_end_company()
-        else:
-            return self
+        return self.linked_chain().end
 
     def find_shipping_company(self):
         """
         Finds the shipping company in the chain transaction. Function only works, when started in the first company.
         """
-        if self.responsible_for_shippment:
-            return self
-        elif self.next_company:
-            return self.next_company.find_shipping_company()
-        # Fallback, falls keine Firma explizit markiert ist (sollte nicht passieren bei korrekter Eingabe)
-        elif (
-            not self.previous_company
-        ):  # Nur wenn wir beim Start sind und nichts gefunden wurde
-            return None
-        else:  # Sollte nicht erreicht werden, wenn von Start aus aufgerufen
-            return None
+        return self._chain_from_here().shipping_company
 
     def find_custom_company(self):
         """
         Finds the custom handling company in the chain transaction. Function only works, when started in the first company.
         """
-        if self.responsible_for_customs:
-            return self
-        elif self.next_company:
-            return self.next_company.find_custom_company()
-        # Fallback
-        elif not self.previous_company:
-            return None
-        else:
-            return None
+        return self._chain_from_here().customs_company
+
+    def _chain_from_here(self) -> "Chain":
+        chain = self.linked_chain()
+        return chain if chain.start is self else Chain.from_start(self)
+
+
+def _follow(company: Handelsstufe, link: str) -> list[Handelsstufe]:
+    """
+    Folgt den Verknüpfungen ``link`` (``next_company`` oder ``previous_company``)
+    ab ``company`` iterativ und gibt alle besuchten Firmen zurück.
+
+    Raises:
+        ValueError: Wenn die Verknüpfungen einen Kreis bilden.
+    """
+    companies = []
+    seen = set()
+    current = company
+    while current is not None:
+        if current in seen:
+            raise ValueError(f"Kreis in der Kette bei {current} entdeckt.")
+        seen.add(current)
+        companies.append(current)
+        current = getattr(current, link)
+    return companies
+
+
+class Chain:
+    """
+    Zusammenhängende Kette von Handelsstufen mit Positionszugriff in O(1).
+
+    Die Firmen werden in einer Liste gehalten; Position, Nachbarn und die Indizes
+    der Firmen für Transport, Zoll und EUSt sind ohne erneutes Durchlaufen der Kette
+    abrufbar. Die Verknüpfungen ``next_company``/``previous_company`` bleiben als
+    Kompatibilitätsansicht erhalten und werden beim Aufbau gesetzt.
+
+    Jede Firma gehört zu höchstens einer Kette (``Handelsstufe.chain``). Ändern
+    sich Rollen oder USt-ID einer Firma, erhöht die Kette ihre ``revision`` und
+    ermittelt abgeleitete Werte neu; Änderungen an den Verknüpfungen lösen die
+    Firmen von der Kette (``detach``). Bei direkten Änderungen anderer Attribute
+    ist ``invalidate()`` aufzurufen.
+    """
+
+    def __init__(
+        self, companies: Iterable[Handelsstufe], link: bool = True, attach: bool = True
+    ):
+        self.companies: list[Handelsstufe] = list(companies)
+        if link:
+            previous = None
+            for company in self.companies:
+                company._previous_company = previous
+                if previous is not None:
+                    previous._next_company = company
+                previous = company
+            if previous is not None:
+                previous._next_company = None
+        self._positions: dict[Handelsstufe, int] = {
+            company: i for i, company in enumerate(self.companies)
+        }
+        if len(self._positions) != len(self.companies):
+            raise ValueError("Eine Firma kommt mehrfach in der Kette vor.")
+        self.revision = 0
+        # Indizes der verantwortlichen Firmen, neu ermittelt bei Änderungen an der Kette
+        self._roles_revision: int | None = None
+        self._shipping_index: int | None = None
+        self._customs_index: int | None = None
+        self._import_vat_index: int | None = None
+        # Nur eine Kette, der ihre Firmen gehören, erfährt von Änderungen
+        self._attached = attach
+        if attach:
+            for company in self.companies:
+                owner = company.chain
+                if owner is not None and owner is not self:
+                    owner.detach()
+                company.chain = self
+
+    @classmethod
+    def from_start(cls, start_company: Handelsstufe) -> "Chain":
+        """
+        Baut die Kette aus den bestehenden Verknüpfungen ab ``start_company`` auf.
+        Ist ``start_company`` der Anfang der Verknüpfungen, gehören die Firmen
+        anschließend zu dieser Kette.
+
+        Raises:
+            ValueError: Wenn die Verknüpfungen einen Kreis bilden.
+        """
+        return cls(
+            _follow(start_company, "next_company"),
+            link=False,
+            attach=start_company.previous_company is None,
+        )
+
+    @classmethod
+    def from_links(cls, company: Handelsstufe) -> "Chain":
+        """
+        Baut die gesamte Kette, in der ``company`` verknüpft ist, aus den
+        Verknüpfungen auf; die Firmen gehören anschließend zu dieser Kette.
+
+        Raises:
+            ValueError: Wenn die Verknüpfungen einen Kreis bilden.
+        """
+        return cls.from_start(_follow(company, "previous_company")[-1])
+
+    def invalidate(self):
+        """Verwirft abgeleitete Werte (Rollen-Indizes, Dreiecksprüfung)."""
+        self.revision += 1
+
+    def detach(self):
+        """
+        Löst die Firmen von der Kette, z.B. nachdem ihre Verknüpfungen geändert
+        wurden. Die Kette bleibt nutzbar, ermittelt Rollen dann aber bei jedem Zugriff.
+        """
+        if not self._attached:
+            return
+        self._attached = False
+        self.invalidate()
+        for company in self.companies:
+            if company.chain is self:
+                company.chain = None
+
+    def __len__(self) -> int:
+        return len(self.companies)
+
+    def __iter__(self) -> Iterator[Handelsstufe]:
+        return iter(self.companies)
+
+    def __getitem__(self, position):
+        return self.companies[position]
+
+    def __contains__(self, company) -> bool:
+        return company in self._positions
+
+    def __repr__(self):
+        return f"Chain({self.companies})"
+
+    @property
+    def start(self) -> Handelsstufe | None:
+        return self.companies[0] if self.companies else None
+
+    @property
+    def end(self) -> Handelsstufe | None:
+        return self.companies[-1] if self.companies else None
+
+    def index(self, company: Handelsstufe) -> int:
+        """Position der Firma in der Kette."""
+        try:
+            return self._positions[company]
+        except KeyError:
+            raise ValueError(f"{company} ist nicht Teil der Kette.")
+
+    def next_of(self, company: Handelsstufe) -> Handelsstufe | None:
+        """Nachfolger der Firma in der Kette (None beim Empfänger)."""
+        position = self.index(company) + 1
+        return self.companies[position] if position < len(self.companies) else None
+
+    def previous_of(self, company: Handelsstufe) -> Handelsstufe | None:
+        """Vorgänger der Firma in der Kette (None beim Verkäufer)."""
+        position = self.index(company)
+        return self.companies[position - 1] if position > 0 else None
+
+    def _refresh_roles(self):
+        if self._attached and self._roles_revision == self.revision:
+            return
+        self._shipping_index = None
+        self._customs_index = None
+        self._import_vat_index = None
+        for i, company in enumerate(self.companies):
+            # Jeweils die erste verantwortliche Firma zählt
+            if self._shipping_index is None and company.responsible_for_shippment:
+                self._shipping_index = i
+            if self._customs_index is None and company.responsible_for_customs:
+                self._customs_index = i
+            if self._import_vat_index is None and company.responsible_for_import_vat:
+                self._import_vat_index = i
+        self._roles_revision = self.revision
+
+    @property
+    def shipping_index(self) -> int | None:
+        self._refresh_roles()
+        return self._shipping_index
+
+    @property
+    def customs_index(self) -> int | None:
+        self._refresh_roles()
+        return self._customs_index
+
+    @property
+    def import_vat_index(self) -> int | None:
+        self._refresh_roles()
+        return self._import_vat_index
+
+    @property
+    def shipping_company(self) -> Handelsstufe | None:
+        index = self.shipping_index
+        return None if index is None else self.companies[index]
+
+    @property
+    def customs_company(self) -> Handelsstufe | None:
+        index = self.customs_index
+        return None if index is None else self.companies[index]
+
+    @property
+    def import_vat_company(self) -> Handelsstufe | None:
+        index = self.import_vat_index
+        return None if index is None else self.companies[index]
 
 
 class Lieferung:
@@ -188,6 +488,18 @@ class Lieferung:
     Repräsentiert eine einzelne Lieferung innerhalb eines Reihengeschäfts.
     """
 
+    __slots__ = (
+        "lieferant",
+        "kunde",
+        "is_moved_supply",
+        "place_of_supply",
+        "transaction",
+        "vat_treatment",
+        "invoice_note",
+        "reporting",
+        "trace",
+    )
+
     def __init__(
         self,
         lieferant: Handelsstufe,
@@ -202,10 +514,44 @@ class Lieferung:
         self.vat_treatment: VatTreatmentType = VatTreatmentType.UNKNOWN
         self.invoice_note: [str] = None  # Hinweis für die Rechnung
 
-        # Flags für Meldepflichten
-        self.potential_intrastat_dispatch: bool = False  # Intrastat Versendung
-        self.potential_intrastat_arrival: bool = False  # Intrastat Eingang
-        self.potential_ecsl_report: bool = False  # ZM (Zusammenfassende Meldung)
+        # Mögliche Meldepflichten dieser Lieferung
+        self.reporting: ReportingObligation = ReportingObligation.NONE
+        # Entscheidungsweg als Regel-IDs (siehe TRACE_RULES), None wenn nicht aufgezeichnet
+        self.trace: list[str] | None = None
+
+    # Bisherige Einzel-Flags als Sicht auf ``reporting``
+    @property
+    def potential_intrastat_dispatch(self) -> bool:
+        """Intrastat Versendung"""
+        return bool(self.reporting & ReportingObligation.INTRASTAT_DISPATCH)
+
+    @potential_intrastat_dispatch.setter
+    def potential_intrastat_dispatch(self, value: bool):
+        self._set_reporting(ReportingObligation.INTRASTAT_DISPATCH, value)
+
+    @property
+    def potential_intrastat_arrival(self) -> bool:
+        """Intrastat Eingang"""
+        return bool(self.reporting & ReportingObligation.INTRASTAT_ARRIVAL)
+
+    @potential_intrastat_arrival.setter
+    def potential_intrastat_arrival(self, value: bool):
+        self._set_reporting(ReportingObligation.INTRASTAT_ARRIVAL, value)
+
+    @property
+    def potential_ecsl_report(self) -> bool:
+        """ZM (Zusammenfassende Meldung)"""
+        return bool(self.reporting & ReportingObligation.ECSL)
+
+    @potential_ecsl_report.setter
+    def potential_ecsl_report(self, value: bool):
+        self._set_reporting(ReportingObligation.ECSL, value)
+
+    def _set_reporting(self, flag: ReportingObligation, value: bool):
+        if value:
+            self.reporting |= flag
+        else:
+            self.reporting &= ~flag
 
     def get_vat_treatment_display(self) -> str:
         """Gibt eine benutzerfreundliche Zeichenkette für die Steuerbehandlung zurück."""
@@ -266,24 +612,20 @@ class Lieferung:
             self.place_of_supply = start_country
         else:
             # Prüfen, ob diese Lieferung VOR oder NACH der bewegten Lieferung liegt.
-            current = self.kunde
-            is_before = False
-            while current is not None:
-                # Wir prüfen, ob der *Kunde* dieser Lieferung der *Lieferant* der bewegten Lieferung ist
-                # oder ob der *Lieferant* dieser Lieferung der *Lieferant* der bewegten Lieferung ist.
-                # Das deckt den Fall ab, dass die bewegte Lieferung die erste ist.
-                if (
-                    current == bewegte_lieferung.lieferant
-                    or self.lieferant == bewegte_lieferung.lieferant
-                ):
-                    is_before = True
-                    break
-                # Sicherheitscheck, um Endlosschleifen bei fehlerhafter Kette zu vermeiden
-                if current == current.next_company:
-                    raise ValueError(
-                        f"Warnung: Endlosschleife in Kette bei {current} entdeckt."
-                    )
-                current = current.next_company
+            if self.transaction is not None:
+                # Vergleich der Positionen der Lieferanten in der Kette (O(1))
+                firmen = self.transaction.chain
+                is_before = firmen.index(self.lieferant) <= firmen.index(
+                    bewegte_lieferung.lieferant
+                )
+            else:
+                # Ohne Transaktion: Liegt der Lieferant der bewegten Lieferung in der
+                # Kette hinter dem Lieferanten dieser Lieferung? (Kreise werden beim
+                # Aufbau der Kette erkannt)
+                firmen = self.lieferant.linked_chain()
+                is_before = bewegte_lieferung.lieferant in firmen and firmen.index(
+                    self.lieferant
+                ) <= firmen.index(bewegte_lieferung.lieferant)
 
             if is_before:
                 # Ruhende Lieferungen VOR der bewegten gelten als dort ausgeführt,
@@ -299,14 +641,18 @@ class Lieferung:
     def determine_vat_treatment(self, start_country: Country, end_country: Country):
         """Determines the VAT treatment based on supply type, place, and countries involved."""
 
-        self.potential_intrastat_dispatch = False
-        self.potential_intrastat_arrival = False
-        self.potential_ecsl_report = False
+        self.reporting = ReportingObligation.NONE
+        trace = self.trace
+        if trace is not None:
+            # Nur Zuordnung und Ort behalten, falls erneut bestimmt wird
+            trace[:] = [rule for rule in trace if rule[0] in "MP"]
 
         place = self.place_of_supply
         if place is None:
             self.vat_treatment = VatTreatmentType.UNKNOWN
             self.invoice_note = "Ort der Lieferung unbekannt"
+            if trace is not None:
+                trace.append("T0")
             return
 
         # Nutze das Land der USt-ID, falls abweichend, sonst Heimatland
@@ -318,8 +664,12 @@ class Lieferung:
             # Fall: Lieferant ist NICHT EU, Ort ist aber EU (z.B. durch §3 Abs. 8)
             # Prüfe, ob Lieferant die EUSt schuldet
             lieferant_pays_import_vat = self.lieferant.responsible_for_import_vat
+            if trace is not None:
+                trace.append("D1")
 
             if lieferant_pays_import_vat:
+                if trace is not None:
+                    trace.append("D2")
                 # Lieferant (Nicht-EU) schuldet EUSt -> wird wie Inländer behandelt
                 # -> Normale Steuerpflicht für diese Lieferung im 'place'-Land
                 self.vat_treatment = VatTreatmentType.TAXABLE_NORMAL
@@ -335,7 +685,11 @@ class Lieferung:
                 if kunde_is_taxable_person_in_place:
                     self.vat_treatment = VatTreatmentType.TAXABLE_REVERSE_CHARGE
                     self.invoice_note = f"Reverse Charge in {place.code}"
+                    if trace is not None:
+                        trace.append("D3")
                 else:
+                    if trace is not None:
+                        trace.append("D4")
                     self.vat_treatment = VatTreatmentType.TAXABLE_NORMAL
                     self.invoice_note = (
                         f"Steuerpflichtig in {place.code} (Prüfung §13b nötig)"
@@ -344,6 +698,10 @@ class Lieferung:
         # --- Moved Supply Logic ---
         elif self.is_moved_supply:
             is_eu_transaction = place.EU and end_country.EU  # Grundprüfung EU
+            if trace is not None:
+                trace.append("B1")
+                if is_eu_transaction:
+                    trace.append("B2")
 
             # Prüfung auf Dreiecksgeschäft ---
             is_triangle = False
@@ -353,14 +711,15 @@ class Lieferung:
                     # Rufe die Prüfmethode der Transaktion auf
                     is_triangle = self.transaction.is_triangular_transaction()
                 except Exception as e:
-                    # Optional: Fehler loggen, falls die Prüfung fehlschlägt
-                    print(f"DEBUG: Fehler bei Prüfung auf Dreiecksgeschäft: {e}")
+                    _logger().debug("Fehler bei Prüfung auf Dreiecksgeschäft: %s", e)
                     # Fahre fort, als wäre es kein Dreiecksgeschäft
 
             if is_eu_transaction and is_triangle:
                 # Fall: Bewegte Lieferung im Rahmen eines vereinfachten Dreiecksgeschäfts (§ 25b UStG)
                 # Diese ist IMMER eine steuerfreie innergemeinschaftliche Lieferung.
                 self.vat_treatment = VatTreatmentType.EXEMPT_IC_SUPPLY
+                if trace is not None:
+                    trace.append("B3")
                 # Spezifischer Rechnungshinweis
                 self.invoice_note = "Steuerfreie innergem. Lieferung (Dreiecksgeschäft)"
                 # Optional: Gesetzliche Referenz hinzufügen
@@ -377,6 +736,8 @@ class Lieferung:
                     # Annahme: Formelle Voraussetzungen (USt-IDs etc.) sind erfüllt.
                     self.vat_treatment = VatTreatmentType.EXEMPT_IC_SUPPLY
                     self.invoice_note = f"Steuerfreie innergem. Lieferung ({place.code} -> {end_country.code})"
+                    if trace is not None:
+                        trace.append("B4")
                     # TODO: Ggf. Prüfung der USt-ID des Kunden hinzufügen
 
                 # 2. Ist es eine rein inländische Lieferung im 'place'-Land?
@@ -386,6 +747,8 @@ class Lieferung:
                     if lieferant_country == place and kunde_country == place:
                         # Klassische Inlandslieferung
                         self.vat_treatment = VatTreatmentType.TAXABLE_NORMAL
+                        if trace is not None:
+                            trace.append("B5")
                         self.invoice_note = f"Steuerpflichtig in {place.code}"
                     else:
                         # Lieferung findet im Inland ('place') statt, aber Lieferant oder Kunde
@@ -393,6 +756,8 @@ class Lieferung:
                         # Hier könnte man noch auf Reverse Charge prüfen, wenn lieferant != place und kunde == place.
                         # Vereinfachung: Erstmal als normal steuerpflichtig behandeln.
                         self.vat_treatment = VatTreatmentType.TAXABLE_NORMAL
+                        if trace is not None:
+                            trace.append("B6")
                         self.invoice_note = (
                             f"Steuerpflichtig in {place.code} (Inland, ggf. RC prüfen)"
                         )
@@ -403,38 +768,45 @@ class Lieferung:
                     self.invoice_note = (
                         f"Steuerpflichtig in {place.code} (Prüfung nötig)"
                     )
+                    if trace is not None:
+                        trace.append("B9")
                 # --- ENDE NEUE PRÜFUNG ---
 
             elif place.EU and not end_country.EU:  # Export aus EU
                 self.vat_treatment = VatTreatmentType.EXEMPT_EXPORT
                 self.invoice_note = "Steuerfreie Ausfuhrlieferung (§ 6 UStG)"
+                if trace is not None:
+                    trace.append("B7")
 
             elif not place.EU:  # Lieferung startet außerhalb der EU
                 self.vat_treatment = VatTreatmentType.OUT_OF_SCOPE
                 self.invoice_note = f"Nicht steuerbar (außerhalb EU: {place.code})"
+                if trace is not None:
+                    trace.append("B8")
             # Ggf. weitere Fälle (z.B. Import) hier behandeln
 
         # --- Stationary Supply Logic ---
         else:  # Ruhende Lieferung
             if place.EU:
+                if trace is not None:
+                    trace.append("R1")
 
                 # 1. Prüfung: Ist dies die zweite Lieferung (B->C) in einem gültigen Dreiecksgeschäft?
                 is_triangle_and_second_delivery = False
-                if (
-                    self.transaction
-                    and len(self.transaction.get_ordered_chain_companies()) == 3
-                ):
+                if self.transaction:
                     try:
-                        # Prüfe, ob die gesamte Transaktion ein Dreieck ist
-                        if self.transaction.is_triangular_transaction():
-                            # Prüfe, ob DIESE Lieferung die von B nach C ist
-                            firmen = self.transaction.get_ordered_chain_companies()
-                            if self.lieferant == firmen[1] and self.kunde == firmen[2]:
-                                is_triangle_and_second_delivery = True
+                        # Rollen A, B, C sind nur gesetzt, wenn die Transaktion ein Dreieck ist
+                        roles = self.transaction.get_triangle_roles()
+                        # Prüfe, ob DIESE Lieferung die von B nach C ist
+                        if (
+                            roles
+                            and self.lieferant == roles[1]
+                            and self.kunde == roles[2]
+                        ):
+                            is_triangle_and_second_delivery = True
                     except Exception as e:
-                        # Optional: Fehler loggen, falls die Prüfung fehlschlägt
-                        print(
-                            f"DEBUG: Fehler bei Prüfung auf Dreiecksgeschäft für RC: {e}"
+                        _logger().debug(
+                            "Fehler bei Prüfung auf Dreiecksgeschäft für RC: %s", e
                         )
                         pass  # Fehler hier ignorieren, fahre mit Standardprüfung fort
 
@@ -442,6 +814,8 @@ class Lieferung:
                 if is_triangle_and_second_delivery:
                     # Fall 1: Zwingendes Reverse Charge wegen Dreiecksgeschäft (§ 25b UStG)
                     self.vat_treatment = VatTreatmentType.TAXABLE_TRIANGULAR_BUSINESS
+                    if trace is not None:
+                        trace.append("R2")
                     self.invoice_note = f"Reverse Charge (Dreiecksgeschäft § 25b, Steuerschuldner: Kunde in {place.code})"
 
                 else:
@@ -464,14 +838,20 @@ class Lieferung:
                         # Fall 2a: Standard Reverse Charge (§ 13b UStG) greift
                         self.vat_treatment = VatTreatmentType.TAXABLE_REVERSE_CHARGE
                         self.invoice_note = f"Reverse Charge (§ 13b UStG, Steuerschuldner: Kunde in {place.code})"
+                        if trace is not None:
+                            trace.append("R3")
                     else:
                         # Fall 2b: Kein RC -> Normale Steuerpflicht im Lieferort
                         self.vat_treatment = VatTreatmentType.TAXABLE_NORMAL
+                        if trace is not None:
+                            trace.append("R4")
                         self.invoice_note = f"Steuerpflichtig in {place.code}"
                         # Hinweis: Wenn lieferant != place, aber kein RC greift,
                         # müsste sich der Lieferant in 'place' registrieren.
             else:  # Ort der ruhenden Lieferung ist außerhalb der EU
                 self.vat_treatment = VatTreatmentType.OUT_OF_SCOPE
+                if trace is not None:
+                    trace.append("R5")
                 self.invoice_note = f"Nicht steuerbar (außerhalb EU: {place.code})"
 
         # Fallback, falls keine Behandlung ermittelt wurde
@@ -480,14 +860,20 @@ class Lieferung:
 
         elif self.vat_treatment == VatTreatmentType.EXEMPT_IC_SUPPLY:
             # ZM ist immer für den Lieferanten relevant bei steuerfreier IG Lieferung
-            self.potential_ecsl_report = True
+            self.reporting = ReportingObligation.ECSL
+            if trace is not None:
+                trace.append("Z1")
 
             # Intrastat ist an die *bewegte* IG Lieferung gekoppelt
             if self.is_moved_supply:
-                # Lieferant meldet Versendung aus dem Abgangsland (place)
-                self.potential_intrastat_dispatch = True
+                # Lieferant meldet Versendung aus dem Abgangsland (place),
                 # Kunde meldet Eingang im Bestimmungsland (end_country)
-                self.potential_intrastat_arrival = True
+                self.reporting |= (
+                    ReportingObligation.INTRASTAT_DISPATCH
+                    | ReportingObligation.INTRASTAT_ARRIVAL
+                )
+                if trace is not None:
+                    trace.append("Z2")
         # Hinweis: Bei Dreiecksgeschäften gelten ggf. Sonderregeln für ZM/Intrastat,
         # die hier vereinfacht dargestellt werden. Die ZM muss z.B. besonders gekennzeichnet werden.
         # Intrastat wird oft nur vom ersten Abnehmer (B) und letzten Empfänger (C) gemeldet.
@@ -511,62 +897,128 @@ class Transaktion:
         self.lieferungen: list[Lieferung] = (
             []
         )  # Liste der Lieferungen in dieser Transaktion
+        # Zwischengespeichertes Ergebnis der Dreiecksprüfung (Rollen A, B, C oder None),
+        # gültig für die Revision der Kette und die Lieferungsliste, mit der es ermittelt wurde
+        self._triangle_roles: tuple[Handelsstufe, Handelsstufe, Handelsstufe] | None = (
+            None
+        )
+        self._triangle_key: tuple | None = None
+        self._chain: Chain | None = None
+        # Entscheidungsweg je Lieferung aufzeichnen (Lieferung.trace, siehe TRACE_RULES)
+        self.trace: bool = False
+
+    @classmethod
+    def from_chain(cls, chain: Chain) -> "Transaktion":
+        """
+        Erstellt eine Transaktion direkt aus einer Kette. Die Kette bleibt
+        maßgeblich, auch wenn ihre Firmen nicht (mehr) verknüpft sind.
+        """
+        transaction = cls(chain.start, chain.end)
+        transaction._chain = chain
+        return transaction
+
+    @property
+    def chain(self) -> Chain:
+        """
+        Die an ``from_chain`` übergebene Kette, sonst die Kette, zu der
+        ``start_company`` gehört. Nur wenn die Firma zu keiner Kette gehört (oder
+        nicht deren Anfang ist), wird die Kette aus den Verknüpfungen aufgebaut.
+        """
+        if self._chain is not None:
+            return self._chain
+        chain = self.start_company.chain
+        if chain is None or chain.start is not self.start_company:
+            chain = Chain.from_start(self.start_company)
+        return chain
 
     def find_shipping_company(self) -> [Handelsstufe]:
         """
         Finds the shipping company in the chain transaction.
-        Iterative approach starting from the start_company.
+        Uses the precomputed index of the chain.
         """
-        current_company = self.start_company
-        while current_company:
-            if current_company.responsible_for_shippment:
-                self.shipping_company = current_company
-                return self.shipping_company
-            current_company = current_company.next_company
-        self.shipping_company = None  # Explizit None setzen, wenn keine gefunden wurde
-        return None
+        self.shipping_company = self.chain.shipping_company
+        return self.shipping_company
 
     def find_custom_company(self) -> [Handelsstufe]:
         """
         Finds the custom handling company in the chain transaction.
-        Iterative approach starting from the start_company.
+        Uses the precomputed index of the chain.
         """
-        current_company = self.start_company
-        while current_company:
-            if current_company.responsible_for_customs:
-                self.customs_company = current_company
-                return self.customs_company
-            current_company = current_company.next_company
-        self.customs_company = None  # Explizit None setzen, wenn keine gefunden wurde
-        return None
+        self.customs_company = self.chain.customs_company
+        return self.customs_company
 
     def get_ordered_chain_companies(self) -> list[Handelsstufe]:
         """
         Returns the ordered chain companies.
         """
-        companies = []
-        current_company = self.start_company
-        while current_company:
-            companies.append(current_company)
-            current_company = current_company.next_company
-        return companies
+        return list(self.chain.companies)
 
     def includes_only_eu_countries(self) -> bool:
         """Checks if all companies in the chain are located in the EU."""
         # Diese Methode ist jetzt weniger kritisch, da die Länder pro Lieferung geprüft werden,
         # aber kann für übergreifende Logik nützlich sein.
-        return all(company.country.EU for company in self.get_ordered_chain_companies())
+        return all(company.country.EU for company in self.chain)
 
     def is_triangular_transaction(self) -> bool:
         """
         Prüft, ob die Voraussetzungen für ein innergemeinschaftliches Dreiecksgeschäft
         nach § 25b UStG (oder Art. 141 MwStSystRL) vorliegen.
         """
-        firmen = self.get_ordered_chain_companies()
+        return self.get_triangle_roles() is not None
+
+    def get_triangle_roles(
+        self,
+    ) -> tuple[Handelsstufe, Handelsstufe, Handelsstufe] | None:
+        """
+        Gibt die Rollen (A, B, C) des Dreiecksgeschäfts zurück oder None, wenn
+        kein Dreiecksgeschäft vorliegt.
+
+        Das Ergebnis wird je Berechnung einmal ermittelt und zwischengespeichert.
+        Es wird neu bestimmt, sobald die Lieferungen neu berechnet wurden, sich die
+        Revision der Kette erhöht oder sich Land bzw. USt-ID einer der drei Firmen
+        geändert hat.
+        """
+        firmen = self._chain
+        if firmen is None:
+            firmen = self.chain
+        companies = firmen.companies
+        if len(companies) != 3:
+            # Nur Ketten aus genau drei Firmen können Dreiecksgeschäfte sein
+            return None
+        a, b, c = companies
+        # Kette und Lieferungen per Identität, Revision und Länder per Gleichheit
+        state = (
+            firmen.revision,
+            a.country,
+            b.country,
+            b.changed_vat,
+            b.new_country,
+            c.country,
+        )
+        cached = self._triangle_key
+        if (
+            cached is not None
+            and cached[0] is firmen
+            and cached[1] is self.lieferungen
+            and cached[2] == state
+        ):
+            return self._triangle_roles
+
+        roles = self._find_triangle_roles()
+        if self.lieferungen:
+            # Ohne berechnete Lieferungen ist das Ergebnis vorläufig -> nicht merken
+            self._triangle_roles = roles
+            self._triangle_key = (firmen, self.lieferungen, state)
+        return roles
+
+    def _find_triangle_roles(
+        self,
+    ) -> tuple[Handelsstufe, Handelsstufe, Handelsstufe] | None:
+        firmen = self.chain
 
         # 1. Genau drei verschiedene Unternehmer beteiligt?
         if len(firmen) != 3:
-            return False
+            return None
 
         A, B, C = firmen[0], firmen[1], firmen[2]
 
@@ -584,7 +1036,7 @@ class Transaktion:
 
         # Alle müssen EU-Länder sein
         if not (start_country.EU and intermediate_vat_country.EU and end_country.EU):
-            return False
+            return None
 
         # Die drei relevanten Länder müssen unterschiedlich sein
         if (
@@ -592,7 +1044,7 @@ class Transaktion:
             or start_country == end_country
             or intermediate_vat_country == end_country
         ):
-            return False
+            return None
 
         # 3. Warenbewegung direkt von A nach C?
         #    Wir prüfen, ob der Transport von A oder B (als Abnehmer von A)
@@ -602,12 +1054,12 @@ class Transaktion:
         #    Stellen wir sicher, dass die bewegte Lieferung A->B oder B->C ist und im Land von C endet.
         if not self.lieferungen:
             # Berechnung muss vorher gelaufen sein
-            print("WARNUNG: Lieferungen nicht berechnet für Dreiecksprüfung.")
-            return False  # Sicherer Fallback
+            _logger().warning("Lieferungen nicht berechnet für Dreiecksprüfung.")
+            return None  # Sicherer Fallback
 
         moved_delivery = next((l for l in self.lieferungen if l.is_moved_supply), None)
         if not moved_delivery:
-            return False  # Keine bewegte Lieferung gefunden
+            return None  # Keine bewegte Lieferung gefunden
 
         # Die Warenbewegung muss im Land von C enden
         # (Das wird indirekt geprüft, da der Ort der ruhenden Lieferung B->C im Land von C liegt)
@@ -628,7 +1080,7 @@ class Transaktion:
             if (
                 moved_delivery.lieferant == B and moved_delivery.kunde == C
             ):  # Fall B->C bewegt
-                return False
+                return None
             # Fall A->B bewegt, aber Ort B->C nicht im Endland -> kein Dreieck
             if (
                 moved_delivery.lieferant == A
@@ -638,7 +1090,7 @@ class Transaktion:
                     or stationary_delivery_B_C.place_of_supply != end_country
                 )
             ):
-                return False
+                return None
 
         # 4. B (Erwerber) verwendet USt-ID eines anderen Staates als Abgangsland (A) und Bestimmungsland (C)?
         #    Dies wurde bereits oben bei der Prüfung der drei unterschiedlichen Länder (start_country, intermediate_vat_country, end_country) sichergestellt.
@@ -650,10 +1102,10 @@ class Transaktion:
         # 6. Oder B->C ist bewegt (dann kein Dreieck nach §25b)
         if moved_delivery.lieferant == B and moved_delivery.kunde == C:
             # Wenn B->C bewegt ist (B transportiert als Lieferer), ist es kein Dreieck nach §25b
-            return False
+            return None
 
         # Wenn alle Prüfungen bestanden wurden:
-        return True
+        return A, B, C
 
     def determine_registration_obligations(self) -> dict[Handelsstufe, set[Country]]:
         """
@@ -667,44 +1119,62 @@ class Transaktion:
                                                                                   in denen eine Registrierung
                                                                                   wahrscheinlich notwendig ist.
         """
-        registration_needs = {
-            firma: set() for firma in self.get_ordered_chain_companies()
+        return {
+            firma: countries_of(mask)
+            for firma, mask in self.determine_registration_masks().items()
         }
-        firmen = self.get_ordered_chain_companies()
 
-        # Stelle sicher, dass Lieferungen berechnet wurden
+    def determine_registration_masks(self) -> dict[Handelsstufe, int]:
+        """
+        Wie ``determine_registration_obligations``, aber je Firma als Ländermaske
+        (siehe ``countries.mask_of``). Masken lassen sich über viele Transaktionen
+        mit ``|`` zusammenfassen.
+        """
+        # Stelle sicher, dass Lieferungen berechnet wurden; die Berechnung misst
+        # ihre Phasen selbst und zählt nicht zur Registrierung
         if not self.lieferungen:
             try:
                 self.calculate_delivery_and_vat()
             except ValueError:
                 # Wenn Berechnung fehlschlägt, können keine Pflichten ermittelt werden
-                return registration_needs
+                return {firma: 0 for firma in self.chain}
+        timer = phase_timer()
+        masks = self._registration_masks()
+        if timer is not None:
+            timer.lap("registration")
+        return masks
+
+    def _registration_masks(self) -> dict[Handelsstufe, int]:
+        firmen = self.chain
+        registration_needs = {firma: 0 for firma in firmen}
+
         if not self.lieferungen:
             return registration_needs  # Immer noch leer, gib leeres Dict zurück
 
         # --- Sonderbehandlung für Dreiecksgeschäfte ---
-        if self.is_triangular_transaction():
+        triangle_roles = self.get_triangle_roles()
+        if triangle_roles:
             # Bei Dreiecksgeschäften gelten vereinfachte Registrierungsregeln
             if (
-                len(firmen) == 3
+                len(triangle_roles) == 3
             ):  # Sollte immer der Fall sein, wenn is_triangular_transaction True ist
-                a, b, c = firmen[0], firmen[1], firmen[2]
+                a, b, c = triangle_roles
 
                 # A (Erster Lieferer) muss in seinem Land (EU) registriert sein
                 if a.country.EU:
-                    registration_needs[a].add(a.country)
+                    registration_needs[a] |= country_bit(a.country)
 
                 # B (Mittlerer Unternehmer) muss NUR in seinem Land (EU) registriert sein
                 # Die Vereinfachung erspart ihm die Registrierung in A's und C's Land
                 if b.country.EU:
-                    registration_needs[b].add(b.country)
+                    registration_needs[b] |= country_bit(b.country)
                 # 2. Registrierung im Land der verwendeten USt-ID (falls abweichend & EU)
                 if b.changed_vat and b.new_country and b.new_country.EU:
-                    registration_needs[b].add(b.new_country)
+                    registration_needs[b] |= country_bit(b.new_country)
 
                 # C (Letzter Abnehmer) muss in seinem Land (EU) registriert sein (für Erwerb/RC)
                 if c.country.EU:
-                    registration_needs[c].add(c.country)
+                    registration_needs[c] |= country_bit(c.country)
 
                 # Für Dreiecksgeschäfte ist die Prüfung hier abgeschlossen
                 return registration_needs
@@ -716,7 +1186,7 @@ class Transaktion:
         # Grundannahme: Jede EU-Firma ist in ihrem Heimatland registriert
         for firma in registration_needs.keys():
             if firma.country.EU:
-                registration_needs[firma].add(firma.country)
+                registration_needs[firma] |= country_bit(firma.country)
 
         # Gehe jede Lieferung durch und prüfe auf Registrierungspflichten
         lief: Lieferung
@@ -733,13 +1203,13 @@ class Transaktion:
             # 1. Pflichten des Lieferanten (lieferant)
             if treatment == VatTreatmentType.TAXABLE_NORMAL:
                 # Lieferant muss Steuer im Lieferort-Land abführen -> Registrierung nötig
-                registration_needs[lieferant].add(place)
+                registration_needs[lieferant] |= country_bit(place)
             elif treatment == VatTreatmentType.EXEMPT_IC_SUPPLY:
                 # Lieferant muss IG-Lieferung melden -> Registrierung im Abgangsland (place) nötig
-                registration_needs[lieferant].add(place)
+                registration_needs[lieferant] |= country_bit(place)
             elif treatment == VatTreatmentType.EXEMPT_EXPORT:
                 # Lieferant muss Ausfuhr nachweisen -> Registrierung im Abgangsland (place) nötig
-                registration_needs[lieferant].add(place)
+                registration_needs[lieferant] |= country_bit(place)
             # Bei TAXABLE_REVERSE_CHARGE hat der Lieferant i.d.R. keine *zusätzliche* Registrierungspflicht *nur* wegen dieser Lieferung im Zielland
 
             # 2. Pflichten des Kunden (kunde)
@@ -750,40 +1220,45 @@ class Transaktion:
                 destination_country_for_acquisition = self.end_company.country
                 if kunde.country.EU and destination_country_for_acquisition.EU:
                     # Kunde muss im Bestimmungsland des Transports für den Erwerb registriert sein.
-                    registration_needs[kunde].add(destination_country_for_acquisition)
+                    registration_needs[kunde] |= country_bit(
+                        destination_country_for_acquisition
+                    )
 
             elif treatment == VatTreatmentType.TAXABLE_REVERSE_CHARGE:
                 # Kunde schuldet die Steuer im Empfangsland (place) -> Registrierung dort nötig
                 if kunde.country.EU:
-                    registration_needs[kunde].add(
-                        place
-                    )  # place ist hier das Land der RC-Leistung
+                    # place ist hier das Land der RC-Leistung
+                    registration_needs[kunde] |= country_bit(place)
         # --- Zusätzliche Prüfung auf verwendete abweichende USt-IDs ---
         for firma in firmen:
             # Wenn eine Firma eine abweichende USt-ID eines EU-Landes verwendet,
             # muss sie dort registriert sein.
             if firma.changed_vat and firma.new_country and firma.new_country.EU:
-                registration_needs[firma].add(firma.new_country)
+                registration_needs[firma] |= country_bit(firma.new_country)
 
         return registration_needs
 
-    def determine_reporting_obligations(self) -> dict[Handelsstufe, set[str]]:
+    def determine_reporting_obligations(
+        self,
+    ) -> dict[Handelsstufe, ReportingObligation]:
         """
         Ermittelt potenzielle EU-Meldepflichten (Intrastat, ZM) für jede Firma.
         Beachtet Schwellenwerte und nationale Besonderheiten NICHT.
 
         Returns:
-            dict[Handelsstufe, set[str]]: Dictionary mit Firmen als Keys
-                                           und einem Set von Meldungs-Strings als Values.
-                                           z.B. {"Intrastat Versendung", "Intrastat Eingang", "ZM"}
+            dict[Handelsstufe, ReportingObligation]: Dictionary mit Firmen als Keys
+                                           und den kombinierten Meldepflichten als Values,
+                                           z.B. ECSL | INTRASTAT_DISPATCH.
+                                           Bezeichnungen liefert ``reporting_labels``.
         """
-        reporting_needs = {firma: set() for firma in self.get_ordered_chain_companies()}
-        firmen = self.get_ordered_chain_companies()  # Hinzugefügt für Dreieckslogik
+        timer = phase_timer()
+        reporting_needs = {firma: ReportingObligation.NONE for firma in self.chain}
 
         if not self.lieferungen:
             return reporting_needs
 
-        is_triangle = self.is_triangular_transaction()
+        triangle_roles = self.get_triangle_roles()  # (A, B, C) oder None
+        is_triangle = triangle_roles is not None
 
         for lief in self.lieferungen:
             lieferant = lief.lieferant
@@ -793,33 +1268,39 @@ class Transaktion:
                 # ZM (EC Sales List)
                 if is_triangle:
                     # Im Dreieck: A meldet normale ZM, B meldet ZM mit Dreieckskennung
-                    if lieferant == firmen[0] and kunde == firmen[1]:  # A -> B
-                        reporting_needs[lieferant].add("ZM")
-                        reporting_needs[kunde].add("ZM (Dreieck)")
+                    if (
+                        lieferant == triangle_roles[0] and kunde == triangle_roles[1]
+                    ):  # A -> B
+                        reporting_needs[lieferant] |= ReportingObligation.ECSL
+                        reporting_needs[kunde] |= ReportingObligation.ECSL_TRIANGLE
                     # Andere IG Lieferungen im (fälschlich erkannten) Dreieck? -> Normale ZM
-                    elif len(firmen) == 3:  # Nur zur Sicherheit
-                        reporting_needs[lieferant].add("ZM")
+                    else:
+                        reporting_needs[lieferant] |= ReportingObligation.ECSL
 
                 else:  # Kein Dreieck
-                    reporting_needs[lieferant].add("ZM")
+                    reporting_needs[lieferant] |= ReportingObligation.ECSL
 
                 # Intrastat (nur bei der bewegten IG Lieferung)
                 if lief.is_moved_supply:
                     # Lieferant meldet Versendung aus dem Abgangsland (place)
-                    reporting_needs[lieferant].add("Intrastat Versendung")
+                    reporting_needs[lieferant] |= ReportingObligation.INTRASTAT_DISPATCH
                     # Kunde meldet Eingang im Bestimmungsland (end_country)
                     # Im Dreieck ist der Kunde der bewegten Lieferung (A->B) der B,
                     # aber der tatsächliche Empfänger (C) meldet den Eingang.
-                    if is_triangle and len(firmen) == 3:
-                        final_customer = firmen[2]
-                        reporting_needs[final_customer].add("Intrastat Eingang")
+                    if is_triangle:
+                        final_customer = triangle_roles[2]
+                        reporting_needs[
+                            final_customer
+                        ] |= ReportingObligation.INTRASTAT_ARRIVAL
                     else:
-                        reporting_needs[kunde].add("Intrastat Eingang")
+                        reporting_needs[kunde] |= ReportingObligation.INTRASTAT_ARRIVAL
 
             # Intrastat kann auch bei anderen grenzüberschreitenden Warenbewegungen
             # relevant sein (z.B. Verbringen), wird hier aber vereinfacht nur
             # an die bewegte IG Lieferung gekoppelt.
 
+        if timer is not None:
+            timer.lap("reporting")
         return reporting_needs
 
     def calculate_delivery_and_vat(self) -> list[Lieferung]:  # Umbenannt für Klarheit
@@ -835,16 +1316,18 @@ class Transaktion:
             ValueError: If no shipping company is designated or other errors occur.
         """
         self.lieferungen = []
-        bewegte_lieferung_gefunden = False
-        bewegte_lieferung_obj: Lieferung | None = None  # Type hint angepasst
+        self._triangle_key = None  # Dreiecksprüfung für diese Berechnung neu ermitteln
+        timer = phase_timer()  # None, wenn die Laufzeitmessung aus ist
 
         # 1. Transporteur finden
         shipping_company = self.find_shipping_company()
         if shipping_company is None:
             raise ValueError("Keine Firma für den Transport verantwortlich gemacht.")
+        if timer is not None:
+            timer.lap("find_transporter")
 
         # 2. Kette und Start-/Endland bestimmen
-        firmen = self.get_ordered_chain_companies()
+        firmen = self.chain
         if len(firmen) < 2:
             raise ValueError("Transaktion benötigt mindestens 2 Firmen.")
         start_country = firmen[
@@ -859,86 +1342,59 @@ class Transaktion:
             lieferant = firmen[i]
             kunde = firmen[i + 1]
             self.lieferungen.append(Lieferung(lieferant, kunde, transaction=self))
+        if timer is not None:
+            timer.lap("build_deliveries")
 
         # 4. Bewegte Lieferung zuordnen (§ 3 Abs. 6a UStG)
         if not self.lieferungen:  # Sicherstellen, dass Lieferungen existieren
             raise ValueError("Keine Lieferungen in der Transaktion vorhanden.")
 
-        if shipping_company == self.start_company:
+        # Die Lieferungen liegen in Kettenreihenfolge: Lieferung i geht von Firma i
+        # an Firma i + 1. Die bewegte Lieferung wird über die Position des
+        # Transporteurs bestimmt, ohne die Liste zu durchsuchen.
+        shipping_index = firmen.shipping_index
+        if shipping_index == 0:
             # Fall 1: Erster Lieferant transportiert -> Lieferung 1 ist bewegt
-            self.lieferungen[0].is_moved_supply = True
-            bewegte_lieferung_obj = self.lieferungen[0]
-            bewegte_lieferung_gefunden = True
-        elif shipping_company == self.end_company:
+            bewegte_index = 0
+            moved_rule = "M1"
+        elif shipping_index == len(firmen) - 1:
             # Fall 2: Letzter Abnehmer transportiert -> Letzte Lieferung ist bewegt
-            self.lieferungen[-1].is_moved_supply = True
-            bewegte_lieferung_obj = self.lieferungen[-1]
-            bewegte_lieferung_gefunden = True
+            bewegte_index = len(self.lieferungen) - 1
+            moved_rule = "M2"
         else:  # Fall 3: Zwischenhändler transportiert
-            # Finde die Lieferung AN den transportierenden Zwischenhändler
-            lieferung_an_zh = next(
-                (l for l in self.lieferungen if l.kunde == shipping_company), None
-            )
-            # Finde die Lieferung VOM transportierenden Zwischenhändler
-            lieferung_vom_zh = next(
-                (l for l in self.lieferungen if l.lieferant == shipping_company), None
-            )
+            # Lieferung AN den transportierenden Zwischenhändler
+            index_an_zh = shipping_index - 1
+            # Lieferung VOM transportierenden Zwischenhändler
+            index_vom_zh = shipping_index
 
             # Priorität: Explizit gesetzter Status des Zwischenhändlers
             if shipping_company.intermediary_status == IntermediaryStatus.BUYER:
                 # Status "Auftretender Lieferer": Lieferung AN den ZH ist bewegt (§ 3 Abs. 6a S. 4 Alt. 2 UStG)
-                if lieferung_an_zh:
-                    lieferung_an_zh.is_moved_supply = True
-                    bewegte_lieferung_obj = lieferung_an_zh
-                    bewegte_lieferung_gefunden = True
-                else:
-                    # Sollte nicht passieren, wenn die Kette korrekt ist
-                    raise ValueError(
-                        f"Konnte Lieferung an transportierenden Zwischenhändler {shipping_company} nicht finden."
-                    )
-
+                bewegte_index = index_an_zh
+                moved_rule = "M3"
             elif shipping_company.intermediary_status == IntermediaryStatus.SUPPLIER:
                 # Status "Erwerber": Lieferung VOM ZH ist bewegt (§ 3 Abs. 6a S. 4 Alt. 1 UStG)
-                if lieferung_vom_zh:
-                    lieferung_vom_zh.is_moved_supply = True
-                    bewegte_lieferung_obj = lieferung_vom_zh
-                    bewegte_lieferung_gefunden = True
-                else:
-                    # Sollte nicht passieren
-                    raise ValueError(
-                        f"Konnte Lieferung vom transportierenden Zwischenhändler {shipping_company} nicht finden."
-                    )
+                bewegte_index = index_vom_zh
+                moved_rule = "M4"
+            elif (
+                # Priorität 2: Status "Nicht festgelegt" (None) -> Prüfung der USt-ID (§ 3 Abs. 6a S. 4 UStG)
+                shipping_company.changed_vat
+                and shipping_company.new_country
+                and shipping_company.new_country.code == start_country.code
+            ):
+                # Fall: ZH verwendet USt-ID des Abgangslandes -> Lieferung AN ZH ist bewegt (wie "Auftretender Lieferer")
+                bewegte_index = index_an_zh
+                moved_rule = "M5"
+            else:
+                # Fall: ZH verwendet eigene USt-ID oder die eines anderen Landes (NICHT Abgangsland)
+                # -> Regelvermutung: Lieferung VOM ZH ist bewegt (wie "Erwerber")
+                bewegte_index = index_vom_zh
+                moved_rule = "M6"
 
-            else:  # Priorität 2: Status "Nicht festgelegt" (None) -> Prüfung der USt-ID (§ 3 Abs. 6a S. 4 UStG)
-                # Prüfe, ob der Zwischenhändler die USt-ID des Abgangslandes verwendet
-                if (
-                    shipping_company.changed_vat
-                    and shipping_company.new_country
-                    and shipping_company.new_country.code == start_country.code
-                ):
-                    # Fall: ZH verwendet USt-ID des Abgangslandes -> Lieferung AN ZH ist bewegt (wie "Auftretender Lieferer")
-                    if lieferung_an_zh:
-                        lieferung_an_zh.is_moved_supply = True
-                        bewegte_lieferung_obj = lieferung_an_zh
-                        bewegte_lieferung_gefunden = True
-                    else:
-                        raise ValueError(
-                            f"Konnte Lieferung an transportierenden Zwischenhändler {shipping_company} (mit USt-ID von {start_country.code}) nicht finden."
-                        )
-                else:
-                    # Fall: ZH verwendet eigene USt-ID oder die eines anderen Landes (NICHT Abgangsland)
-                    # -> Regelvermutung: Lieferung VOM ZH ist bewegt (wie "Erwerber")
-                    if lieferung_vom_zh:
-                        lieferung_vom_zh.is_moved_supply = True
-                        bewegte_lieferung_obj = lieferung_vom_zh
-                        bewegte_lieferung_gefunden = True
-                    else:
-                        raise ValueError(
-                            f"Konnte Lieferung vom transportierenden Zwischenhändler {shipping_company} nicht finden."
-                        )
-        if not bewegte_lieferung_gefunden or bewegte_lieferung_obj is None:
-            # Dieser Fehler sollte durch die obigen Prüfungen eigentlich nicht mehr auftreten
-            raise ValueError("Konnte die bewegte Lieferung nicht eindeutig zuordnen.")
+        bewegte_lieferung_obj = self.lieferungen[bewegte_index]
+        bewegte_lieferung_obj.is_moved_supply = True
+        if timer is not None:
+            timer.lap("assign_moved_supply")
 
         # 5. ORTE BESTIMMEN (NEUE STRUKTUR)
 
@@ -947,12 +1403,9 @@ class Transaktion:
 
         # 5b. Prüfung auf Lieferortverlagerung bei Einfuhr (§ 3 Abs. 8 UStG)
         is_import_case = not start_country.EU and end_country.EU
+        relocated = False
         if is_import_case:
-            eust_responsible_firma: Handelsstufe | None = None
-            for firma in firmen:
-                if firma.responsible_for_import_vat:
-                    eust_responsible_firma = firma
-                    break
+            eust_responsible_firma: Handelsstufe | None = firmen.import_vat_company
 
             if (
                 eust_responsible_firma
@@ -963,28 +1416,42 @@ class Transaktion:
                 bewegte_lieferung_obj.place_of_supply = (
                     end_country  # Überschreibe mit DE
                 )
-                print(
-                    f"DEBUG: Lieferortverlagerung nach {end_country.code} für bewegte Lieferung {bewegte_lieferung_obj.lieferant.identifier} -> {bewegte_lieferung_obj.kunde.identifier} angewendet (§ 3 Abs. 8 UStG)."
+                relocated = True
+                _logger().debug(
+                    "Lieferortverlagerung nach %s für bewegte Lieferung %s -> %s angewendet (§ 3 Abs. 8 UStG).",
+                    end_country.code,
+                    bewegte_lieferung_obj.lieferant.identifier,
+                    bewegte_lieferung_obj.kunde.identifier,
                 )
 
-        # 5c. Orte der ruhenden Lieferungen bestimmen
-        try:
-            bewegte_index = self.lieferungen.index(bewegte_lieferung_obj)
-        except ValueError:
-            raise ValueError(
-                "Bewegte Lieferung nicht in der Liste gefunden - interner Fehler."
-            )
+        if timer is not None:
+            timer.lap("import_relocation")
 
+        # 5c. Orte der ruhenden Lieferungen bestimmen
         # Ruhende Lieferungen VOR der bewegten haben Ort = Startland
         for i in range(bewegte_index):
             self.lieferungen[i].place_of_supply = start_country
         # Ruhende Lieferungen NACH der bewegten haben Ort = Endland
         for i in range(bewegte_index + 1, len(self.lieferungen)):
             self.lieferungen[i].place_of_supply = end_country
+        if self.trace:
+            # Entscheidungsweg beginnt mit Zuordnung und Ort; die steuerliche
+            # Behandlung ergänzt ihre Regeln in determine_vat_treatment
+            for i, lief in enumerate(self.lieferungen):
+                lief.trace = ["P3"] if i < bewegte_index else ["P4"]
+            bewegte_lieferung_obj.trace = (
+                [moved_rule, "P1", "P2"] if relocated else [moved_rule, "P1"]
+            )
+        if timer is not None:
+            timer.lap("stationary_places")
 
         # 6. Steuerliche Behandlung für alle Lieferungen bestimmen
         #    (Diese Methode nutzt jetzt den korrekt gesetzten Ort)
+        #    Die Dreiecksprüfung wird einmalig für alle Lieferungen ermittelt.
+        self.get_triangle_roles()
         for lief in self.lieferungen:
             lief.determine_vat_treatment(start_country, end_country)
+        if timer is not None:
+            timer.lap("vat_treatment")
 
         return self.lieferungen
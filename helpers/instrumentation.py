@@ -0,0 +1,230 @@
+"""
+Optionale Laufzeitmessung der Phasen der Reihengeschäftsberechnung.
+
+Die Engine misst die Phasen von ``Transaktion.calculate_delivery_and_vat``
+(Transporteur finden, Lieferungen erstellen, bewegte Lieferung zuordnen,
+Lieferort inkl. Verlagerung nach § 3 Abs. 8 UStG, Orte der ruhenden Lieferungen,
+steuerliche Behandlung) sowie die Ermittlung der Registrierungs- und
+Meldepflichten. Die Dauern werden je Phase in einem Histogramm gesammelt.
+
+Die Messung ist standardmäßig aus und kostet dann nur eine Abfrage je Aufruf.
+Eingeschaltet wird sie mit der Umgebungsvariable ``UST_TIMINGS=1`` oder per
+``enable()``. Export als Prometheus-Textformat (``to_prometheus``) oder als
+JSON-fähiges Dictionary (``snapshot``); Snapshots mehrerer Prozesse lassen sich
+mit ``merge`` zusammenfassen.
+"""
+
+import os
+import threading
+import time
+
+ENVIRONMENT_VARIABLE = "UST_TIMINGS"
+METRIC_NAME = "ust_engine_phase_seconds"
+
+# Obergrenzen der Histogramm-Klassen in Sekunden (zuzüglich +Inf)
+BUCKETS = (
+    1e-6,
+    2.5e-6,
+    5e-6,
+    1e-5,
+    2.5e-5,
+    5e-5,
+    1e-4,
+    2.5e-4,
+    5e-4,
+    1e-3,
+    2.5e-3,
+    5e-3,
+    1e-2,
+    2.5e-2,
+    1e-1,
+    1.0,
+)
+
+# Phasen in Berechnungsreihenfolge
+PHASES = (
+    "find_transporter",
+    "build_deliveries",
+    "assign_moved_supply",
+    "import_relocation",
+    "stationary_places",
+    "vat_treatment",
+    "registration",
+    "reporting",
+)
+
+PHASE_LABELS = {
+    "find_transporter": "Transporteur finden",
+    "build_deliveries": "Lieferungen erstellen",
+    "assign_moved_supply": "Bewegte Lieferung zuordnen",
+    "import_relocation": "Lieferort / § 3 Abs. 8 UStG",
+    "stationary_places": "Orte der ruhenden Lieferungen",
+    "vat_treatment": "Steuerliche Behandlung",
+    "registration": "Registrierungspflichten",
+    "reporting": "Meldepflichten",
+}
+
+
+class Histogram:
+    """Anzahl, Summe und Klassenhäufigkeiten (nicht kumuliert) einer Phase."""
+
+    __slots__ = ("count", "sum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q: float) -> float:
+        """Obergrenze der Klasse, in die das Quantil ``q`` fällt."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class TimingRegistry:
+    """
+    Sammelt die Dauern je Phase. Threadsicher; ``enabled`` wird von der Engine
+    vor jeder Messung abgefragt.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                histogram = self._histograms[phase] = Histogram()
+            histogram.observe(seconds)
+
+    def histograms(self) -> dict[str, Histogram]:
+        """Histogramme je Phase in Berechnungsreihenfolge (Kopie der Referenzen)."""
+        with self._lock:
+            order = {phase: i for i, phase in enumerate(PHASES)}
+            return dict(
+                sorted(
+                    self._histograms.items(),
+                    key=lambda item: (order.get(item[0], len(order)), item[0]),
+                )
+            )
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """JSON-fähige Sicht: je Phase ``count``, ``sum`` und ``buckets``."""
+        return {
+            "buckets": list(BUCKETS),
+            "phases": {
+                phase: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": list(histogram.buckets),
+                }
+                for phase, histogram in self.histograms().items()
+            },
+        }
+
+    def merge(self, snapshot: dict):
+        """Addiert einen Snapshot (z.B. aus einem Worker-Prozess)."""
+        if list(snapshot.get("buckets", BUCKETS)) != list(BUCKETS):
+            raise ValueError("Snapshot verwendet andere Histogramm-Klassen.")
+        with self._lock:
+            for phase, data in snapshot["phases"].items():
+                histogram = self._histograms.get(phase)
+                if histogram is None:
+                    histogram = self._histograms[phase] = Histogram()
+                histogram.count += data["count"]
+                histogram.sum += data["sum"]
+                for i, count in enumerate(data["buckets"]):
+                    histogram.buckets[i] += count
+
+    def summary(self) -> list[dict]:
+        """Eine Zeile je Phase mit Anzahl, Summe, Mittelwert und 95-%-Quantil (ms)."""
+        return [
+            {
+                "phase": phase,
+                "label": PHASE_LABELS.get(phase, phase),
+                "count": histogram.count,
+                "total_ms": histogram.sum * 1e3,
+                "mean_ms": histogram.sum / histogram.count * 1e3,
+                "p95_ms": histogram.quantile(0.95) * 1e3,
+            }
+            for phase, histogram in self.histograms().items()
+            if histogram.count
+        ]
+
+    def to_prometheus(self) -> str:
+        """Histogramme im Prometheus-Textformat."""
+        lines = [
+            f"# HELP {METRIC_NAME} Laufzeit der Phasen der Reihengeschäftsberechnung.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for phase, histogram in self.histograms().items():
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, float("inf")), histogram.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'{METRIC_NAME}_bucket{{phase="{phase}",le="{le}"}} {cumulative}'
+                )
+            lines.append(f'{METRIC_NAME}_sum{{phase="{phase}"}} {histogram.sum!r}')
+            lines.append(f'{METRIC_NAME}_count{{phase="{phase}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+class PhaseTimer:
+    """Misst aufeinanderfolgende Phasen: ``lap`` schließt die laufende Phase ab."""
+
+    __slots__ = ("_registry", "_last")
+
+    def __init__(self, registry: TimingRegistry):
+        self._registry = registry
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self._registry.observe(phase, now - self._last)
+        self._last = now
+
+
+registry = TimingRegistry(
+    enabled=os.environ.get(ENVIRONMENT_VARIABLE, "").strip().lower()
+    in ("1", "true", "yes", "ja")
+)
+
+
+def phase_timer() -> PhaseTimer | None:
+    """Neuer Zeitmesser, oder None wenn die Messung ausgeschaltet ist."""
+    return PhaseTimer(registry) if registry.enabled else None
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
+
+
+def is_enabled() -> bool:
+    return registry.enabled
@@ -0,0 +1,74 @@
+"""
+Lokalisierte Länderlisten für die Oberfläche.
+
+Optionale Schicht über der Engine: deutsche Namen stammen aus der Ländertabelle
+der Engine, für andere Sprachen werden pycountry und gettext erst bei Bedarf geladen.
+"""
+
+import unicodedata
+from functools import cache
+from types import MappingProxyType
+from typing import Mapping
+
+from helpers.countries import Country, registered_countries
+
+DEFAULT_LOCALE = "de"
+
+
+def _sort_key(name: str) -> tuple[str, str]:
+    # Umlaute und Akzente wie ihre Grundbuchstaben einsortieren (Österreich bei O)
+    base = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return base.casefold(), name
+
+
+def _translated_names(countries, locale: str) -> dict[Country, str]:
+    import gettext
+
+    import pycountry
+
+    translation = gettext.translation(
+        "iso3166-1", pycountry.LOCALES_DIR, languages=[locale], fallback=True
+    )
+    names = {}
+    for country in countries:
+        entry = pycountry.countries.get(alpha_2=country.code)
+        names[country] = translation.gettext(entry.name) if entry else country.name
+    return names
+
+
+@cache
+def _country_table(
+    locale: str,
+) -> tuple[tuple[Country, ...], Mapping[Country, str]]:
+    """
+    Erstellt einmal pro Prozess und Sprache die sortierte Länderliste und die
+    Anzeigetexte. Alle Sitzungen teilen sich das unveränderliche Ergebnis.
+    """
+    countries = registered_countries().values()
+    if locale == DEFAULT_LOCALE:
+        names = {country: country.name for country in countries}
+    else:
+        names = _translated_names(countries, locale)
+    ordered = tuple(sorted(countries, key=lambda country: _sort_key(names[country])))
+    labels = {
+        country: f"{names[country]} ({country.code}){' - EU' if country.EU else ''}"
+        for country in ordered
+    }
+    return ordered, MappingProxyType(labels)
+
+
+def get_countries(locale: str = DEFAULT_LOCALE) -> tuple[Country, ...]:
+    """
+    Returns all countries, sorted by their localized name.
+    The objects are the interned instances of the country registry; the tuple
+    is cached per locale and shared by all callers.
+    """
+    return _country_table(locale)[0]
+
+
+def get_country_labels(locale: str = DEFAULT_LOCALE) -> Mapping[Country, str]:
+    """
+    Returns the precomputed display labels ("Name (CODE) - EU") per country
+    for the given locale.
+    """
+    return _country_table(locale)[1]
@@ -0,0 +1,191 @@
+"""
+Kanonische Muster von Reihengeschäften.
+
+Das Ergebnis der Berechnung hängt nicht von den konkreten Ländern ab, sondern nur
+davon, welche Firmen (bzw. USt-IDs) dasselbe Land teilen und welche Länder zur EU
+gehören: DE -> AT -> FR verhält sich genauso wie NL -> BE -> PL. Ein Muster ersetzt
+die Länder daher durch Länderklassen, nummeriert in der Reihenfolge ihres ersten
+Auftretens, und enthält nur die Angaben, die die Berechnung tatsächlich liest:
+
+* je Länderklasse, ob sie zur EU gehört,
+* je Firma Länderklasse, Länderklasse der abweichenden USt-ID, Transport (nur die
+  erste verantwortliche Firma zählt), den Status des Zwischenhändlers (nur beim
+  transportierenden Zwischenhändler relevant) und die EUSt-Zuständigkeit (nur bei
+  Lieferanten aus Drittländern und bei der Lieferortverlagerung nach § 3 Abs. 8
+  UStG relevant).
+
+Die Zollzuständigkeit fließt nicht in die Berechnung ein und ist deshalb nicht Teil
+des Musters (siehe ``normalize``). Jedes Muster wird einmal mit Platzhalter-Ländern berechnet; die
+konkreten Länder werden anschließend in das Ergebnis eingesetzt.
+"""
+
+import re
+
+from helpers.answer_table import default_table
+from helpers.countries import Country
+from helpers.helpers import Chain, Handelsstufe, IntermediaryStatus, Transaktion
+from helpers.result_cache import LRUCache
+from helpers.scenario import result_from_transaction
+
+# Berechnete Muster, Schlüssel ist das Muster selbst
+pattern_cache = LRUCache(maxsize=4096)
+
+PLACEHOLDER_PREFIX = "#"
+_PLACEHOLDER = re.compile(re.escape(PLACEHOLDER_PREFIX) + r"(\d+)")
+
+# Platzhalter-Länder je (Länderklasse, EU)
+_placeholders: dict[tuple[int, bool], Country] = {}
+
+
+def placeholder_country(index: int, eu: bool) -> Country:
+    """Platzhalter für eine Länderklasse; nicht im Länderregister enthalten."""
+    key = (index, eu)
+    country = _placeholders.get(key)
+    if country is None:
+        country = Country(f"Land {index}", f"{PLACEHOLDER_PREFIX}{index}")
+        country.EU = eu
+        _placeholders[key] = country
+    return country
+
+
+def normalize(pattern: tuple) -> tuple:
+    """
+    Entfernt Angaben aus einem Muster, die das Ergebnis nicht beeinflussen, damit
+    gleichwertige Ketten dasselbe Muster erhalten.
+    """
+    eu, companies = pattern
+    last = len(companies) - 1
+    shipping = next((i for i, c in enumerate(companies) if c[2]), None)
+    first_import_vat = next((i for i, c in enumerate(companies) if c[4]), None)
+    # Lieferortverlagerung nur bei Einfuhr (Start außerhalb, Ende innerhalb der EU)
+    is_import_case = bool(companies) and (
+        not eu[companies[0][0]] and eu[companies[-1][0]]
+    )
+    normalized = []
+    for i, (country, vat_country, _, status, import_vat) in enumerate(companies):
+        is_shipping = i == shipping
+        normalized.append(
+            (
+                country,
+                vat_country,
+                is_shipping,
+                status if is_shipping and 0 < i < last else None,
+                bool(import_vat)
+                and (
+                    (is_import_case and i == first_import_vat)
+                    or (not eu[country] and i < last)
+                ),
+            )
+        )
+    return eu, tuple(normalized)
+
+
+def canonicalize(chain: Chain) -> tuple[tuple, tuple[Country, ...]]:
+    """
+    Bildet eine Kette auf ihr Muster ab.
+
+    Returns:
+        tuple: Das Muster (hashbar) und die konkreten Länder je Länderklasse.
+    """
+    classes: dict[Country, int] = {}
+    countries: list[Country] = []
+
+    def country_class(country: Country) -> int:
+        if country not in classes:
+            classes[country] = len(countries)
+            countries.append(country)
+        return classes[country]
+
+    companies = tuple(
+        (
+            country_class(company.country),
+            (
+                country_class(company.new_country)
+                if company.changed_vat and company.new_country
+                else None
+            ),
+            bool(company.responsible_for_shippment),
+            company.intermediary_status.name if company.intermediary_status else None,
+            bool(company.responsible_for_import_vat),
+        )
+        for company in chain
+    )
+    eu = tuple(country.EU for country in countries)
+    return normalize((eu, companies)), tuple(countries)
+
+
+def pattern_transaction(pattern: tuple) -> Transaktion:
+    """Erstellt die Transaktion eines Musters mit Platzhalter-Ländern."""
+    eu, companies = pattern
+    countries = [placeholder_country(i, flag) for i, flag in enumerate(eu)]
+    firmen = []
+    for i, (country, vat_country, ship, status, import_vat) in enumerate(companies):
+        company = Handelsstufe(
+            countries[country], identifier=i, max_identifier=len(companies)
+        )
+        company.responsible_for_shippment = ship
+        company.responsible_for_import_vat = import_vat
+        if status:
+            company.intermediary_status = IntermediaryStatus[status]
+        if vat_country is not None:
+            company.set_changed_vat_id(countries[vat_country])
+        firmen.append(company)
+    return Transaktion.from_chain(Chain(firmen))
+
+
+def hydrate(result: dict, countries: tuple[Country, ...]) -> dict:
+    """Setzt die konkreten Länder in das Ergebnis eines Musters ein."""
+    codes = [country.code for country in countries]
+
+    def code(placeholder: str | None) -> str | None:
+        if placeholder is None:
+            return None
+        return codes[int(placeholder[len(PLACEHOLDER_PREFIX) :])]
+
+    def text(note: str | None) -> str | None:
+        if not note:
+            return note
+        return _PLACEHOLDER.sub(lambda match: codes[int(match.group(1))], note)
+
+    return {
+        "triangle": result["triangle"],
+        "deliveries": [
+            dict(
+                delivery,
+                place=code(delivery["place"]),
+                invoice_note=text(delivery["invoice_note"]),
+            )
+            for delivery in result["deliveries"]
+        ],
+        "registrations": [
+            sorted(code(placeholder) for placeholder in placeholders)
+            for placeholders in result["registrations"]
+        ],
+        "reporting": result["reporting"],
+    }
+
+
+def pattern_result(pattern: tuple, cache: LRUCache = pattern_cache) -> dict:
+    """Ergebnis eines Musters mit Platzhalter-Ländern (einmal je Muster berechnet)."""
+    return cache.get_or_compute(
+        pattern, lambda: result_from_transaction(pattern_transaction(pattern))
+    )
+
+
+def canonical_result(transaction: Transaktion, cache: LRUCache = pattern_cache) -> dict:
+    """
+    Ergebnis wie ``result_from_transaction``, berechnet einmal je Muster.
+
+    Steht das Muster in der Antworttabelle (``UST_ANSWER_TABLE``), wird es von
+    dort gelesen. Schlägt die Berechnung des Musters fehl, wird die konkrete
+    Transaktion berechnet, damit Fehlermeldungen die echten Länder nennen.
+    """
+    pattern, countries = canonicalize(transaction.chain)
+    table = default_table()
+    result = table.get(pattern) if table is not None else None
+    if result is None:
+        try:
+            result = pattern_result(pattern, cache)
+        except ValueError:
+            return result_from_transaction(transaction)
+    return hydrate(result, countries)
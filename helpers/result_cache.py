@@ -0,0 +1,87 @@
+"""
+Prozessweiter, größenbeschränkter LRU-Cache für Auswertungsergebnisse.
+
+Der Cache wird von allen Streamlit-Sitzungen eines Prozesses geteilt. Die
+abgelegten Werte dürfen daher nach dem Einfügen nicht mehr verändert werden.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+DEFAULT_MAXSIZE = 1024
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Threadsicherer LRU-Cache mit Treffer- und Fehlzugriffszählern.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize muss mindestens 1 sein.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        """Gibt den Wert zurück und zählt Treffer bzw. Fehlzugriff."""
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        """Legt einen Wert ab und verdrängt bei Bedarf den am längsten unbenutzten."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """
+        Gibt den zwischengespeicherten Wert zurück oder berechnet und speichert ihn.
+        Die Berechnung läuft außerhalb der Sperre.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Kennzahlen des Caches (Größe, Treffer, Fehlzugriffe, Trefferquote)."""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+            }
+
+
+# Gemeinsamer Cache für die Analyse-Seite und die Dienste
+analysis_cache = LRUCache()
@@ -0,0 +1,278 @@
+"""
+Aufbau von Transaktionen aus Ketten-Spezifikationen und Serialisierung der Ergebnisse.
+
+Eine Ketten-Spezifikation ist ein Dictionary der Form::
+
+    {
+        "id": "Auftrag-4711",
+        "companies": [
+            {"country_code": "DE", "ship": True},
+            {"country_code": "AT", "vat_change_code": "IT"},
+            {"country_code": "FR"},
+        ],
+    }
+
+Die Felder je Firma entsprechen den ``company_configs`` aus den Tests
+(``country_code``, ``ship``, ``customs``, ``import_vat``, ``vat_change_code``,
+``intermediary_status``). Die Reihenfolge der Firmen ist die Reihenfolge der Kette.
+Statt des Dictionaries wird auch die Firmenliste allein akzeptiert.
+"""
+
+import hashlib
+import json
+from collections.abc import Callable
+
+from helpers.countries import Country
+from helpers.helpers import (
+    ENGINE_VERSION,
+    Chain,
+    Handelsstufe,
+    IntermediaryStatus,
+    Lieferung,
+    ReportingObligation,
+    Transaktion,
+    VatTreatmentType,
+)
+from helpers.result_cache import LRUCache, analysis_cache
+
+INTERMEDIARY_STATUS_NAMES = {
+    "BUYER": IntermediaryStatus.BUYER,
+    "ABNEHMER": IntermediaryStatus.BUYER,
+    "SUPPLIER": IntermediaryStatus.SUPPLIER,
+    "LIEFERER": IntermediaryStatus.SUPPLIER,
+}
+
+TRUE_VALUES = {"1", "true", "yes", "ja", "x", "wahr"}
+
+
+def parse_flag(value) -> bool:
+    """Interpretiert bool-Werte aus JSON oder CSV ("1", "true", "ja", "x", ...)."""
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def parse_intermediary_status(value) -> IntermediaryStatus | None:
+    """Übersetzt den Status eines Zwischenhändlers (Enum, Name oder deutsche Bezeichnung)."""
+    if value is None or isinstance(value, IntermediaryStatus):
+        return value
+    name = str(value).strip().upper()
+    if not name or name in ("NONE", "KEINE AUSWAHL"):
+        return None
+    try:
+        return INTERMEDIARY_STATUS_NAMES[name]
+    except KeyError:
+        raise ValueError(f"Unbekannter Status des Zwischenhändlers: {value}")
+
+
+def company_configs(spec) -> list[dict]:
+    """
+    Gibt die Firmenliste einer Spezifikation zurück. Statt eines Dictionaries
+    darf die Spezifikation auch direkt die Firmenliste sein.
+    """
+    if isinstance(spec, list):
+        companies = spec
+    else:
+        try:
+            companies = spec["companies"]
+        except (KeyError, TypeError):
+            raise ValueError("Spezifikation enthält keine Firmenliste ('companies').")
+        if not isinstance(companies, list):
+            raise ValueError("'companies' muss eine Liste sein.")
+    for position, config in enumerate(companies, start=1):
+        if not isinstance(config, dict):
+            raise ValueError(
+                f"Firma {position} muss ein Objekt mit 'country_code' sein, "
+                f"nicht {json.dumps(config, ensure_ascii=False)}."
+            )
+    return companies
+
+
+def create_company_chain(configs: list[dict]) -> Chain:
+    """
+    Erstellt die Handelsstufen einer Kette und verknüpft sie.
+    Die Identifier entsprechen der Position in der Kette.
+    """
+    companies = []
+    max_identifier = len(configs)
+    for i, config in enumerate(configs):
+        company = Handelsstufe(
+            Country.from_code(config.get("country_code")),
+            identifier=i,
+            max_identifier=max_identifier,
+        )
+        company.responsible_for_shippment = parse_flag(config.get("ship", False))
+        company.responsible_for_customs = parse_flag(config.get("customs", False))
+        company.responsible_for_import_vat = parse_flag(config.get("import_vat", False))
+        company.intermediary_status = parse_intermediary_status(
+            config.get("intermediary_status")
+        )
+        if config.get("vat_change_code"):
+            company.set_changed_vat_id(Country.from_code(config["vat_change_code"]))
+        companies.append(company)
+    return Chain(companies)
+
+
+def transaction_from_spec(spec) -> Transaktion:
+    """Erstellt eine (noch nicht berechnete) Transaktion aus einer Spezifikation."""
+    chain = create_company_chain(company_configs(spec))
+    if not len(chain):
+        raise ValueError("Transaktion benötigt mindestens 2 Firmen.")
+    transaction = Transaktion.from_chain(chain)
+    if isinstance(spec, dict):
+        transaction.trace = parse_flag(spec.get("trace", False))
+    return transaction
+
+
+def result_from_transaction(transaction: Transaktion) -> dict:
+    """
+    Berechnet Lieferungen und Pflichten einer Transaktion und gibt sie als
+    JSON-serialisierbares Dictionary zurück. Firmen werden über ihre Position
+    in der Kette referenziert. Ist ``transaction.trace`` gesetzt, enthält jede
+    Lieferung zusätzlich ihren Entscheidungsweg (``trace``, siehe ``TRACE_RULES``).
+    """
+    lieferungen = transaction.calculate_delivery_and_vat()
+    firmen = transaction.chain
+    registrations = transaction.determine_registration_obligations()
+    reporting = transaction.determine_reporting_obligations()
+    deliveries = []
+    for lief in lieferungen:
+        delivery = {
+            "from": firmen.index(lief.lieferant),
+            "to": firmen.index(lief.kunde),
+            "moved": lief.is_moved_supply,
+            "place": lief.place_of_supply.code if lief.place_of_supply else None,
+            "vat_treatment": lief.vat_treatment.name,
+            "invoice_note": lief.invoice_note,
+            "reporting": int(lief.reporting),
+        }
+        if lief.trace is not None:
+            delivery["trace"] = list(lief.trace)
+        deliveries.append(delivery)
+    return {
+        "triangle": transaction.is_triangular_transaction(),
+        "deliveries": deliveries,
+        "registrations": [
+            sorted(country.code for country in registrations.get(firma, ()))
+            for firma in firmen
+        ],
+        "reporting": [int(reporting.get(firma, 0)) for firma in firmen],
+    }
+
+
+def evaluate_spec(
+    spec, evaluate: Callable[[Transaktion], dict] = result_from_transaction
+) -> dict:
+    """
+    Wertet eine Ketten-Spezifikation aus. Fachliche Fehler (ValueError) werden
+    nicht geworfen, sondern im Feld ``error`` des Ergebnisses zurückgegeben.
+    Spezifikationen mit ``"trace": true`` werden immer direkt berechnet; enthält
+    die Spezifikation bereits ein Feld ``error`` (z.B. ungültige Eingabezeile),
+    wird dieses übernommen.
+
+    Args:
+        spec: Ketten-Spezifikation.
+        evaluate: Berechnung der Transaktion, z.B. ``patterns.canonical_result``.
+    """
+    result = {"id": spec.get("id") if isinstance(spec, dict) else None}
+    if isinstance(spec, dict) and "error" in spec:
+        result["error"] = spec["error"]
+        return result
+    try:
+        transaction = transaction_from_spec(spec)
+        if transaction.trace:
+            evaluate = result_from_transaction
+        result.update(evaluate(transaction))
+    except ValueError as e:
+        result["error"] = str(e)
+    return result
+
+
+def fingerprint(chain: Chain) -> str:
+    """
+    Stabiler Fingerprint eines Szenarios: Länder in Kettenreihenfolge, abweichende
+    USt-IDs, Status, Transport-, Zoll- und EUSt-Zuständigkeiten sowie die
+    Version der Berechnungsregeln. Gleiche Szenarien ergeben gleiche Fingerprints,
+    unabhängig von Sitzung und Prozess.
+    """
+    companies = [
+        [
+            company.country.code,
+            (
+                company.new_country.code
+                if company.changed_vat and company.new_country
+                else None
+            ),
+            (company.intermediary_status.name if company.intermediary_status else None),
+            bool(company.responsible_for_shippment),
+            bool(company.responsible_for_customs),
+            bool(company.responsible_for_import_vat),
+        ]
+        for company in chain
+    ]
+    payload = json.dumps([ENGINE_VERSION, companies], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_result(
+    transaction: Transaktion,
+    cache: LRUCache = analysis_cache,
+    evaluate: Callable[[Transaktion], dict] = result_from_transaction,
+) -> dict:
+    """
+    Ergebnis wie ``result_from_transaction``, zwischengespeichert unter dem
+    Fingerprint der Kette. Das zurückgegebene Dictionary wird von allen
+    Aufrufern geteilt und darf nicht verändert werden. Mit Entscheidungsweg
+    (``transaction.trace``) wird ohne Cache gerechnet.
+
+    Args:
+        transaction: Die auszuwertende Transaktion.
+        cache: Zu verwendender Cache.
+        evaluate: Berechnung bei Fehlzugriff, z.B. ``patterns.canonical_result``.
+    """
+    if transaction.trace:
+        return result_from_transaction(transaction)
+    return cache.get_or_compute(
+        fingerprint(transaction.chain), lambda: evaluate(transaction)
+    )
+
+
+def apply_result(transaction: Transaktion, result: dict) -> list[Lieferung]:
+    """
+    Überträgt ein (zwischengespeichertes) Ergebnis auf die Firmen der Transaktion,
+    ohne die Regeln erneut auszuwerten, und gibt die Lieferungen zurück.
+    """
+    firmen = transaction.chain
+    transaction.find_shipping_company()
+    transaction.lieferungen = []
+    for delivery in result["deliveries"]:
+        lief = Lieferung(firmen[delivery["from"]], firmen[delivery["to"]], transaction)
+        lief.is_moved_supply = delivery["moved"]
+        if delivery["place"]:
+            lief.place_of_supply = Country.from_code(delivery["place"])
+        lief.vat_treatment = VatTreatmentType[delivery["vat_treatment"]]
+        lief.invoice_note = delivery["invoice_note"]
+        lief.reporting = ReportingObligation(delivery["reporting"])
+        lief.trace = delivery.get("trace")
+        transaction.lieferungen.append(lief)
+    return transaction.lieferungen
+
+
+def registrations_from_result(
+    transaction: Transaktion, result: dict
+) -> dict[Handelsstufe, set[Country]]:
+    """Registrierungspflichten eines Ergebnisses je Firma der Transaktion."""
+    return {
+        firma: {Country.from_code(code) for code in codes}
+        for firma, codes in zip(transaction.chain, result["registrations"])
+    }
+
+
+def reporting_from_result(
+    transaction: Transaktion, result: dict
+) -> dict[Handelsstufe, ReportingObligation]:
+    """Meldepflichten eines Ergebnisses je Firma der Transaktion."""
+    return {
+        firma: ReportingObligation(meldungen)
+        for firma, meldungen in zip(transaction.chain, result["reporting"])
+    }
@@ -0,0 +1,320 @@
+"""
+Lokaler HTTP-Dienst für die Auswertung von Reihengeschäften (z.B. aus dem ERP).
+
+Endpunkte::
+
+    POST /evaluate   Ketten-Spezifikation (siehe ``helpers.scenario``) als JSON,
+                     Antwort: Lieferungen, Steuerbehandlung, Rechnungshinweise,
+                     Registrierungs- und Meldepflichten
+    GET  /health     {"status": "ok"}
+    GET  /metrics    Kennzahlen (Zusammenfassung gleicher Anfragen, Caches,
+                     Laufzeiten der Berechnungsphasen)
+    GET  /metrics/prometheus
+                     Laufzeiten der Berechnungsphasen im Prometheus-Textformat
+                     (Messung mit ``UST_TIMINGS=1`` einschalten)
+
+Verbindungen bleiben offen (HTTP/1.1 keep-alive) und werden je in einem eigenen,
+leichtgewichtigen Thread gehalten; die Berechnungen laufen in einem begrenzten
+Thread-Pool (``--workers``). Ruhende Verbindungen belegen so keinen Worker. Die
+Antwort trägt den Fingerprint des Szenarios als ETag; schickt der Client ihn in
+``If-None-Match`` zurück (auch in einer Liste, als schwacher ETag ``W/"..."`` oder
+als ``*``), antwortet der Dienst mit ``304 Not Modified``. Das Szenario wird dafür
+trotzdem ausgewertet (meist aus dem Cache), damit ungültige Ketten nie als
+unverändert bestätigt werden. Gleichzeitige Anfragen für dasselbe Szenario warten auf eine gemeinsame Berechnung (siehe ``helpers.singleflight``).
+Mit ``"trace": true`` enthält jede Lieferung ihren Entscheidungsweg als Regel-IDs
+(``trace``) und die Antwort deren Beschreibungen (``trace_rules``); solche
+Anfragen werden ohne Cache berechnet.
+
+Aufruf::
+
+    python -m helpers.service --port 8000 --workers 16
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from helpers import instrumentation
+from helpers.helpers import TRACE_RULES, reporting_labels
+from helpers.patterns import canonical_result, pattern_cache
+from helpers.result_cache import analysis_cache
+from helpers.scenario import (
+    fingerprint,
+    result_from_transaction,
+    transaction_from_spec,
+)
+from helpers.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_WORKERS = 16
+MAX_BODY_SIZE = 1 << 20  # 1 MiB
+IDLE_TIMEOUT = 30  # Sekunden bis eine ruhende Verbindung geschlossen wird
+
+# Ein Eintrag in If-None-Match: optional schwacher ("W/") ETag in Anführungszeichen
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+# Gleichzeitige Berechnungen desselben Fingerprints
+evaluation_flight = SingleFlight()
+
+_MISSING = object()
+
+
+def metrics() -> dict:
+    """Kennzahlen des Dienstes."""
+    return {
+        "singleflight": evaluation_flight.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "pattern_cache": pattern_cache.stats(),
+        "engine_phases": instrumentation.registry.snapshot(),
+    }
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """
+    Prüft, ob ``etag`` in einem ``If-None-Match``-Kopf enthalten ist: ``*`` oder
+    eine kommagetrennte Liste von ETags in Anführungszeichen. Verglichen wird
+    schwach (RFC 9110), ein vorangestelltes ``W/`` wird also ignoriert.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return etag in _ENTITY_TAG.findall(if_none_match)
+
+
+def cached_result(key: str, transaction) -> dict:
+    """
+    Ergebnis aus ``analysis_cache`` oder, bei einem Fehlzugriff, genau eine
+    Berechnung je Fingerprint: Gleichzeitige Anfragen warten auf die laufende, das
+    Ergebnis liegt im Cache, bevor der Schlüssel in ``evaluation_flight`` frei wird.
+    """
+    result = analysis_cache.get(key, _MISSING)
+    if result is not _MISSING:
+        return result
+
+    def compute():
+        # Die vorige Berechnung kann zwischen Fehlzugriff und Eintritt fertig sein
+        if key in analysis_cache:
+            result = analysis_cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+        result = canonical_result(transaction)
+        analysis_cache.put(key, result)
+        return result
+
+    return evaluation_flight.do(key, compute)
+
+
+def evaluate_request(spec, if_none_match: str = "") -> tuple[str, dict | None]:
+    """
+    Wertet eine Spezifikation aus und gibt ETag und Antwort zurück. Passt der ETag
+    zu ``if_none_match`` (siehe ``etag_matches``), wird statt der Antwort None
+    zurückgegeben. Ausgewertet wird in jedem Fall zuerst, damit nur Ergebnisse, die
+    es tatsächlich gibt, als unverändert bestätigt werden.
+
+    Raises:
+        ValueError: Bei ungültigen Spezifikationen oder fachlichen Fehlern.
+    """
+    transaction = transaction_from_spec(spec)
+    key = fingerprint(transaction.chain)
+    etag = f'"{key}-trace"' if transaction.trace else f'"{key}"'
+    if transaction.trace:
+        # Entscheidungsweg nur bei direkter Berechnung vorhanden
+        result = result_from_transaction(transaction)
+    else:
+        result = cached_result(key, transaction)
+    if etag_matches(etag, if_none_match):
+        return etag, None
+    response = dict(
+        result,
+        reporting_labels=[reporting_labels(r) for r in result["reporting"]],
+    )
+    if transaction.trace:
+        rules = {
+            rule for delivery in result["deliveries"] for rule in delivery["trace"]
+        }
+        response["trace_rules"] = {
+            rule: TRACE_RULES[rule] for rule in TRACE_RULES if rule in rules
+        }
+    if isinstance(spec, dict) and "id" in spec:
+        response["id"] = spec["id"]
+    return etag, response
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    timeout = IDLE_TIMEOUT
+    # Kopf und Körper werden getrennt geschrieben; ohne TCP_NODELAY wartet der
+    # Körper auf das (verzögerte) ACK des Clients (~40 ms je Anfrage)
+    disable_nagle_algorithm = True
+    server_version = "UStReihen/1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: HTTPStatus, payload: dict, etag: str | None = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: HTTPStatus, text: str, content_type: str):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_modified(self, etag: str):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _content_length(self) -> int:
+        """
+        Länge des Anfragekörpers. Bei ungültigem Kopf wird die Verbindung nach der
+        Antwort geschlossen, da das Ende des Körpers nicht bekannt ist.
+
+        Raises:
+            ValueError: Wenn ``Content-Length`` keine nicht-negative Ganzzahl ist.
+        """
+        header = self.headers.get("Content-Length") or "0"
+        try:
+            length = int(header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise ValueError(f"Ungültige Content-Length: {header}")
+        return length
+
+    def _read_json(self):
+        length = self._content_length()
+        if length > MAX_BODY_SIZE:
+            # Der ungelesene Körper darf nicht als nächste Anfrage gelten
+            self.close_connection = True
+            raise ValueError("Anfrage zu groß.")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ungültiges JSON: {e}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send_json(HTTPStatus.OK, metrics())
+        elif self.path == "/metrics/prometheus":
+            self._send_text(
+                HTTPStatus.OK,
+                instrumentation.registry.to_prometheus(),
+                "text/plain; version=0.0.4; charset=utf-8",
+            )
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Unbekannter Pfad."})
+
+    def do_POST(self):
+        if self.path != "/evaluate":
+            # Körper verwerfen, damit die Verbindung weiter nutzbar bleibt
+            try:
+                length = self._content_length()
+            except ValueError as e:
+                self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+            if length > MAX_BODY_SIZE:
+                self.close_connection = True
+            else:
+                self.rfile.read(length)
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Unbekannter Pfad."})
+            return
+        try:
+            spec = self._read_json()
+            # Im begrenzten Pool rechnen; der Verbindungs-Thread wartet nur
+            etag, response = self.server.executor.submit(
+                evaluate_request, spec, self.headers.get("If-None-Match") or ""
+            ).result()
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        except Exception:
+            logger.exception("Fehler bei der Auswertung")
+            self._send_json(
+                HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Interner Fehler."}
+            )
+            return
+        if response is None:
+            self._send_not_modified(etag)
+        else:
+            self._send_json(HTTPStatus.OK, response, etag)
+
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """
+    HTTP-Server, der jede Verbindung in einem eigenen Thread hält und die
+    Berechnungen in einem festen Thread-Pool (``executor``) ausführt. Ruhende
+    keep-alive-Verbindungen (bis ``IDLE_TIMEOUT``) belegen damit keinen Worker.
+    """
+
+    daemon_threads = True
+    # Beim Schließen nicht auf ruhende Verbindungen warten
+    block_on_close = False
+
+    def __init__(self, address, handler=ServiceHandler, workers=DEFAULT_WORKERS):
+        super().__init__(address, handler)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ust-service"
+        )
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(
+    host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = DEFAULT_WORKERS
+) -> PooledHTTPServer:
+    """Erstellt den Server (Port 0 wählt einen freien Port)."""
+    return PooledHTTPServer((host, port), ServiceHandler, workers)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m helpers.service",
+        description="HTTP-Dienst für die Auswertung von Reihengeschäften.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Anzahl der Threads für Berechnungen (Standard: {DEFAULT_WORKERS})",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    with make_server(args.host, args.port, args.workers) as server:
+        host, port = server.server_address[:2]
+        logger.info("Dienst läuft auf http://%s:%s", host, port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
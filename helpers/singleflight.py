@@ -0,0 +1,103 @@
+"""
+Zusammenfassen gleichzeitiger, identischer Berechnungen ("single flight").
+
+Treffen mehrere Anfragen mit demselben Schlüssel (z.B. dem Fingerprint eines
+Szenarios) ein, während die Berechnung noch läuft, rechnet nur die erste; die
+übrigen warten auf deren Ergebnis bzw. erhalten deren Fehler. Nach Abschluss wird
+der Schlüssel freigegeben, spätere Anfragen rechnen wieder selbst (dafür ist der
+Ergebnis-Cache zuständig, siehe ``helpers.result_cache``). Damit keine Anfrage
+zwischen Freigabe und Ablage im Cache erneut rechnet, legt ``compute`` das
+Ergebnis selbst ab (siehe ``helpers.service.cached_result``).
+"""
+
+import threading
+import time
+from typing import Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Threadsichere Zusammenfassung gleichzeitiger Berechnungen je Schlüssel mit
+    Kennzahlen (Anteil zusammengefasster Aufrufe, Wartezeiten).
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def do(self, key: Hashable, compute: Callable[[], object]):
+        """
+        Gibt das Ergebnis von ``compute`` zurück. Läuft für ``key`` bereits eine
+        Berechnung, wird auf deren Ergebnis gewartet statt erneut zu rechnen.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.value = compute()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.value
+
+        start = time.perf_counter()
+        call.done.wait()
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def in_flight(self) -> int:
+        """Anzahl der gerade laufenden Berechnungen."""
+        with self._lock:
+            return len(self._calls)
+
+    def reset(self):
+        """Setzt die Kennzahlen zurück (laufende Berechnungen bleiben erhalten)."""
+        with self._lock:
+            self.calls = 0
+            self.coalesced = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def stats(self) -> dict:
+        """Kennzahlen: Aufrufe, zusammengefasste Aufrufe, Quote und Wartezeiten."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+                "coalesced_ratio": self.coalesced / self.calls if self.calls else 0.0,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_avg": (
+                    self.wait_seconds_total / self.coalesced if self.coalesced else 0.0
+                ),
+                "wait_seconds_max": self.wait_seconds_max,
+            }
@@ -0,0 +1,213 @@
+"""
+Vektorisierte Auswertung vieler Reihengeschäfte gleicher Länge mit NumPy.
+
+Die Eingabe liegt spaltenweise vor (ein Array pro Merkmal, eine Zeile pro Kette),
+Länder als ganzzahlige Ids (z.B. ``countries.COUNTRY_INDEX``). Berechnet werden
+die bewegte Lieferung, der Lieferort und die ``VatTreatmentType`` jeder Lieferung
+nach denselben Regeln wie ``Transaktion.calculate_delivery_and_vat`` und
+``Lieferung.determine_vat_treatment``. Rechnungshinweise, Registrierungs- und
+Meldepflichten werden hier nicht ermittelt.
+
+NumPy wird nur von diesem Modul benötigt (in ``requierements`` aufgeführt); die
+übrige Engine importiert es nicht.
+"""
+
+from collections.abc import Iterable
+
+import numpy as np
+
+from helpers.countries import COUNTRY_CODES, COUNTRY_INDEX, EU_CODES
+from helpers.helpers import Chain, IntermediaryStatus, VatTreatmentType
+
+NO_COUNTRY = -1  # Keine abweichende USt-ID
+NO_STATUS = 0  # Status des Zwischenhändlers nicht festgelegt
+NO_SHIPPING = -1  # Kein Transporteur -> Kette ungültig
+
+# EU-Zugehörigkeit je Länder-Id aus COUNTRY_INDEX
+EU_MASK = np.array([code in EU_CODES for code in COUNTRY_CODES], dtype=bool)
+
+_BUYER = IntermediaryStatus.BUYER.value
+_SUPPLIER = IntermediaryStatus.SUPPLIER.value
+
+_NORMAL = VatTreatmentType.TAXABLE_NORMAL.value
+_REVERSE_CHARGE = VatTreatmentType.TAXABLE_REVERSE_CHARGE.value
+_TRIANGULAR = VatTreatmentType.TAXABLE_TRIANGULAR_BUSINESS.value
+_IC_SUPPLY = VatTreatmentType.EXEMPT_IC_SUPPLY.value
+_EXPORT = VatTreatmentType.EXEMPT_EXPORT.value
+_OUT_OF_SCOPE = VatTreatmentType.OUT_OF_SCOPE.value
+_UNKNOWN = VatTreatmentType.UNKNOWN.value
+
+
+def chain_arrays(chains: Iterable[Chain]) -> dict[str, np.ndarray]:
+    """
+    Wandelt Ketten gleicher Länge in die Eingabe von ``evaluate_chains`` um.
+    Die Länder werden über ``COUNTRY_INDEX`` nummeriert.
+    """
+    country, vat_country, status, import_vat, shipping = [], [], [], [], []
+    for chain in chains:
+        country.append([COUNTRY_INDEX[c.country.code] for c in chain])
+        vat_country.append(
+            [
+                (
+                    COUNTRY_INDEX[c.new_country.code]
+                    if c.changed_vat and c.new_country
+                    else NO_COUNTRY
+                )
+                for c in chain
+            ]
+        )
+        status.append(
+            [
+                c.intermediary_status.value if c.intermediary_status else NO_STATUS
+                for c in chain
+            ]
+        )
+        import_vat.append([bool(c.responsible_for_import_vat) for c in chain])
+        index = chain.shipping_index
+        shipping.append(NO_SHIPPING if index is None else index)
+    if len({len(row) for row in country}) > 1:
+        raise ValueError("Alle Ketten müssen gleich viele Firmen haben.")
+    return {
+        "country": np.array(country, dtype=np.int32),
+        "shipping": np.array(shipping, dtype=np.int32),
+        "status": np.array(status, dtype=np.int8),
+        "vat_country": np.array(vat_country, dtype=np.int32),
+        "import_vat": np.array(import_vat, dtype=bool),
+    }
+
+
+def evaluate_chains(
+    country: np.ndarray,
+    shipping: np.ndarray,
+    status: np.ndarray | None = None,
+    vat_country: np.ndarray | None = None,
+    import_vat: np.ndarray | None = None,
+    eu_mask: np.ndarray = EU_MASK,
+) -> dict[str, np.ndarray]:
+    """
+    Wertet ``m`` Ketten mit je ``n`` Firmen aus.
+
+    Args:
+        country: (m, n) Länder-Ids der Firmen.
+        shipping: (m,) Position des (ersten) Transporteurs, ``NO_SHIPPING`` wenn keiner.
+        status: (m, n) ``IntermediaryStatus.value`` je Firma, ``NO_STATUS`` wenn keiner.
+        vat_country: (m, n) Länder-Id der abweichenden USt-ID, ``NO_COUNTRY`` wenn keine.
+        import_vat: (m, n) EUSt-Zuständigkeit je Firma (die erste zählt für § 3 Abs. 8).
+        eu_mask: EU-Zugehörigkeit je Länder-Id.
+
+    Die Zollzuständigkeit beeinflusst die Berechnung nicht und wird daher nicht
+    übergeben.
+
+    Returns:
+        dict: ``valid`` (m,) Kette auswertbar (Transporteur vorhanden),
+              ``moved`` (m,) Index der bewegten Lieferung (-1 wenn ungültig),
+              ``triangle`` (m,) Dreiecksgeschäft,
+              ``place`` (m, n-1) Länder-Id des Lieferorts (-1 wenn ungültig),
+              ``vat_treatment`` (m, n-1) ``VatTreatmentType.value`` je Lieferung.
+    """
+    country = np.asarray(country)
+    chains, length = country.shape
+    if length < 2:
+        raise ValueError("Transaktion benötigt mindestens 2 Firmen.")
+    shipping = np.asarray(shipping)
+    if status is None:
+        status = np.zeros_like(country, dtype=np.int8)
+    if vat_country is None:
+        vat_country = np.full_like(country, NO_COUNTRY)
+    if import_vat is None:
+        import_vat = np.zeros(country.shape, dtype=bool)
+    rows = np.arange(chains)
+    valid = (shipping >= 0) & (shipping < length)
+    ship = np.where(valid, shipping, 0)
+
+    start, end = country[:, 0], country[:, -1]
+    start_eu, end_eu = eu_mask[start], eu_mask[end]
+
+    # 4. Bewegte Lieferung (§ 3 Abs. 6a UStG)
+    ship_status = status[rows, ship]
+    ship_vat = vat_country[rows, ship]
+    # Zwischenhändler: "Abnehmer" oder ohne Status mit USt-ID des Abgangslandes
+    # -> Lieferung an ihn ist bewegt, sonst die Lieferung von ihm
+    to_intermediary = (ship_status == _BUYER) | (
+        (ship_status != _SUPPLIER) & (ship_vat != NO_COUNTRY) & (ship_vat == start)
+    )
+    moved = np.where(to_intermediary, ship - 1, ship)
+    moved = np.where(ship == 0, 0, moved)
+    moved = np.where(ship == length - 1, length - 2, moved)
+
+    # 5. Orte: vor der bewegten Lieferung Startland, danach Endland
+    deliveries = np.arange(length - 1)
+    is_moved = deliveries[None, :] == moved[:, None]
+    place = np.where(
+        deliveries[None, :] <= moved[:, None], start[:, None], end[:, None]
+    )
+    # § 3 Abs. 8 UStG: Einfuhr, erster EUSt-Schuldner ist Lieferant der bewegten Lieferung
+    has_import_vat = import_vat.any(axis=1)
+    first_import_vat = np.where(has_import_vat, import_vat.argmax(axis=1), -1)
+    relocated = ~start_eu & end_eu & (first_import_vat == moved)
+    place = np.where(is_moved & relocated[:, None], end[:, None], place)
+
+    # Dreiecksgeschäft (§ 25b UStG): drei Firmen, A -> B bewegt, drei EU-Länder
+    if length == 3:
+        b_vat = vat_country[:, 1]
+        b_country = np.where(
+            (b_vat != NO_COUNTRY) & eu_mask[np.maximum(b_vat, 0)], b_vat, country[:, 1]
+        )
+        triangle = (
+            start_eu
+            & eu_mask[b_country]
+            & end_eu
+            & (start != b_country)
+            & (start != end)
+            & (b_country != end)
+            & (moved == 0)
+        )
+    else:
+        triangle = np.zeros(chains, dtype=bool)
+
+    # 6. Steuerliche Behandlung je Lieferung
+    supplier = country[:, :-1]
+    customer = country[:, 1:]
+    supplier_eu = eu_mask[supplier]
+    place_eu = eu_mask[place]
+
+    # Lieferant aus einem Drittland
+    third_country = np.where(
+        import_vat[:, :-1],
+        _NORMAL,
+        np.where(eu_mask[customer] & (customer == place), _REVERSE_CHARGE, _NORMAL),
+    )
+    # Bewegte Lieferung
+    moved_eu = place_eu & end_eu[:, None]
+    moved_treatment = np.select(
+        [
+            moved_eu & triangle[:, None],
+            moved_eu & (place != end[:, None]),
+            moved_eu,
+            place_eu,
+        ],
+        [_IC_SUPPLY, _IC_SUPPLY, _NORMAL, _EXPORT],
+        default=_OUT_OF_SCOPE,
+    )
+    # Ruhende Lieferung (B -> C im Dreiecksgeschäft)
+    second_triangle_delivery = triangle[:, None] & (deliveries[None, :] == 1)
+    stationary_treatment = np.where(
+        place_eu,
+        np.where(second_triangle_delivery, _TRIANGULAR, _NORMAL),
+        _OUT_OF_SCOPE,
+    )
+    vat_treatment = np.where(
+        ~supplier_eu,
+        third_country,
+        np.where(is_moved, moved_treatment, stationary_treatment),
+    ).astype(np.int8)
+
+    vat_treatment[~valid] = _UNKNOWN
+    place[~valid] = -1
+    return {
+        "valid": valid,
+        "moved": np.where(valid, moved, -1),
+        "triangle": triangle & valid,
+        "place": place,
+        "vat_treatment": vat_treatment,
+    }
@@ -1,16 +1,29 @@
 from random import randrange
 
+import json
+
 import streamlit as st
-from graphviz import Digraph
 
+from helpers import instrumentation
 from helpers.countries import Country
+from helpers.diagram import ChainDiagram, show_diagram
 from helpers.fixed_header import st_fixed_container
+from helpers.localization import get_countries, get_country_labels
 from helpers.helpers import (
-    get_countries,
+    Chain,
     Handelsstufe,
     Transaktion,
     Lieferung,
     IntermediaryStatus,
+    TRACE_RULES,
+    reporting_labels,
+)
+from helpers.patterns import canonical_result
+from helpers.scenario import (
+    apply_result,
+    cached_result,
+    registrations_from_result,
+    reporting_from_result,
 )
 
 
@@ -20,16 +33,18 @@ def helper_switch_page(page, options):
     """
     st.session_state["aktuelle_seite"] = page
     if page == 1:
-        st.session_state["transaction"] = Transaktion(options[0], options[-1])
+        st.session_state["transaction"] = Transaktion.from_chain(options)
 
 
 def Eingabe_1():
     st.title("USt-Reihengeschäfte - Dateneingabe")
     laender_firmen: list[Handelsstufe] = []
+    kette: Chain | None = None
     show_next_steps = False
 
-    # Liste der verfügbaren Länder auf Deutsch
+    # Liste der verfügbaren Länder auf Deutsch (prozessweit zwischengespeichert)
     laender = get_countries()
+    laender_labels = get_country_labels()
     schritt = 0
 
     diagram = st_fixed_container(mode="sticky", position="top", margin="0px")
@@ -82,7 +97,7 @@ def Eingabe_1():
                     laender,
                     key=f"firma_{i}",
                     index=st.session_state["firmenland_indices"][i],
-                    format_func=lambda c: f"{c.name} ({c.code}){' - EU' if c.EU else ''}",  # Bessere Anzeige
+                    format_func=laender_labels.__getitem__,  # Vorberechnete Anzeige
                 )
                 selected_countries.append(selected_country)
                 # Update session state index if changed by user
@@ -97,11 +112,7 @@ def Eingabe_1():
             ]
 
             # Verknüpfe die Kette
-            for i, firma in enumerate(laender_firmen):
-                if i > 0:
-                    firma.add_previous_company_to_chain(firma, laender_firmen[i - 1])
-                if i < anzahl_firmen - 1:
-                    firma.add_next_company_to_chain(firma, laender_firmen[i + 1])
+            kette = Chain(laender_firmen)
 
             export_relevant = False
             import_relevant = False
@@ -385,7 +396,7 @@ def Eingabe_1():
                     "Analyse starten",
                     icon="🛫",
                     on_click=helper_switch_page,
-                    args=(1, laender_firmen),
+                    args=(1, kette),
                     use_container_width=True,
                 )
             else:
@@ -413,81 +424,55 @@ def Eingabe_1():
                     )
 
     # --- Diagramm (immer anzeigen, wenn Kette existiert) ---
-    if len(laender_firmen) >= 2:  # Mindestens 2 Firmen für Diagramm
-        transaction = Transaktion(laender_firmen[0], laender_firmen[-1])
-        dot = Digraph(comment="Geschäftsablauf", graph_attr={"rankdir": "LR"})
-        with dot.subgraph() as s:
-            s.attr("node", shape="box")
-            for company in transaction.get_ordered_chain_companies():
-                company_text = f"{company.get_role_name(True)}"
-                # Zusatzinfos: Abw. USt-ID und Status
-                zusatz_infos = []
-                if company.changed_vat and company.new_country:
-                    zusatz_infos.append(f"USt-ID: {company.new_country.code}\n")
-                if company.intermediary_status is not None:
-                    zusatz_infos.append(
-                        f"Status: {company.get_intermideary_status()}\n"
-                    )
-                if company.responsible_for_import_vat:
-                    zusatz_infos.append("EUSt-Anmeldung\n")
+    if kette is not None and len(kette) >= 2:  # Mindestens 2 Firmen für Diagramm
+        transaction = Transaktion.from_chain(kette)
+        dot = ChainDiagram()
+        for company in transaction.chain:
+            company_text = f"{company.get_role_name(True)}"
+            # Zusatzinfos: Abw. USt-ID und Status
+            zusatz_infos = []
+            if company.changed_vat and company.new_country:
+                zusatz_infos.append(f"USt-ID: {company.new_country.code}\n")
+            if company.intermediary_status is not None:
+                zusatz_infos.append(f"Status: {company.get_intermideary_status()}\n")
+            if company.responsible_for_import_vat:
+                zusatz_infos.append("EUSt-Anmeldung\n")
+
+            if zusatz_infos:
+                company_text += "\n" + "".join(zusatz_infos)
+            else:
+                company_text += "\n--------\n "  # Minimaler Platzhalter für Höhe
+            company_text += f"{company.country.name} ({company.country.code})"
+            if company.country.EU:
+                company_text += ", EU"
+            else:
+                # Kleinerer Platzhalter oder ganz weglassen
+                company_text += "\n"  # Minimaler Abstand
 
-                if zusatz_infos:
-                    company_text += "\n" + "".join(zusatz_infos)
-                else:
-                    company_text += "\n--------\n "  # Minimaler Platzhalter für Höhe
-                company_text += f"{company.country.name} ({company.country.code})"
-                if company.country.EU:
-                    company_text += ", EU"
-                else:
-                    # Kleinerer Platzhalter oder ganz weglassen
-                    company_text += "\n"  # Minimaler Abstand
-
-                # Farbliche Markierung (Transporteur/Zoll/EUSt)
-                colors = []
-                if company.responsible_for_shippment:
-                    colors.append("#ffa500")  # Orange für Transport
-                if company.responsible_for_customs:
-                    colors.append("#b2d800")  # Grün für Export-Zoll
-                if company.responsible_for_import_vat:
-                    colors.append("#add8e6")  # Hellblau für EUSt
-
-                node_attrs = {}
-                if colors:
-                    node_attrs["style"] = "filled"
-                    if len(colors) > 1:
-                        node_attrs["fillcolor"] = ":".join(colors)  # Gradient
-                    else:
-                        node_attrs["fillcolor"] = colors[0]
+            # Farbliche Markierung (Transporteur/Zoll/EUSt)
+            colors = []
+            if company.responsible_for_shippment:
+                colors.append("#ffa500")  # Orange für Transport
+            if company.responsible_for_customs:
+                colors.append("#b2d800")  # Grün für Export-Zoll
+            if company.responsible_for_import_vat:
+                colors.append("#add8e6")  # Hellblau für EUSt
 
-                s.node(str(company.identifier), company_text, **node_attrs)
+            # Mehrere Farben werden als Farbverlauf dargestellt
+            dot.node(company_text, colors)
 
         # Kanten für Rechnung/Bestellung/Transport
-        for company in laender_firmen:
-            if company.next_company:
-                dot.edge(
-                    str(company.identifier),
-                    str(company.next_company.identifier),
-                    "Rechnung",
-                    color="orange",
-                )
-                dot.edge(
-                    str(company.next_company.identifier),
-                    str(company.identifier),
-                    "Bestellung",
-                    style="dashed",
-                    color="grey",
-                )
+        for position in range(len(kette) - 1):
+            dot.edge(position, position + 1, "Rechnung", color="orange")
+            dot.edge(position + 1, position, "Bestellung", style="dashed", color="grey")
         if transaction.find_shipping_company():
-            dot.edge(
-                str(transaction.start_company.identifier),
-                str(transaction.end_company.identifier),
+            dot.transport(
                 f"Transport durch {transaction.shipping_company.get_role_name(True)} - {transaction.shipping_company.country.name} ({transaction.shipping_company.country.code})",
                 style="bold",
                 color="blue",
-                splines="polyline",
             )
 
-        diagram.graphviz_chart(dot, use_container_width=True)
+        show_diagram(diagram, dot)
 
 
 def Analyse_1():
@@ -495,10 +480,17 @@ def Analyse_1():
         transaction: Transaktion = st.session_state["transaction"]
 
         st.title("USt-Reihengeschäfte - Analyse")
+        # Mit Entscheidungsweg wird ohne Cache gerechnet
+        transaction.trace = st.toggle(
+            "Entscheidungsweg anzeigen",
+            key="show_trace",
+            help="Zeigt je Lieferung die angewendeten Regeln der Berechnung.",
+        )
         try:
-            # Berechnung durchführen (nur einmal)
-            alle_lieferungen: list[Lieferung] = transaction.calculate_delivery_and_vat()
-            is_triangle = transaction.is_triangular_transaction()
+            # Berechnung durchführen (gleiche Szenarien nur einmal pro Prozess)
+            result = cached_result(transaction, evaluate=canonical_result)
+            alle_lieferungen: list[Lieferung] = apply_result(transaction, result)
+            is_triangle = result["triangle"]
             if is_triangle:
                 st.success(
                     """**Dreiecksgeschäft erkannt!**
@@ -507,23 +499,19 @@ def Analyse_1():
 					""",
                     icon="🔺",
                 )
-            dot_analyse = Digraph(
-                comment="Analyse Reihengeschäft", graph_attr={"rankdir": "LR"}
-            )
+            dot_analyse = ChainDiagram()
 
             # 1. Knoten (Firmen) erstellen
-            with dot_analyse.subgraph() as s:
-                s.attr("node", shape="box")
-                firmen_im_graph = transaction.get_ordered_chain_companies()
-                for company in firmen_im_graph:
-                    # Basis-Label wie in der Eingabe
-                    company_text = f"{company.get_role_name(True)}\n{company.country.name} ({company.country.code})"
-                    if company.country.EU:
-                        company_text += ", EU"
-
-                    if company.changed_vat and company.new_country:
-                        company_text += f"\nabw. USt-ID: {company.new_country.code}"
-                    s.node(str(company.identifier), company_text)
+            firmen_im_graph = transaction.chain
+            for company in firmen_im_graph:
+                # Basis-Label wie in der Eingabe
+                company_text = f"{company.get_role_name(True)}\n{company.country.name} ({company.country.code})"
+                if company.country.EU:
+                    company_text += ", EU"
+
+                if company.changed_vat and company.new_country:
+                    company_text += f"\nabw. USt-ID: {company.new_country.code}"
+                dot_analyse.node(company_text)
 
             # 2. Kanten (Rechnungen UND ruhende Lieferungen) erstellen
             bewegte_lieferung_gefunden: Lieferung | None = None
@@ -539,23 +527,21 @@ def Analyse_1():
                     rechnungs_label += f"\n({lief.invoice_note})"
 
                 dot_analyse.edge(
-                    str(lief.lieferant.identifier),
-                    str(lief.kunde.identifier),
+                    firmen_im_graph.index(lief.lieferant),
+                    firmen_im_graph.index(lief.kunde),
                     label=rechnungs_label,
                     color="orange",  # Farbe für Rechnungen
-                    fontsize="10",
                 )
 
                 # --- Kante für Ruhende Lieferung ---
                 if not lief.is_moved_supply:
                     ruhend_label = f"ruhende Lieferung\n"
                     dot_analyse.edge(
-                        str(lief.lieferant.identifier),
-                        str(lief.kunde.identifier),
+                        firmen_im_graph.index(lief.lieferant),
+                        firmen_im_graph.index(lief.kunde),
                         label=ruhend_label,
                         color="grey",  # Andere Farbe für ruhende Lieferung
                         style="dashed",  # Gestrichelt zur Unterscheidung
-                        fontsize="9",  # Etwas kleiner
                     )
                 else:
                     # Merke dir die bewegte Lieferung für die separaten Kanten
@@ -566,32 +552,25 @@ def Analyse_1():
                 bewegte_label = f"bewegte Lieferung"
                 dot_analyse.edge(
                     # Von Lieferant zu Kunde DIESER Lieferung
-                    str(bewegte_lieferung_gefunden.lieferant.identifier),
-                    str(bewegte_lieferung_gefunden.kunde.identifier),
+                    firmen_im_graph.index(bewegte_lieferung_gefunden.lieferant),
+                    firmen_im_graph.index(bewegte_lieferung_gefunden.kunde),
                     label=bewegte_label,
                     color="blue",  # Farbe für rechtlich bewegte Lieferung
                     style="bold",
-                    fontsize="10",
-                    # constraint='false' # Kann helfen, Layout zu entzerren
                 )
 
             # 4. Kante für den PHYSISCHEN Transportweg (GRÜN)
             if transaction.shipping_company:  # Nur wenn ein Transporteur bekannt ist
                 transport_label = f"physischer Transport\ndurch {transaction.shipping_company.get_role_name(True)}"
-                dot_analyse.edge(
+                dot_analyse.transport(
                     # Von erster zu letzter Firma
-                    str(transaction.start_company.identifier),
-                    str(transaction.end_company.identifier),
                     label=transport_label,
                     color="green",  # Farbe für physischen Transport
                     style="bold, dotted",  # Fett und gepunktet zur Unterscheidung
-                    fontsize="10",
-                    splines="polyline",  # Oder polyline, um Knoten zu umgehen
-                    # constraint='false' # Kann helfen, Layout zu entzerren
                 )
 
             # Graph anzeigen
-            st.graphviz_chart(dot_analyse, use_container_width=True)
+            show_diagram(st, dot_analyse)
             # --- Abschnitt Lieferungen ---
             with st.expander("Übersicht der Lieferungen", icon="🚚", expanded=True):
                 # 1. Bewegte Lieferung anzeigen
@@ -642,9 +621,20 @@ def Analyse_1():
                                 st.caption(f"Hinweis: {lief.invoice_note}")
                         if i < len(alle_lieferungen) - 1:
                             st.divider()  # Trennlinie nach jeder Rechnung
+            # --- Abschnitt Entscheidungsweg (nur auf Wunsch) ---
+            if transaction.trace and alle_lieferungen:
+                with st.expander("Entscheidungsweg", icon="🧭", expanded=True):
+                    for lief in alle_lieferungen:
+                        st.markdown(f"**{lief.lieferant} -> {lief.kunde}**")
+                        st.markdown(
+                            "\n".join(
+                                f"- `{rule}` {TRACE_RULES.get(rule, '')}"
+                                for rule in lief.trace or ()
+                            )
+                        )
             if alle_lieferungen:
                 try:  # Nur anzeigen, wenn Berechnung erfolgreich war
-                    registration_data = transaction.determine_registration_obligations()
+                    registration_data = registrations_from_result(transaction, result)
                     with st.expander(
                         "Mögliche Registrierungspflichten (EU)",
                         icon="🇪🇺",
@@ -667,7 +657,9 @@ def Analyse_1():
                             for f in firmen_in_order
                         ]  # Stelle sicher, dass alle Firmen berücksichtigt werden
 
-                        for firma, registrierungen_set in data_items:
+                        for current_index, (firma, registrierungen_set) in enumerate(
+                            data_items
+                        ):
                             # Überspringe Firmen ohne EU-Registrierungsbedarf oder Drittlandsfirmen ohne Bedarf
                             # Diese Bedingung könnte zu streng sein, wenn eine Drittlandsfirma Registrierungen hat
                             # Besser: Prüfen, ob überhaupt Registrierungen vorhanden sind
@@ -711,8 +703,6 @@ def Analyse_1():
                                     )
 
                             # Trennlinie nach jeder Firma, außer der letzten
-                            # Finde den Index der aktuellen Firma in der geordneten Liste
-                            current_index = firmen_in_order.index(firma)
                             if current_index < len(firmen_in_order) - 1:
                                 st.divider()
 
@@ -728,7 +718,7 @@ def Analyse_1():
                     )
             if alle_lieferungen:
                 try:
-                    reporting_data = transaction.determine_reporting_obligations()
+                    reporting_data = reporting_from_result(transaction, result)
                     # Prüfen, ob überhaupt Meldepflichten gefunden wurden
                     has_reporting_needs = any(reporting_data.values())
 
@@ -754,26 +744,28 @@ def Analyse_1():
                                 for f in firmen_in_order
                             ]
 
-                            for firma, meldungen_set in data_items:
+                            # Position der letzten Firma mit Meldepflichten
+                            last_with_needs = max(
+                                (
+                                    i
+                                    for i, (_, meldungen_set) in enumerate(data_items)
+                                    if meldungen_set
+                                ),
+                                default=-1,
+                            )
+                            for current_index, (firma, meldungen_set) in enumerate(
+                                data_items
+                            ):
                                 # Nur Firmen anzeigen, die Meldepflichten haben
                                 if meldungen_set:
                                     st.markdown(f"**{firma}**")  # Nutzt __repr__
 
-                                    sorted_meldungen = sorted(list(meldungen_set))
-                                    for meldung in sorted_meldungen:
+                                    for meldung in reporting_labels(meldungen_set):
                                         st.markdown(f"- {meldung}")
 
-                                    current_index = firmen_in_order.index(firma)
-                                    if current_index < len(firmen_in_order) - 1:
-                                        # Trennlinie nur, wenn noch eine Firma mit Meldungen folgt
-                                        next_firma_has_needs = any(
-                                            reporting_data.get(f, set())
-                                            for f in firmen_in_order[
-                                                current_index + 1 :
-                                            ]
-                                        )
-                                        if next_firma_has_needs:
-                                            st.divider()
+                                    # Trennlinie nur, wenn noch eine Firma mit Meldungen folgt
+                                    if current_index < last_with_needs:
+                                        st.divider()
 
                 except Exception as e:
                     st.error(
@@ -787,6 +779,41 @@ def Analyse_1():
             st.error(f"Ein unerwarteter Fehler ist aufgetreten: {e}", icon="🔥")
             alle_lieferungen = []  # Sicherstellen, dass die Liste leer ist bei Fehlern
 
+        # --- Laufzeiten der Berechnung (nur mit UST_TIMINGS=1) ---
+        if instrumentation.is_enabled():
+            with st.expander("Laufzeiten der Berechnung", icon="⏱️", expanded=False):
+                st.caption(
+                    "Gesammelt über alle Berechnungen dieses Prozesses. Bereits "
+                    "zwischengespeicherte Ergebnisse werden nicht erneut gemessen."
+                )
+                st.dataframe(
+                    [
+                        {
+                            "Phase": row["label"],
+                            "Aufrufe": row["count"],
+                            "Mittel (ms)": round(row["mean_ms"], 3),
+                            "95 % bis (ms)": row["p95_ms"],
+                            "Summe (ms)": round(row["total_ms"], 1),
+                        }
+                        for row in instrumentation.registry.summary()
+                    ],
+                    hide_index=True,
+                    use_container_width=True,
+                )
+                col1, col2 = st.columns(2)
+                col1.download_button(
+                    "Prometheus-Export",
+                    data=instrumentation.registry.to_prometheus(),
+                    file_name="ust_laufzeiten.prom",
+                    mime="text/plain",
+                )
+                col2.download_button(
+                    "JSON-Export",
+                    data=json.dumps(instrumentation.registry.snapshot(), indent=2),
+                    file_name="ust_laufzeiten.json",
+                    mime="application/json",
+                )
+
         # --- Zurück-Button ---
         st.button(
             "Zurück zur Eingabe", icon="⬅️", on_click=helper_switch_page, args=(0, None)
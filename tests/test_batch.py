@@ -0,0 +1,284 @@
+import csv
+import json
+
+import pytest
+
+from helpers.batch import iter_results, read_specs, run_batch
+from helpers.result_cache import LRUCache
+from helpers.scenario import (
+    apply_result,
+    cached_result,
+    evaluate_spec,
+    fingerprint,
+    registrations_from_result,
+    result_from_transaction,
+    transaction_from_spec,
+)
+from helpers.patterns import canonical_result, canonicalize
+from test_reihengeschaeft import (
+    TEST_SCENARIOS_THREE_COMPANIES,
+    TEST_SCENARIOS_FOUR_COMPANIES,
+    TEST_SCENARIOS_TEN_COMPANIES,
+)
+
+SCENARIOS = TEST_SCENARIOS_THREE_COMPANIES + TEST_SCENARIOS_FOUR_COMPANIES
+
+
+def spec_from_scenario(index, scenario):
+    """Wandelt ein Testszenario in eine JSON-serialisierbare Spezifikation um."""
+    companies = []
+    for config in scenario["companies"]:
+        config = dict(config)
+        if config["intermediary_status"] is not None:
+            config["intermediary_status"] = config["intermediary_status"].name
+        companies.append(config)
+    return {"id": index, "companies": companies}
+
+
+SPECS = [spec_from_scenario(i, s) for i, s in enumerate(SCENARIOS)]
+
+
+def assert_matches_scenario(result, scenario):
+    assert "error" not in result
+    assert result["triangle"] == scenario["expected_triangle"]
+    for actual, expected in zip(result["deliveries"], scenario["expected_deliveries"]):
+        assert actual["from"] == expected["from"]
+        assert actual["to"] == expected["to"]
+        assert actual["moved"] == expected["moved"]
+        assert actual["place"] == expected["place"]
+        assert actual["vat_treatment"] == expected["vat"].name
+    registrations = {i: set(codes) for i, codes in enumerate(result["registrations"])}
+    assert registrations == scenario["expected_registrations"]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_iter_results_keeps_input_order(workers):
+    results = list(iter_results(SPECS, workers=workers, chunksize=3))
+    assert [r["id"] for r in results] == [s["id"] for s in SPECS]
+    for result, scenario in zip(results, SCENARIOS):
+        assert_matches_scenario(result, scenario)
+
+
+def test_errors_are_reported_per_chain():
+    specs = [
+        {"id": "ohne-transport", "companies": [{"country_code": "DE"}] * 3},
+        {"id": "unbekannt", "companies": [{"country_code": "XX", "ship": True}] * 3},
+        SPECS[0],
+    ]
+    results = list(iter_results(specs, workers=0))
+    assert "Transport" in results[0]["error"]
+    assert "XX" in results[1]["error"]
+    assert "error" not in results[2]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_malformed_specs_do_not_cancel_the_batch(workers, tmp_path):
+    specs = [
+        {"id": "zeichenketten", "companies": ["DE", "AT"]},
+        {"id": "zahlen", "companies": [1, {"country_code": "AT"}]},
+        {"id": "ohne-liste", "companies": {"country_code": "DE"}},
+        SPECS[0],
+    ]
+    results = list(iter_results(specs, workers=workers, chunksize=2))
+    assert [r["id"] for r in results] == [s["id"] for s in specs]
+    assert "Firma 1" in results[0]["error"]
+    assert "Firma 1" in results[1]["error"]
+    assert "Liste" in results[2]["error"]
+    assert_matches_scenario(results[3], SCENARIOS[0])
+
+    # Auch als Datei wird der ganze Stapel geschrieben
+    source = tmp_path / "ketten.jsonl"
+    source.write_text("\n".join(json.dumps(spec) for spec in specs) + "\n")
+    target = tmp_path / "ergebnisse.csv"
+    assert run_batch(source, target, workers=workers) == len(specs)
+
+
+def test_unexpected_errors_are_reported_per_chain(monkeypatch):
+    from helpers import batch
+
+    def failing(spec, evaluate):
+        if spec["id"] == "kaputt":
+            raise AttributeError("'str' object has no attribute 'get'")
+        return evaluate_spec(spec, evaluate)
+
+    monkeypatch.setattr(batch, "evaluate_spec", failing)
+    results = list(iter_results([{"id": "kaputt"}, SPECS[0]], workers=0))
+    assert results[0] == {
+        "id": "kaputt",
+        "error": "Unerwarteter Fehler (AttributeError): "
+        "'str' object has no attribute 'get'",
+    }
+    assert_matches_scenario(results[1], SCENARIOS[0])
+
+
+def test_run_batch_jsonl(tmp_path):
+    source = tmp_path / "ketten.jsonl"
+    source.write_text("\n".join(json.dumps(spec) for spec in SPECS) + "\n")
+    target = tmp_path / "ergebnisse.jsonl"
+
+    assert run_batch(source, target, workers=0) == len(SPECS)
+
+    results = [json.loads(line) for line in target.read_text().splitlines()]
+    for result, scenario in zip(results, SCENARIOS):
+        assert_matches_scenario(result, scenario)
+
+
+def test_run_batch_csv(tmp_path):
+    source = tmp_path / "ketten.csv"
+    with open(source, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["chain_id", "country_code", "ship", "intermediary_status"])
+        writer.writerow(["a", "DE", "1", ""])
+        writer.writerow(["a", "AT", "0", ""])
+        writer.writerow(["a", "FR", "0", ""])
+        writer.writerow(["b", "DE", "0", ""])
+        writer.writerow(["b", "AT", "1", "Abnehmer"])
+        writer.writerow(["b", "AT", "0", ""])
+    assert [spec["id"] for spec in read_specs(source)] == ["a", "b"]
+
+    target = tmp_path / "ergebnisse.csv"
+    assert run_batch(source, target, workers=0) == 2
+
+    with open(target, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(row["chain_id"], row["moved"]) for row in rows] == [
+        ("a", "True"),
+        ("a", "False"),
+        ("b", "True"),
+        ("b", "False"),
+    ]
+    assert rows[0]["vat_treatment"] == "EXEMPT_IC_SUPPLY"
+    assert rows[1]["vat_treatment"] == "TAXABLE_TRIANGULAR_BUSINESS"
+    assert rows[0]["supplier_reporting"] == "Intrastat Versendung;ZM"
+
+
+def test_cached_result_is_shared_by_fingerprint():
+    cache = LRUCache(maxsize=2)
+    first = transaction_from_spec(SPECS[0])
+    second = transaction_from_spec(SPECS[0])
+    assert fingerprint(first.chain) == fingerprint(second.chain)
+
+    result = cached_result(first, cache)
+    assert cached_result(second, cache) is result
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    lieferungen = apply_result(second, result)
+    assert [l.lieferant for l in lieferungen] == list(second.chain)[:-1]
+    assert all(l.vat_treatment for l in lieferungen)
+    registrations = registrations_from_result(second, result)
+    assert {
+        second.chain.index(f): {c.code for c in countries}
+        for f, countries in registrations.items()
+    } == SCENARIOS[0]["expected_registrations"]
+
+    second.chain[0].responsible_for_customs = True
+    assert fingerprint(second.chain) != fingerprint(first.chain)
+    for spec in SPECS[1:3]:
+        cached_result(transaction_from_spec(spec), cache)
+    assert len(cache) == 2 and fingerprint(first.chain) not in cache
+
+
+@pytest.mark.parametrize(
+    "spec",
+    SPECS
+    + [
+        spec_from_scenario(i, s)
+        for i, s in enumerate(TEST_SCENARIOS_TEN_COMPANIES, start=len(SPECS))
+    ],
+)
+def test_canonical_result_matches_direct_evaluation(spec):
+    cache = LRUCache()
+    expected = result_from_transaction(transaction_from_spec(spec))
+    assert canonical_result(transaction_from_spec(spec), cache) == expected
+
+
+def test_equivalent_chains_share_one_pattern():
+    def spec(*codes):
+        return {
+            "companies": [{"country_code": codes[0], "ship": True}]
+            + [{"country_code": code} for code in codes[1:]]
+        }
+
+    cache = LRUCache()
+    first = transaction_from_spec(spec("DE", "AT", "FR"))
+    second = transaction_from_spec(spec("NL", "BE", "PL"))
+    assert canonicalize(first.chain)[0] == canonicalize(second.chain)[0]
+    assert (
+        canonicalize(first.chain)[0]
+        != canonicalize(transaction_from_spec(spec("DE", "AT", "DE")).chain)[0]
+    )
+
+    canonical_result(first, cache)
+    result = canonical_result(second, cache)
+    assert cache.stats()["hits"] == 1
+    assert result["deliveries"][0]["place"] == "NL"
+    assert result["registrations"][2] == ["PL"]
+
+
+def test_answer_table_lookup_and_fallback(tmp_path, monkeypatch):
+    from helpers import answer_table
+    from helpers.patterns import pattern_result
+
+    path = tmp_path / "antworten.bin"
+    count = answer_table.build_answer_table(path, max_length=2)
+    table = answer_table.AnswerTable(path)
+    assert len(table) == count == len(set(answer_table.iter_patterns(2)))
+    for pattern in answer_table.iter_patterns(2):
+        assert table.get(pattern) == pattern_result(pattern)
+
+    monkeypatch.setenv(answer_table.ENVIRONMENT_VARIABLE, str(path))
+    answer_table.default_table.cache_clear()
+    try:
+        two = transaction_from_spec(
+            {
+                "companies": [
+                    {"country_code": "CN", "ship": True},
+                    {"country_code": "DE"},
+                ]
+            }
+        )
+        pattern, _ = canonicalize(two.chain)
+        assert table.get(pattern) is not None
+        assert canonical_result(two, LRUCache()) == result_from_transaction(
+            transaction_from_spec(
+                {
+                    "companies": [
+                        {"country_code": "CN", "ship": True},
+                        {"country_code": "DE"},
+                    ]
+                }
+            )
+        )
+        # Muster außerhalb der Tabelle werden live berechnet
+        three = transaction_from_spec(SPECS[0])
+        assert table.get(canonicalize(three.chain)[0]) is None
+        assert canonical_result(three, LRUCache()) == result_from_transaction(
+            transaction_from_spec(SPECS[0])
+        )
+    finally:
+        answer_table.default_table.cache_clear()
+
+
+def test_answer_table_key_collision_is_a_miss(tmp_path, monkeypatch):
+    from helpers import answer_table
+    from helpers.patterns import pattern_result
+
+    path = tmp_path / "antworten.bin"
+    answer_table.build_answer_table(path, max_length=2)
+    table = answer_table.AnswerTable(path)
+    stored = next(answer_table.iter_patterns(2))
+    missing = canonicalize(transaction_from_spec(SPECS[0]).chain)[0]
+
+    # Das fehlende Muster erhält den 64-Bit-Schlüssel eines gespeicherten
+    key = answer_table._key
+    colliding = answer_table.encode_pattern(missing)
+    monkeypatch.setattr(
+        answer_table,
+        "_key",
+        lambda encoded: key(
+            answer_table.encode_pattern(stored) if encoded == colliding else encoded
+        ),
+    )
+    assert answer_table.pattern_key(missing) == answer_table.pattern_key(stored)
+    assert table.get(missing) is None
+    assert table.get(stored) == pattern_result(stored)
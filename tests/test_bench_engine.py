@@ -0,0 +1,25 @@
+import json
+from pathlib import Path
+
+from benchmarks.bench_engine import LENGTHS, POSITIONS, compare, iter_cases, run
+
+BASELINE = Path(__file__).resolve().parent.parent / "benchmarks" / "baseline.json"
+
+
+def test_run_measures_every_case():
+    result = run(lengths=(3,), min_time=0.0001, repeat=1)
+    assert len(result["results"]) == 2 + 5 * len(POSITIONS)
+    assert all(value > 0 for value in result["results"].values())
+
+
+def test_baseline_covers_all_cases():
+    baseline = json.loads(BASELINE.read_text(encoding="utf-8"))
+    names = [name for name, _ in iter_cases(lengths=LENGTHS)]
+    assert sorted(baseline["results"]) == sorted(names)
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"results": {"a": 10.0, "b": 10.0, "c": 10.0}}
+    current = {"results": {"a": 12.0, "b": 13.0, "d": 100.0}}
+    regressions = compare(baseline, current, threshold=0.25)
+    assert [name for name, *_ in regressions] == ["b"]
@@ -0,0 +1,75 @@
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from helpers.cli import stream_results
+from test_batch import SCENARIOS, SPECS, assert_matches_scenario
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def company_lines():
+    """Testszenarien als JSON-Zeilen, jeweils nur die Firmenliste."""
+    for spec in SPECS:
+        yield json.dumps(spec["companies"]) + "\n"
+
+
+def test_stream_results_accepts_company_lists():
+    output = io.StringIO()
+    assert stream_results(company_lines(), output) == len(SPECS)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [r["id"] for r in results] == list(range(1, len(SPECS) + 1))
+    for result, scenario in zip(results, SCENARIOS):
+        assert_matches_scenario(result, scenario)
+
+
+def test_stream_results_writes_while_reading():
+    output = io.StringIO()
+
+    def lines():
+        for i, line in enumerate(company_lines()):
+            # Alle vorherigen Ergebnisse sind bereits geschrieben
+            assert output.getvalue().count("\n") == i
+            yield line
+
+    stream_results(lines(), output)
+
+
+def test_stream_results_reports_invalid_lines_and_continues():
+    lines = [
+        json.dumps(SPECS[0]) + "\n",
+        '{"companies": [\n',
+        json.dumps(["DE", "AT"]) + "\n",
+        "42\n",
+        json.dumps(SPECS[1]) + "\n",
+    ]
+    output = io.StringIO()
+    assert stream_results(lines, output) == 5
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [r["id"] for r in results] == [SPECS[0]["id"], 2, 3, 4, SPECS[1]["id"]]
+    assert "Ungültiges JSON in Zeile 2" in results[1]["error"]
+    assert "Firma 1" in results[2]["error"]
+    assert "Zeile 4" in results[3]["error"]
+    assert_matches_scenario(results[0], SCENARIOS[0])
+    assert_matches_scenario(results[4], SCENARIOS[1])
+
+
+def test_cli_reads_stdin_and_keeps_stdout_clean():
+    specs = "".join(json.dumps(spec) + "\n" for spec in SPECS)
+    completed = subprocess.run(
+        [sys.executable, "-m", "helpers.cli"],
+        input=specs + '{"companies": []}\n' + '["DE", "AT"]\n',
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        check=True,
+    )
+    results = [json.loads(line) for line in completed.stdout.splitlines()]
+    assert len(results) == len(SPECS) + 2
+    for result, scenario in zip(results, SCENARIOS):
+        assert_matches_scenario(result, scenario)
+    assert "error" in results[-2]
+    assert "Firma 1" in results[-1]["error"]
+    assert completed.stderr == ""
@@ -0,0 +1,45 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from helpers.diagram import ChainDiagram, render_svg, svg_cache
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+def build_diagram(length):
+    diagram = ChainDiagram()
+    for i in range(length):
+        colors = ["#ffa500", "#add8e6"] if i == 1 else []
+        diagram.node(f"Zwischenhändler {i}\nDeutschland (DE), EU", colors)
+    for i in range(length - 1):
+        diagram.edge(i, i + 1, "Rechnung", color="orange")
+        diagram.edge(i + 1, i, "Bestellung", color="grey", style="dashed")
+    diagram.transport("Transport durch Verkäufer", color="blue")
+    return diagram
+
+
+@pytest.mark.parametrize("length", [2, 3, 30])
+def test_chain_diagram_renders_all_companies_and_edges(length):
+    root = ET.fromstring(build_diagram(length).to_svg())
+    boxes = root.findall(f"{SVG}rect")
+    assert len(boxes) == length
+    # 2 Kanten pro Nachbarpaar und der Transportbogen
+    assert len(root.findall(f"{SVG}path")) == 2 * (length - 1) + 1
+    assert len(root.findall(f".//{SVG}linearGradient")) == 1
+    rows = {box.get("y") for box in boxes}
+    assert (len(rows) > 1) == (length == 30)
+
+
+def test_chain_diagram_is_cached_by_source():
+    svg_cache.clear()
+    first = render_svg(build_diagram(4))
+    assert render_svg(build_diagram(4)) is first
+    assert render_svg(build_diagram(5)) != first
+    assert svg_cache.stats()["hits"] == 1
+
+
+def test_edges_only_between_neighbours():
+    diagram = build_diagram(3)
+    with pytest.raises(ValueError):
+        diagram.edge(0, 2)
@@ -0,0 +1,6 @@
+from benchmarks.bench_import_time import loaded_optional_modules
+
+
+def test_engine_import_loads_no_optional_layers():
+    # Das Millisekunden-Budget prüft ``python -m benchmarks.bench_import_time``
+    assert loaded_optional_modules() == []
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from helpers import instrumentation
+from helpers.batch import iter_results
+from helpers.helpers import Transaktion
+from helpers.patterns import pattern_cache
+from helpers.scenario import transaction_from_spec
+from test_batch import SPECS
+
+
+@pytest.fixture
+def timings():
+    instrumentation.registry.reset()
+    instrumentation.enable()
+    yield instrumentation.registry
+    instrumentation.disable()
+    instrumentation.registry.reset()
+
+
+def evaluate(spec):
+    transaction = transaction_from_spec(spec)
+    transaction.calculate_delivery_and_vat()
+    transaction.determine_registration_obligations()
+    transaction.determine_reporting_obligations()
+
+
+def test_disabled_by_default_records_nothing():
+    assert not instrumentation.is_enabled()
+    assert instrumentation.phase_timer() is None
+    instrumentation.registry.reset()
+    evaluate(SPECS[0])
+    assert instrumentation.registry.snapshot()["phases"] == {}
+
+
+def test_every_phase_is_timed(timings):
+    evaluate(SPECS[0])
+    evaluate(SPECS[1])
+    phases = timings.snapshot()["phases"]
+    assert list(phases) == list(instrumentation.PHASES)
+    assert all(data["count"] == 2 for data in phases.values())
+    assert all(sum(data["buckets"]) == 2 for data in phases.values())
+
+
+def test_registration_excludes_lazy_delivery_calculation(timings, monkeypatch):
+    # Gefälschte Uhr: nur die Lieferungsberechnung verbraucht (10 s) Zeit
+    clock = [0.0]
+    monkeypatch.setattr(instrumentation.time, "perf_counter", lambda: clock[0])
+    calculate = Transaktion.calculate_delivery_and_vat
+
+    def slow_calculate(self):
+        clock[0] += 10.0
+        return calculate(self)
+
+    monkeypatch.setattr(Transaktion, "calculate_delivery_and_vat", slow_calculate)
+    transaction = transaction_from_spec(SPECS[0])
+    assert not transaction.lieferungen
+    transaction.determine_registration_obligations()
+
+    phases = timings.snapshot()["phases"]
+    assert phases["vat_treatment"]["count"] == 1
+    assert phases["registration"]["count"] == 1
+    assert phases["registration"]["sum"] < 10.0
+
+
+def test_exports_and_merge(timings):
+    evaluate(SPECS[0])
+    snapshot = json.loads(json.dumps(timings.snapshot()))
+
+    text = timings.to_prometheus()
+    assert "# TYPE ust_engine_phase_seconds histogram" in text
+    assert 'ust_engine_phase_seconds_bucket{phase="vat_treatment",le="+Inf"} 1' in text
+    assert 'ust_engine_phase_seconds_count{phase="registration"} 1' in text
+
+    timings.merge(snapshot)
+    assert timings.snapshot()["phases"]["vat_treatment"]["count"] == 2
+    rows = timings.summary()
+    assert [row["phase"] for row in rows] == list(instrumentation.PHASES)
+    assert all(row["p95_ms"] >= 0 for row in rows)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_batch_aggregates_worker_timings(timings, workers):
+    pattern_cache.clear()
+    results = list(iter_results(SPECS, workers=workers, chunksize=4))
+    assert len(results) == len(SPECS)
+    phases = timings.snapshot()["phases"]
+    assert phases["find_transporter"]["count"] > 0
+    assert phases["reporting"]["count"] > 0
@@ -1,12 +1,20 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
 import pytest
 
 from helpers.helpers import (
+    Chain,
     Handelsstufe,
     Transaktion,
     Country,
     VatTreatmentType,
     IntermediaryStatus,
+    reporting_labels,
 )
+from helpers.localization import get_countries, get_country_labels
 
 # --- Mock Country Data ---
 DE = Country("Deutschland", "DE")
@@ -2555,7 +2563,7 @@ def test_chain_transaction_scenarios_three_companies(scenario):
 
     # e) Prüfung der Meldepflichten
     actual_reporting_formatted = {
-        firma.identifier: meldungen_set
+        firma.identifier: set(reporting_labels(meldungen_set))
         for firma, meldungen_set in actual_reporting_raw.items()
         # Nur Firmen mit erwarteten Meldungen berücksichtigen für einfacheren Vergleich
         if meldungen_set or firma.identifier in scenario.get("expected_reporting", {})
@@ -2665,7 +2673,7 @@ def test_chain_transaction_scenarios_four_companies(scenario):
 
     # e) Prüfung der Meldepflichten
     actual_reporting_formatted = {
-        firma.identifier: meldungen_set
+        firma.identifier: set(reporting_labels(meldungen_set))
         for firma, meldungen_set in actual_reporting_raw.items()
         # Nur Firmen mit erwarteten Meldungen berücksichtigen für einfacheren Vergleich
         if meldungen_set or firma.identifier in scenario.get("expected_reporting", {})
@@ -2775,7 +2783,7 @@ def test_chain_transaction_scenarios_TEN_companies(scenario):
 
     # e) Prüfung der Meldepflichten
     actual_reporting_formatted = {
-        firma.identifier: meldungen_set
+        firma.identifier: set(reporting_labels(meldungen_set))
         for firma, meldungen_set in actual_reporting_raw.items()
         # Nur Firmen mit erwarteten Meldungen berücksichtigen für einfacheren Vergleich
         if meldungen_set or firma.identifier in scenario.get("expected_reporting", {})
@@ -2829,3 +2837,376 @@ def test_error_on_single_company():
         excinfo.value
     ) or "Transaktion benötigt mindestens 2 Firmen" in str(excinfo.value)
     print("\n--- Test Passed: Fehler bei Einzelfirma korrekt ausgelöst ---")
+
+
+def test_triangle_check_is_cached_and_invalidated_on_chain_change():
+    """
+    Testet, dass die Dreiecksprüfung je Berechnung zwischengespeichert und bei
+    Änderungen an der Kette neu ermittelt wird.
+    """
+    companies = create_company_chain(
+        [
+            {
+                "id": 0,
+                "country_code": "DE",
+                "ship": True,
+                "customs": False,
+                "vat_change_code": None,
+                "intermediary_status": None,
+            },
+            {
+                "id": 1,
+                "country_code": "AT",
+                "ship": False,
+                "customs": False,
+                "vat_change_code": None,
+                "intermediary_status": None,
+            },
+            {
+                "id": 2,
+                "country_code": "FR",
+                "ship": False,
+                "customs": False,
+                "vat_change_code": None,
+                "intermediary_status": None,
+            },
+        ]
+    )
+    transaction = Transaktion(companies[0], companies[-1])
+    transaction.calculate_delivery_and_vat()
+
+    roles = transaction.get_triangle_roles()
+    assert roles == tuple(companies)
+    assert transaction.get_triangle_roles() is roles
+    # Unabhängige Firmen machen den Zwischenspeicher nicht ungültig
+    Chain([Handelsstufe(DE, 0, 2), Handelsstufe(AT, 1, 2)])
+    assert transaction.get_triangle_roles() is roles
+
+    # Änderung an der Kette: C sitzt nun im Land von A -> kein Dreieck mehr
+    companies[2].country = DE
+    assert transaction.is_triangular_transaction() is False
+
+
+def test_chain_positions_roles_and_linked_list_view():
+    """
+    Testet den Positionszugriff der Chain und die Kompatibilität mit next_company/previous_company.
+    """
+    companies = [
+        Handelsstufe(country, i, 4) for i, country in enumerate([DE, AT, FR, CH])
+    ]
+    companies[2].responsible_for_shippment = True
+    companies[3].responsible_for_import_vat = True
+    chain = Chain(companies)
+
+    assert len(chain) == 4
+    assert chain.start is companies[0] and chain.end is companies[3]
+    assert chain.index(companies[2]) == 2
+    assert chain.next_of(companies[1]) is companies[2]
+    assert chain.previous_of(companies[0]) is None
+    assert chain.shipping_index == 2
+    assert chain.customs_company is None
+    assert chain.import_vat_company is companies[3]
+
+    # Verknüpfungen als Kompatibilitätsansicht
+    assert companies[0].previous_company is None
+    assert companies[1].next_company is companies[2]
+    assert companies[3].previous_company is companies[2]
+    assert companies[3].next_company is None
+
+    # Rollen werden nach Änderungen neu ermittelt
+    companies[2].responsible_for_shippment = False
+    companies[0].responsible_for_shippment = True
+    assert chain.shipping_company is companies[0]
+
+    transaction = Transaktion.from_chain(chain)
+    assert transaction.get_ordered_chain_companies() == companies
+    assert transaction.find_shipping_company() is companies[0]
+
+
+def test_chain_caches_are_invalidated_per_chain():
+    """
+    Testet, dass Änderungen an Rollen und Verknüpfungen nur die Kette der
+    geänderten Firma betreffen.
+    """
+    first = Chain(Handelsstufe(c, i, 3) for i, c in enumerate([DE, AT, FR]))
+    second = Chain(Handelsstufe(c, i, 3) for i, c in enumerate([DE, AT, FR]))
+    first[0].responsible_for_shippment = True
+    assert first.shipping_company is first[0]
+
+    revision = first.revision
+    second[1].responsible_for_shippment = True
+    Handelsstufe(DE)
+    assert first.revision == revision
+    assert second.shipping_company is second[1]
+
+    first[0].responsible_for_shippment = False
+    first[2].responsible_for_shippment = True
+    assert first.revision > revision
+    assert first.shipping_company is first[2]
+
+    # Geänderte Verknüpfungen lösen die Firmen von der Kette
+    first[2].next_company = Handelsstufe(IT, 3, 4)
+    assert all(company.chain is None for company in first)
+    assert second[0].chain is second
+    assert first.shipping_company is first[2]
+
+
+def test_transaction_keeps_supplied_unlinked_chain():
+    """
+    Testet, dass eine Transaktion aus einer unverknüpften Kette diese Kette
+    behält, auch wenn danach andere Firmen oder Ketten erzeugt werden.
+    """
+    scenario = TEST_SCENARIOS_THREE_COMPANIES[0]
+    companies = [
+        Handelsstufe(COUNTRIES[config["country_code"]], config["id"], 3)
+        for config in scenario["companies"]
+    ]
+    companies[0].responsible_for_shippment = True
+    chain = Chain(companies, link=False)
+    transaction = Transaktion.from_chain(chain)
+
+    Handelsstufe(DE)
+    Chain(companies)  # Firmen gehören nun zu einer anderen Kette
+    companies[1].next_company = None  # und sind wieder unverknüpft
+    assert companies[0].chain is None
+    assert transaction.chain is chain
+    assert len(transaction.chain) == 3
+    assert len(transaction.calculate_delivery_and_vat()) == 2
+
+
+def evaluate_long_chain(length):
+    """
+    Berechnet eine Kette mit ``length`` Firmen (Transport durch den mittleren
+    Zwischenhändler) und gibt Dauer, Firmen und Lieferungen zurück.
+    """
+    middle = length // 2
+    countries = [DE, AT, FR, IT, NL, BE, PL, ES]
+    configs = [
+        {
+            "id": i,
+            "country_code": countries[i % len(countries)].code,
+            "ship": i == middle,
+            "customs": False,
+            "vat_change_code": None,
+            "intermediary_status": IntermediaryStatus.BUYER if i == middle else None,
+        }
+        for i in range(length)
+    ]
+    companies = create_company_chain(configs)
+    transaction = Transaktion(companies[0], companies[-1])
+
+    start = time.perf_counter()
+    lieferungen = transaction.calculate_delivery_and_vat()
+    transaction.determine_registration_obligations()
+    transaction.determine_reporting_obligations()
+    for lieferung in lieferungen:
+        lieferung.determine_place_of_supply(
+            lieferungen[middle - 1], companies[0].country, companies[-1].country
+        )
+    return time.perf_counter() - start, companies, lieferungen
+
+
+def test_long_chain_is_evaluated_in_linear_time():
+    """
+    Testet eine Kette mit 10.000 Firmen und das Wachstum der Laufzeit: Bei
+    achtfacher Länge wächst sie linear etwa um Faktor 8, quadratisch um 64.
+    Verglichen wird die beste von drei Messungen, unabhängig von der Maschine.
+    """
+    length = 10_000
+    middle = length // 2
+    _, companies, lieferungen = evaluate_long_chain(length)
+
+    assert len(lieferungen) == length - 1
+    assert [i for i, l in enumerate(lieferungen) if l.is_moved_supply] == [middle - 1]
+    assert lieferungen[0].place_of_supply == companies[0].country
+    assert lieferungen[middle - 1].place_of_supply == companies[0].country
+    assert lieferungen[middle].place_of_supply == companies[-1].country
+    assert lieferungen[-1].place_of_supply == companies[-1].country
+
+    short = min(evaluate_long_chain(length // 8)[0] for _ in range(3))
+    long = min(evaluate_long_chain(length)[0] for _ in range(3))
+    assert long / short < 24
+
+
+def test_traversal_is_iterative_and_detects_cycles():
+    """
+    Testet die Suche nach Start, Ende, Transporteur und Zollverantwortlichem in
+    Ketten, die tiefer sind als das Rekursionslimit, sowie die Erkennung von
+    Kreisen beim Aufbau der Kette.
+    """
+    length = sys.getrecursionlimit() + 500
+    companies = [Handelsstufe(DE, i, length) for i in range(length)]
+    companies[-2].responsible_for_shippment = True
+    companies[-3].responsible_for_customs = True
+    chain = Chain(companies)
+
+    # Suchen werden aus der beim Aufbau geprüften Kette beantwortet
+    assert companies[length // 2].linked_chain() is chain
+    assert companies[length // 2].find_start_company() is companies[0]
+    assert companies[0].find_end_company() is companies[-1]
+    assert companies[0].find_shipping_company() is companies[-2]
+    assert companies[0].find_custom_company() is companies[-3]
+    assert Transaktion(companies[0], companies[-1]).find_shipping_company() is (
+        companies[-2]
+    )
+
+    # Kreis über mehrere Firmen (nicht nur Selbstverweis)
+    companies[-1].next_company = companies[5]
+    with pytest.raises(ValueError, match="Kreis"):
+        Chain.from_start(companies[0])
+    with pytest.raises(ValueError, match="Kreis"):
+        companies[0].find_end_company()
+    companies[5].previous_company = companies[-1]
+    with pytest.raises(ValueError, match="Kreis"):
+        companies[10].find_start_company()
+
+    with pytest.raises(ValueError, match="mehrfach"):
+        Chain([companies[0], companies[1], companies[0]])
+
+    # Ohne Kette wird sie einmalig aus den Verknüpfungen aufgebaut
+    unlinked = create_company_chain(
+        [
+            {
+                "id": i,
+                "country_code": "DE",
+                "ship": i == 0,
+                "customs": False,
+                "vat_change_code": None,
+                "intermediary_status": None,
+            }
+            for i in range(3)
+        ]
+    )
+    assert unlinked[1].chain is None
+    assert unlinked[1].find_end_company() is unlinked[2]
+    assert unlinked[0].chain is unlinked[2].chain is not None
+
+
+def test_country_registry_interns_by_code():
+    """
+    Testet, dass jeder ISO-Code genau einem Country-Objekt zugeordnet ist.
+    """
+    germany = Country.from_code("DE")
+    assert Country.from_code("DE") is germany
+    assert Country.from_code("de") is germany
+    assert germany == DE  # Gleichheit über den Code, unabhängig vom Namen
+    assert hash(germany) == hash(DE)
+    assert germany.EU and not Country.from_code("CH").EU
+    with pytest.raises(ValueError):
+        Country.from_code("XX")
+
+
+def test_registration_masks():
+    """
+    Testet Ländermasken: Umwandlung, Mengenoperationen und Übereinstimmung mit
+    den Registrierungspflichten als Country-Sets.
+    """
+    from helpers.countries import countries_of, mask_of
+
+    mask = mask_of([DE, AT, DE])
+    assert mask.bit_count() == 2
+    assert countries_of(mask) == {DE, AT}
+    assert countries_of(mask & mask_of([AT, FR])) == {AT}
+    assert countries_of(mask | mask_of([FR])) == {DE, AT, FR}
+    assert countries_of(0) == set()
+
+    placeholder = Country("Platzhalter", "#X")
+    assert countries_of(mask_of([placeholder, DE])) == {placeholder, DE}
+
+    scenario = TEST_SCENARIOS_FOUR_COMPANIES[0]
+    transaction = Transaktion.from_chain(
+        Chain(create_company_chain(scenario["companies"]), link=False)
+    )
+    transaction.calculate_delivery_and_vat()
+    masks = transaction.determine_registration_masks()
+    registrations = transaction.determine_registration_obligations()
+    assert {f: countries_of(m) for f, m in masks.items()} == registrations
+
+
+def test_reporting_obligations_are_flags():
+    """
+    Testet die Meldepflichten als IntFlag samt deutscher Bezeichnungen.
+    """
+    from helpers.helpers import Lieferung, ReportingObligation
+
+    scenario = TEST_SCENARIOS_THREE_COMPANIES[0]
+    transaction = Transaktion.from_chain(
+        Chain(create_company_chain(scenario["companies"]), link=False)
+    )
+    moved = transaction.calculate_delivery_and_vat()[0]
+    assert moved.reporting == (
+        ReportingObligation.ECSL
+        | ReportingObligation.INTRASTAT_DISPATCH
+        | ReportingObligation.INTRASTAT_ARRIVAL
+    )
+    assert moved.potential_ecsl_report and moved.potential_intrastat_arrival
+
+    reporting = transaction.determine_reporting_obligations()
+    portfolio = ReportingObligation.NONE
+    for meldungen in reporting.values():
+        portfolio |= meldungen
+    assert reporting_labels(portfolio) == [
+        "Intrastat Eingang",
+        "Intrastat Versendung",
+        "ZM",
+    ]
+
+    lief = Lieferung(moved.lieferant, moved.kunde)
+    lief.potential_ecsl_report = True
+    lief.potential_intrastat_dispatch = True
+    lief.potential_ecsl_report = False
+    assert lief.reporting == ReportingObligation.INTRASTAT_DISPATCH
+
+
+def test_trace_records_rule_path():
+    """
+    Testet den Entscheidungsweg je Lieferung: standardmäßig aus, sonst als
+    Regel-IDs aus TRACE_RULES in Reihenfolge der Prüfung.
+    """
+    from helpers.helpers import TRACE_RULES
+
+    scenario = TEST_SCENARIOS_THREE_COMPANIES[4]
+    assert scenario["expected_triangle"]
+    transaction = Transaktion.from_chain(
+        Chain(create_company_chain(scenario["companies"]), link=False)
+    )
+    assert all(l.trace is None for l in transaction.calculate_delivery_and_vat())
+
+    transaction.trace = True
+    moved, second = transaction.calculate_delivery_and_vat()
+    assert moved.trace == ["M1", "P1", "B1", "B2", "B3", "Z1", "Z2"]
+    assert second.trace == ["P4", "R1", "R2"]
+    assert set(moved.trace + second.trace) <= set(TRACE_RULES)
+
+    # Erneute Bestimmung der Behandlung verdoppelt den Weg nicht
+    second.determine_vat_treatment(transaction.chain[0].country, second.kunde.country)
+    assert second.trace == ["P4", "R1", "R2"]
+
+
+def test_flags_are_loaded_lazily():
+    """
+    Testet, dass der Import der Engine keine Flaggendaten lädt und die Flagge
+    erst beim ersten Zugriff geladen wird.
+    """
+    code = (
+        "import sys, helpers.helpers; "
+        "from helpers.countries import Country; "
+        "assert 'helpers.flag_store' not in sys.modules; "
+        "assert Country.from_code('DE').flag.startswith('<svg')"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).parents[1], check=True
+    )
+
+
+def test_get_countries_is_cached_sorted_and_labelled():
+    """
+    Testet die zwischengespeicherte, nach deutschem Namen sortierte Länderliste.
+    """
+    countries = get_countries()
+    assert get_countries() is countries
+    names = [country.name for country in countries]
+    assert names.index("Österreich") < names.index("Panama")
+    labels = get_country_labels()
+    assert labels[Country.from_code("AT")] == "Österreich (AT) - EU"
+    assert labels[Country.from_code("CH")] == "Schweiz (CH)"
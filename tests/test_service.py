@@ -0,0 +1,185 @@
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from helpers.service import MAX_BODY_SIZE, make_server
+from test_batch import SCENARIOS, SPECS, assert_matches_scenario
+
+
+WORKERS = 4
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = make_server(port=0, workers=WORKERS)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def connection(server):
+    host, port = server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    yield connection
+    connection.close()
+
+
+def post(connection, spec, headers=None):
+    connection.request(
+        "POST",
+        "/evaluate",
+        body=json.dumps(spec),
+        headers={"Content-Type": "application/json", **(headers or {})},
+    )
+    response = connection.getresponse()
+    body = response.read()
+    return response, json.loads(body) if body else None
+
+
+def test_health(connection):
+    connection.request("GET", "/health")
+    response = connection.getresponse()
+    assert response.status == 200
+    assert json.loads(response.read()) == {"status": "ok"}
+
+
+def test_evaluate_over_one_connection(connection):
+    # Alle Anfragen laufen über dieselbe Verbindung (keep-alive)
+    for spec, scenario in zip(SPECS, SCENARIOS):
+        response, result = post(connection, spec)
+        assert response.status == 200
+        assert result["id"] == spec["id"]
+        assert_matches_scenario(result, scenario)
+        assert len(result["reporting_labels"]) == len(spec["companies"])
+    assert connection.sock is not None
+
+
+def test_etag_not_modified(connection):
+    spec = SPECS[0]
+    response, _ = post(connection, spec)
+    etag = response.getheader("ETag")
+    assert etag
+
+    response, body = post(connection, spec, {"If-None-Match": etag})
+    assert response.status == 304
+    assert body is None
+    assert response.getheader("ETag") == etag
+
+    response, _ = post(connection, SPECS[1], {"If-None-Match": etag})
+    assert response.status == 200
+    assert response.getheader("ETag") != etag
+
+    # Liste, schwache ETags und "*"; Teilzeichenketten passen nicht
+    for header in (f'"x", W/{etag}', "*"):
+        response, _ = post(connection, spec, {"If-None-Match": header})
+        assert response.status == 304
+    for header in (f'"{etag[1:-2]}"', etag[1:-1], f'{etag[:-1]}0"'):
+        response, _ = post(connection, spec, {"If-None-Match": header})
+        assert response.status == 200
+
+
+def test_not_modified_requires_valid_chain(connection):
+    # Ohne Transporteur gibt es kein Ergebnis, das "*" bestätigen könnte
+    spec = {"companies": [{"country_code": "DE"}, {"country_code": "FR"}]}
+    response, body = post(connection, spec, {"If-None-Match": "*"})
+    assert response.status == 400
+    assert response.getheader("ETag") is None
+    assert "Transport" in body["error"]
+
+
+def test_idle_connections_do_not_block_workers(server):
+    host, port = server.server_address[:2]
+    # Mehr ruhende keep-alive-Verbindungen als Berechnungs-Threads
+    idle = [
+        http.client.HTTPConnection(host, port, timeout=5) for _ in range(WORKERS + 2)
+    ]
+    try:
+        for connection in idle:
+            response, _ = post(connection, SPECS[0])
+            assert response.status == 200
+        fresh = http.client.HTTPConnection(host, port, timeout=2)
+        response, result = post(fresh, SPECS[1])
+        assert response.status == 200
+        assert_matches_scenario(result, SCENARIOS[1])
+        fresh.close()
+    finally:
+        for connection in idle:
+            connection.close()
+
+
+def test_trace_request(connection):
+    response, plain = post(connection, SPECS[0])
+    assert "trace" not in plain["deliveries"][0]
+
+    traced_response, traced = post(connection, dict(SPECS[0], trace=True))
+    assert traced_response.status == 200
+    assert traced_response.getheader("ETag") != response.getheader("ETag")
+    assert traced["deliveries"][0]["trace"][:2] == ["M1", "P1"]
+    assert set(traced["trace_rules"]) == {
+        rule for delivery in traced["deliveries"] for rule in delivery["trace"]
+    }
+    assert_matches_scenario(traced, SCENARIOS[0])
+
+
+def test_invalid_requests(connection):
+    response, body = post(connection, {"companies": []})
+    assert response.status == 400
+    assert "mindestens 2 Firmen" in body["error"]
+
+    connection.request("POST", "/evaluate", body="{kein json")
+    response = connection.getresponse()
+    assert response.status == 400
+    assert "Ungültiges JSON" in json.loads(response.read())["error"]
+
+    connection.request("GET", "/unbekannt")
+    response = connection.getresponse()
+    assert response.status == 404
+    response.read()
+
+    # Die Verbindung bleibt nach Fehlern nutzbar
+    response, _ = post(connection, SPECS[0])
+    assert response.status == 200
+
+
+def test_metrics(connection):
+    post(connection, SPECS[0])
+    connection.request("GET", "/metrics")
+    response = connection.getresponse()
+    assert response.status == 200
+    metrics = json.loads(response.read())
+    assert metrics["singleflight"]["calls"] >= 1
+    assert {"coalesced_ratio", "wait_seconds_max"} <= set(metrics["singleflight"])
+    assert metrics["analysis_cache"]["hits"] + metrics["analysis_cache"]["misses"] > 0
+
+
+def test_prometheus_metrics(connection):
+    connection.request("GET", "/metrics/prometheus")
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/plain")
+    assert "# TYPE ust_engine_phase_seconds histogram" in response.read().decode()
+
+
+@pytest.mark.parametrize("length", ["-1", "abc", str(MAX_BODY_SIZE + 1)])
+def test_bad_content_length_closes_connection(server, length):
+    # Der nicht gelesene Körper enthält eine weitere Anfrage auf derselben Verbindung
+    follow_up = b"GET /health HTTP/1.1\r\nHost: test\r\n\r\n"
+    request = (
+        f"POST /evaluate HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n\r\n"
+    ).encode() + follow_up
+    with socket.create_connection(server.server_address[:2], timeout=5) as sock:
+        sock.sendall(request)
+        sock.sendall(follow_up)
+        received = b""
+        while chunk := sock.recv(65536):
+            received += chunk
+    assert received.startswith(b"HTTP/1.1 400 ")
+    assert b"Connection: close" in received
+    # Keine Antwort auf die eingeschleuste Anfrage
+    assert received.count(b"HTTP/1.1 ") == 1
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from helpers.singleflight import SingleFlight
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Zeitüberschreitung"
+        time.sleep(0.001)
+
+
+def run_concurrently(flight, key, compute, count):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(flight.do(key, compute))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    release = threading.Event()
+    computations = []
+
+    def compute():
+        computations.append(1)
+        release.wait()
+        return {"ergebnis": 42}
+
+    threads, results, errors = run_concurrently(flight, "a", compute, 8)
+    wait_for(lambda: flight.stats()["calls"] == 8)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(computations) == 1
+    assert errors == []
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+    stats = flight.stats()
+    assert stats["coalesced"] == 7
+    assert stats["coalesced_ratio"] == pytest.approx(7 / 8)
+    assert stats["wait_seconds_max"] > 0
+    assert stats["in_flight"] == 0
+
+
+def test_errors_reach_all_waiters_and_key_is_released():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait()
+        raise ValueError("Keine Firma für den Transport verantwortlich gemacht.")
+
+    threads, results, errors = run_concurrently(flight, "a", compute, 4)
+    wait_for(lambda: flight.stats()["calls"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == []
+    assert len(errors) == 4
+    assert all(isinstance(e, ValueError) for e in errors)
+    # Nach dem Fehler wird wieder gerechnet
+    assert flight.do("a", lambda: 1) == 1
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.do("a", lambda: 3) == 3
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_service_computes_once_across_flight_release(monkeypatch):
+    from helpers import service
+    from helpers.result_cache import LRUCache
+    from helpers.scenario import fingerprint, transaction_from_spec
+    from test_batch import SPECS
+
+    spec = SPECS[0]
+    key = fingerprint(transaction_from_spec(spec).chain)
+    computations, cached_on_release = [], []
+    canonical_result = service.canonical_result
+
+    def counting_result(transaction):
+        computations.append(1)
+        return canonical_result(transaction)
+
+    class RacingCache(LRUCache):
+        raced = False
+
+        def get(self, key, default=None):
+            value = super().get(key, default)
+            if not self.raced and value is default:
+                # Eine andere Anfrage rechnet fertig, nachdem diese den Cache
+                # verfehlt hat, aber bevor sie die Zusammenfassung erreicht
+                self.raced = True
+                service.evaluate_request(spec)
+            return value
+
+    class ObservedFlight(SingleFlight):
+        def do(self, key, compute):
+            value = super().do(key, compute)
+            # Schlüssel ist freigegeben: das Ergebnis muss schon im Cache liegen
+            cached_on_release.append(key in service.analysis_cache)
+            return value
+
+    monkeypatch.setattr(service, "canonical_result", counting_result)
+    monkeypatch.setattr(service, "analysis_cache", RacingCache())
+    monkeypatch.setattr(service, "evaluation_flight", ObservedFlight())
+
+    _, response = service.evaluate_request(spec)
+    assert response["id"] == spec["id"]
+    assert len(computations) == 1
+    assert all(cached_on_release)
+    assert key in service.analysis_cache
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from helpers.countries import COUNTRY_CODES
+from helpers.helpers import VatTreatmentType
+from helpers.scenario import result_from_transaction, transaction_from_spec
+from helpers.vectorized import chain_arrays, evaluate_chains
+from test_batch import SPECS, spec_from_scenario
+from test_reihengeschaeft import TEST_SCENARIOS_TEN_COMPANIES
+
+TEN_SPECS = [
+    spec_from_scenario(i, s) for i, s in enumerate(TEST_SCENARIOS_TEN_COMPANIES)
+]
+
+
+def random_specs(count, length, seed=0):
+    rng = random.Random(seed)
+    codes = ["DE", "AT", "FR", "US", "CH", "CN"]
+    specs = []
+    for _ in range(count):
+        companies = [
+            {
+                "country_code": rng.choice(codes),
+                "import_vat": rng.random() < 0.3,
+                "intermediary_status": rng.choice([None, "BUYER", "SUPPLIER"]),
+                "vat_change_code": rng.choice(codes) if rng.random() < 0.3 else None,
+            }
+            for _ in range(length)
+        ]
+        companies[rng.randrange(length)]["ship"] = True
+        specs.append({"companies": companies})
+    return specs
+
+
+def assert_matches_engine(specs):
+    transactions = [transaction_from_spec(spec) for spec in specs]
+    result = evaluate_chains(**chain_arrays(t.chain for t in transactions))
+    for row, spec in enumerate(specs):
+        expected = result_from_transaction(transaction_from_spec(spec))
+        assert bool(result["triangle"][row]) == expected["triangle"]
+        for d, delivery in enumerate(expected["deliveries"]):
+            assert bool(result["moved"][row] == d) == delivery["moved"]
+            assert COUNTRY_CODES[result["place"][row, d]] == delivery["place"]
+            assert (
+                VatTreatmentType(result["vat_treatment"][row, d]).name
+                == delivery["vat_treatment"]
+            )
+
+
+@pytest.mark.parametrize("length", [3, 4])
+def test_vectorized_matches_scenarios(length):
+    assert_matches_engine([s for s in SPECS if len(s["companies"]) == length])
+
+
+def test_vectorized_matches_ten_company_scenarios():
+    assert_matches_engine(TEN_SPECS)
+
+
+@pytest.mark.parametrize("length", [2, 3, 4, 5])
+def test_vectorized_matches_random_chains(length):
+    assert_matches_engine(random_specs(300, length, seed=length))
+
+
+def test_chains_without_shipping_are_invalid():
+    spec = {"companies": [{"country_code": "DE"}, {"country_code": "AT"}]}
+    arrays = chain_arrays([transaction_from_spec(spec).chain])
+    result = evaluate_chains(**arrays)
+    assert not result["valid"][0]
+    assert result["moved"][0] == -1
+    assert result["vat_treatment"][0, 0] == VatTreatmentType.UNKNOWN.value